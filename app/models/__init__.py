@@ -3,5 +3,7 @@ from .analysis import Analysis
 from .social_account import SocialAccount, Platform
 from .campaign import Campaign
 from .report import Report, ReportStatus, ReportSourceType
+from .upload_session import UploadSession, UploadSessionStatus, UploadMethod
+from .competitor import CompetitorNiche
 
-__all__ = ["User", "Analysis", "SocialAccount", "Platform", "Campaign", "Report", "ReportStatus", "ReportSourceType"]
+__all__ = ["User", "Analysis", "SocialAccount", "Platform", "Campaign", "Report", "ReportStatus", "ReportSourceType", "UploadSession", "UploadSessionStatus", "UploadMethod", "CompetitorNiche"]
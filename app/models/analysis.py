@@ -16,9 +16,12 @@ class Analysis(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     csv_filename = Column(String, nullable=False)
-    csv_url = Column(String, nullable=True)  # Cloudinary URL for CSV file
+    csv_url = Column(String, nullable=True)  # Storage URL for CSV file (Cloudinary, local:// or s3://)
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 of normalized CSV content
     status = Column(Enum(AnalysisStatus), default=AnalysisStatus.PENDING)
+    snapshot_url = Column(String, nullable=True)  # Storage URL of the Parquet snapshot of the parsed rows
     results_json = Column(Text, nullable=True)  # Stores JSON string of results
+    ai_prompt = Column(Text, nullable=True)  # Prompt the analysis ran on, reused to regenerate a section
     error_message = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
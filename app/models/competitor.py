@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Index, func, literal_column
+import sqlalchemy.dialects.postgresql  # Registers the typed full-text search functions
+from datetime import datetime
+from app.database import Base
+
+class CompetitorNiche(Base):
+    """Competitors found for a business niche, shared by every user in that niche"""
+    __tablename__ = "competitor_niches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    niche_key = Column(String, nullable=False, unique=True, index=True)  # normalize_niche() of the niche
+    niche = Column(String, nullable=False)  # Niche as first extracted, for display
+    businesses = Column(JSON, nullable=False, default=list)
+    source = Column(String, nullable=True)  # web (structured search results) or ai (model knowledge)
+    search_text = Column(Text, nullable=False, default="")  # Niche, business names and descriptions for full-text search
+    refreshed_at = Column(DateTime, default=datetime.utcnow)
+    refresh_requested_at = Column(DateTime, nullable=True)  # Set while a background refresh is queued
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Full-text index for similar-niche lookups (Postgres only)
+        Index(
+            "ix_competitor_niches_search",
+            func.to_tsvector(literal_column("'english'"), search_text),
+            postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+    )
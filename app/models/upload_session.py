@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, BigInteger
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from app.database import Base
+import enum
+
+class UploadSessionStatus(enum.Enum):
+    OPEN = "open"
+    FINALIZING = "finalizing"
+    COMPLETED = "completed"
+    ABORTED = "aborted"
+
+class UploadMethod(enum.Enum):
+    CHUNKED = "chunked"  # Chunks staged on the API host (resumable uploads)
+    DIRECT = "direct"  # Client uploads straight to storage with a signed target
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+
+    id = Column(String, primary_key=True, index=True)  # Random token handed to the client
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    filename = Column(String, nullable=False)  # Original filename from the client
+    total_size = Column(BigInteger, nullable=False)
+    chunk_size = Column(Integer, nullable=True)  # Chunked uploads only
+    method = Column(Enum(UploadMethod), default=UploadMethod.CHUNKED)
+    storage_url = Column(String, nullable=True)  # Direct uploads: where the client uploads to
+    status = Column(Enum(UploadSessionStatus), default=UploadSessionStatus.OPEN)
+    analysis_id = Column(Integer, ForeignKey("analyses.id"), nullable=True)  # Set once finalized
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    user = relationship("User")
+    analysis = relationship("Analysis")
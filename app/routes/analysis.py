@@ -1,18 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models.analysis import Analysis
+from app.database import get_db, SessionLocal
+from app.models.analysis import Analysis, AnalysisStatus
 from app.routes.auth import oauth2_scheme
 from app.utils.auth import decode_access_token
 from app.schemas.analysis import AnalysisResponse
 from app.services.pdf_service import generate_pdf
-from typing import List
+from app.services.celery_tasks import process_csv_task
+from app.services import analysis_stream
+from app.services.openai_service import REGENERABLE_SECTIONS, regenerate_section
+from app.services.summary_cache import get_cached_summary
+from app.utils.snapshot import open_snapshot, read_snapshot_rows, iter_snapshot, delete_snapshot
+from app.utils.schema_resolver import resolve_schema
+from app.utils.breakdowns import BreakdownAccumulator
+from app.utils.dates import DateParser
+from typing import List, Optional
+import asyncio
 import json
 import os
 
 router = APIRouter()
 
+# Largest page of row-level data /data returns
+MAX_DATA_PAGE_SIZE = 1000
+
 async def get_current_user_id(token: str = Depends(oauth2_scheme)):
     payload = decode_access_token(token)
     if payload is None:
@@ -81,6 +93,201 @@ async def get_analysis_results(
 
     return json.loads(analysis.results_json)
 
+def _finished_status(analysis_id: int) -> Optional[str]:
+    db = SessionLocal()
+    try:
+        analysis = db.query(Analysis).filter(Analysis.id == analysis_id).first()
+        if analysis and analysis.status in (AnalysisStatus.COMPLETED, AnalysisStatus.FAILED):
+            return analysis.status.value
+        return None
+    finally:
+        db.close()
+
+@router.get("/{analysis_id}/stream")
+async def stream_analysis(
+    analysis_id: int,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Server-sent events for an analysis: a "section" event ({"key", "value"}) for
+    each results section as soon as it is ready, then a "done" event with the
+    final status. Finished analyses replay their stored sections at once.
+    """
+    analysis = db.query(Analysis).filter(
+        Analysis.id == analysis_id,
+        Analysis.user_id == user_id
+    ).first()
+
+    if not analysis:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Analysis not found"
+        )
+
+    if analysis.status in (AnalysisStatus.COMPLETED, AnalysisStatus.FAILED):
+        results = json.loads(analysis.results_json) if analysis.results_json else {}
+        messages = [analysis_stream.format_sse("section", {"key": key, "value": value}) for key, value in results.items()]
+        messages.append(analysis_stream.format_sse("done", {"status": analysis.status.value, "error": analysis.error_message}))
+        events = iter(messages)
+    else:
+        events = analysis_stream.listen(analysis_id, lambda: asyncio.to_thread(_finished_status, analysis_id))
+
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # Proxies (nginx) must not buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/{analysis_id}/sections/{section}/regenerate")
+async def regenerate_analysis_section(
+    analysis_id: int,
+    section: str,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """Regenerate one section of a completed analysis, leaving the others as they are"""
+    if section not in REGENERABLE_SECTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Section must be one of: {', '.join(REGENERABLE_SECTIONS)}"
+        )
+
+    analysis = db.query(Analysis).filter(
+        Analysis.id == analysis_id,
+        Analysis.user_id == user_id
+    ).first()
+
+    if not analysis:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Analysis not found"
+        )
+
+    if not analysis.results_json:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Analysis not completed yet"
+        )
+
+    results = json.loads(analysis.results_json)
+    local_report = results.get("local_report")
+
+    # Analyses from before prompts (or the local_report flag) were stored can still use a cached parse
+    prompt = analysis.ai_prompt
+    if not prompt or local_report is None:
+        cached = get_cached_summary(analysis.content_hash)
+        prompt = prompt or (cached["prompt"] if cached else None)
+        if local_report is None:
+            local_report = bool(cached and (cached["parsed"].get("analytics") or {}).get("performance_report"))
+    if not prompt:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The data this analysis ran on is no longer available; re-upload the file to analyze it again"
+        )
+
+    try:
+        value = await regenerate_section(prompt, section, local_report)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Regenerating {section} failed: {str(e)}"
+        )
+
+    # Re-read under a row lock so concurrent regenerations of other sections are kept
+    analysis = db.query(Analysis).filter(Analysis.id == analysis_id).with_for_update().populate_existing().first()
+    results = json.loads(analysis.results_json)
+    results[section] = value
+    section_errors = results.pop("section_errors", {})
+    section_errors.pop(section, None)
+    if section_errors:
+        results["section_errors"] = section_errors
+    analysis.results_json = json.dumps(results)
+    db.commit()
+
+    return {"section": section, "value": value}
+
+@router.get("/{analysis_id}/data")
+async def get_analysis_data(
+    analysis_id: int,
+    columns: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_DATA_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Get row-level data from the parsed CSV snapshot, reading only the requested
+    columns of the row groups that hold the page
+    """
+    analysis = db.query(Analysis).filter(
+        Analysis.id == analysis_id,
+        Analysis.user_id == user_id
+    ).first()
+
+    if not analysis:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Analysis not found"
+        )
+
+    handle = await asyncio.to_thread(open_snapshot, analysis_id, analysis.snapshot_url)
+    if not handle:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No parsed data available for this analysis"
+        )
+
+    selected = [col.strip() for col in columns.split(",")] if columns else None
+    page = await asyncio.to_thread(read_snapshot_rows, handle, selected, offset, limit)
+
+    return {
+        "total_rows": handle["rows"],
+        "columns": list(page.columns),
+        "rows": json.loads(page.to_json(orient="records"))
+    }
+
+def _aggregate_breakdowns(handle: dict) -> dict:
+    schema = resolve_schema(handle["columns"])
+    breakdowns = BreakdownAccumulator(schema)
+    date_parser = DateParser(schema)
+    for df in iter_snapshot(handle, columns=schema.usecols):
+        breakdowns.update(date_parser.apply(df))
+    return breakdowns.result()
+
+@router.get("/{analysis_id}/breakdowns")
+async def get_analysis_breakdowns(
+    analysis_id: int,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """Get per-campaign, per-ad-set and per-day aggregates for an analysis"""
+    analysis = db.query(Analysis).filter(
+        Analysis.id == analysis_id,
+        Analysis.user_id == user_id
+    ).first()
+
+    if not analysis:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Analysis not found"
+        )
+
+    results = json.loads(analysis.results_json) if analysis.results_json else {}
+    if results.get("breakdowns"):
+        return results["breakdowns"]
+
+    # Older analyses: aggregate from the snapshot batch by batch, reading only the needed columns
+    handle = await asyncio.to_thread(open_snapshot, analysis_id, analysis.snapshot_url)
+    if not handle:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No parsed data available for this analysis"
+        )
+
+    return await asyncio.to_thread(_aggregate_breakdowns, handle)
+
 @router.get("/{analysis_id}/download-pdf")
 async def download_pdf(
     analysis_id: int,
@@ -165,6 +372,45 @@ async def download_pdf_with_charts(
         filename=f"meta_ads_analysis_{analysis_id}.pdf"
     )
 
+@router.post("/{analysis_id}/retry")
+async def retry_analysis(
+    analysis_id: int,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """Re-queue a failed analysis; a cached parse of the file skips straight to the AI stage"""
+    analysis = db.query(Analysis).filter(
+        Analysis.id == analysis_id,
+        Analysis.user_id == user_id
+    ).first()
+
+    if not analysis:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Analysis not found"
+        )
+
+    if analysis.status != AnalysisStatus.FAILED:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only failed analyses can be retried"
+        )
+
+    analysis.status = AnalysisStatus.PENDING
+    analysis.error_message = None
+    db.commit()
+    # Stream listeners must not replay the failed run's "done" event
+    analysis_stream.reset(analysis.id)
+
+    task_result = process_csv_task.delay(analysis.id)
+
+    return {
+        "message": "Analysis re-queued",
+        "analysis_id": analysis.id,
+        "status": analysis.status.value,
+        "task_id": task_result.id
+    }
+
 @router.delete("/{analysis_id}")
 async def delete_analysis(
     analysis_id: int,
@@ -183,7 +429,9 @@ async def delete_analysis(
             detail="Analysis not found"
         )
 
+    snapshot_url = analysis.snapshot_url
     db.delete(analysis)
     db.commit()
+    delete_snapshot(analysis_id, snapshot_url)
 
     return {"message": "Analysis deleted successfully"}
@@ -1,13 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Request, Query, Header
 from sqlalchemy.orm import Session
+from typing import Optional
+import asyncio
+import uuid
 from app.database import get_db
 from app.models.analysis import Analysis, AnalysisStatus
+from app.models.upload_session import UploadSession, UploadSessionStatus, UploadMethod
+from app.schemas.upload import UploadSessionCreate, UploadSessionResponse, DirectUploadTarget
 from app.routes.auth import oauth2_scheme
 from app.utils.auth import decode_access_token
 from config import settings
-from datetime import datetime
-from app.services.celery_tasks import process_csv_task
-from app.services.cloudinary_service import upload_csv_to_cloudinary
+from datetime import datetime, timedelta
+from app.services.celery_tasks import copy_previous_results, process_csv_task
+from app.services.storage_service import get_storage, storage_for_url, LocalStorage
+from app.utils.fingerprint import ContentFingerprint
+from app.utils.compression import is_supported_upload, compression_for, StreamDecompressor
+from app.utils import resumable
 
 router = APIRouter()
 
@@ -20,6 +28,167 @@ async def get_current_user_id(token: str = Depends(oauth2_scheme)):
         )
     return payload.get("user_id")
 
+class UploadPipeline:
+    """
+    Per-chunk upload processing shared by direct and resumable uploads:
+    enforce MAX_FILE_SIZE (compressed size), fingerprint the content and
+    forward the bytes to a storage sink. gzip and zstd uploads are
+    decompressed on the fly for the fingerprint so the same export matches
+    whether or not it was compressed; ZIP archives hash their raw bytes.
+    """
+
+    def __init__(self, filename: str, sink):
+        compression = compression_for(filename)
+        self.sink = sink
+        self.fingerprint = ContentFingerprint()
+        self.decompressor = StreamDecompressor(compression) if compression in ("gzip", "zstd") else None
+        self.size = 0
+
+    def feed(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > settings.MAX_FILE_SIZE:
+            self.sink.abort()
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File size exceeds maximum limit of {settings.MAX_FILE_SIZE / (1024*1024)}MB"
+            )
+
+        if self.decompressor:
+            try:
+                for piece in self.decompressor.decompress(chunk):
+                    self.fingerprint.update(piece)
+            except Exception:
+                self.sink.abort()
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="File is not a valid compressed CSV"
+                )
+        else:
+            self.fingerprint.update(chunk)
+        self.sink.write(chunk)
+
+    def result(self) -> tuple:
+        """Returns (size in bytes, normalized content fingerprint)"""
+        return self.size, self.fingerprint.hexdigest()
+
+async def stream_upload(file: UploadFile, sink) -> tuple:
+    """
+    Copy an upload to a storage sink in UPLOAD_CHUNK_SIZE pieces.
+    Hashing and sink writes (which may send an S3 part) run in a worker
+    thread so the event loop keeps serving other requests.
+    Returns (size in bytes, normalized content fingerprint).
+    """
+    pipeline = UploadPipeline(file.filename, sink)
+
+    while True:
+        chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        await asyncio.to_thread(pipeline.feed, chunk)
+
+    return pipeline.result()
+
+def create_analysis_for_upload(db: Session, user_id: int, safe_filename: str, sink,
+                               file_size: int, content_hash: str) -> dict:
+    """
+    Turn a fully streamed upload into an Analysis.
+    Reuses a completed analysis of the same content when one exists,
+    otherwise finishes the storage upload and enqueues processing.
+    Blocking (finish() sends the rest of the file); async routes call it
+    through asyncio.to_thread.
+
+    Returns:
+        Response payload for the upload endpoints
+    """
+    # Reuse a completed analysis of the same content instead of re-running it
+    previous = db.query(Analysis).filter(
+        Analysis.user_id == user_id,
+        Analysis.content_hash == content_hash,
+        Analysis.status == AnalysisStatus.COMPLETED,
+        Analysis.results_json.isnot(None)
+    ).order_by(Analysis.completed_at.desc()).first()
+
+    if previous:
+        sink.abort()
+
+        analysis = Analysis(
+            user_id=user_id,
+            csv_filename=safe_filename,
+            content_hash=content_hash,
+            status=AnalysisStatus.COMPLETED,
+            completed_at=datetime.utcnow()
+        )
+
+        db.add(analysis)
+        # The snapshot copy is named after the new analysis id
+        db.flush()
+        copy_previous_results(analysis, previous)
+        db.commit()
+        db.refresh(analysis)
+
+        return {
+            "message": "File already analyzed, reusing previous results",
+            "analysis_id": analysis.id,
+            "status": analysis.status.value,
+            "task_id": None,
+            "file_size": file_size,
+            "content_hash": content_hash,
+            "cache_hit": True,
+            "source_analysis_id": previous.id
+        }
+
+    try:
+        csv_url = sink.finish()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to upload file: {str(e)}"
+        )
+
+    # Create analysis record with the storage URL
+    analysis = Analysis(
+        user_id=user_id,
+        csv_filename=safe_filename,
+        csv_url=csv_url,
+        content_hash=content_hash,
+        status=AnalysisStatus.PENDING
+    )
+
+    db.add(analysis)
+    db.commit()
+    db.refresh(analysis)
+
+    # Trigger async processing
+    task_result = process_csv_task.delay(analysis.id)
+
+    return {
+        "message": "File uploaded successfully",
+        "analysis_id": analysis.id,
+        "status": analysis.status.value,
+        "task_id": task_result.id,
+        "file_size": file_size,
+        "content_hash": content_hash,
+        "cache_hit": False
+    }
+
+def validate_upload_filename(filename: str):
+    if not filename or not is_supported_upload(filename):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only CSV files are allowed (.csv, .csv.gz, .csv.zst or .zip)"
+        )
+
+def validate_upload_size(size: Optional[int]):
+    if size is not None and size > settings.MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File size exceeds maximum limit of {settings.MAX_FILE_SIZE / (1024*1024)}MB"
+        )
+
+def make_safe_filename(user_id: int, filename: str) -> str:
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{user_id}_{timestamp}_{filename}"
+
 @router.post("/csv")
 async def upload_csv(
     file: UploadFile = File(...),
@@ -27,44 +196,444 @@ async def upload_csv(
     user_id: int = Depends(get_current_user_id)
 ):
     # Validate file type
-    if not file.filename.endswith('.csv'):
+    validate_upload_filename(file.filename)
+
+    # Reject early when the multipart parser already knows the size
+    validate_upload_size(file.size)
+
+    # Generate safe filename
+    safe_filename = make_safe_filename(user_id, file.filename)
+
+    # Stream the upload to storage, enforcing the size limit and hashing as we go
+    sink = get_storage().open_upload(safe_filename)
+    file_size, content_hash = await stream_upload(file, sink)
+
+    return await asyncio.to_thread(
+        create_analysis_for_upload, db, user_id, safe_filename, sink, file_size, content_hash
+    )
+
+# ---- Resumable uploads -------------------------------------------------------
+# Large exports can be sent as numbered chunks that are staged on disk, so a
+# dropped connection only costs the chunk in flight. Finalizing streams the
+# staged chunks through the same pipeline as a direct upload.
+
+def get_upload_session(db: Session, session_id: str, user_id: int,
+                       method: UploadMethod = UploadMethod.CHUNKED) -> UploadSession:
+    session = db.query(UploadSession).filter(
+        UploadSession.id == session_id,
+        UploadSession.user_id == user_id,
+        UploadSession.method == method
+    ).first()
+
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload session not found"
+        )
+
+    return session
+
+def upload_session_response(session: UploadSession) -> dict:
+    total_chunks = resumable.chunk_count(session.total_size, session.chunk_size)
+    if session.status == UploadSessionStatus.OPEN:
+        received = resumable.staged_chunks(session.id, session.total_size, session.chunk_size)
+    elif session.status in (UploadSessionStatus.FINALIZING, UploadSessionStatus.COMPLETED):
+        received = list(range(total_chunks))
+    else:
+        received = []
+
+    received_set = set(received)
+    return {
+        "session_id": session.id,
+        "filename": session.filename,
+        "status": session.status.value,
+        "total_size": session.total_size,
+        "chunk_size": session.chunk_size,
+        "total_chunks": total_chunks,
+        "received_ranges": resumable.received_ranges(received, session.total_size, session.chunk_size),
+        "missing_chunks": [index for index in range(total_chunks) if index not in received_set],
+        "analysis_id": session.analysis_id,
+        "created_at": session.created_at
+    }
+
+@router.post("/sessions", response_model=UploadSessionResponse)
+async def create_upload_session(
+    payload: UploadSessionCreate,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    validate_upload_filename(payload.filename)
+    validate_upload_size(payload.total_size)
+
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        filename=payload.filename,
+        total_size=payload.total_size,
+        chunk_size=settings.RESUMABLE_CHUNK_SIZE,
+        method=UploadMethod.CHUNKED,
+        status=UploadSessionStatus.OPEN
+    )
+
+    db.add(session)
+    db.commit()
+    db.refresh(session)
+
+    return upload_session_response(session)
+
+@router.get("/sessions/{session_id}", response_model=UploadSessionResponse)
+async def get_upload_session_status(
+    session_id: str,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    session = get_upload_session(db, session_id, user_id)
+    return upload_session_response(session)
+
+@router.put("/sessions/{session_id}/chunks/{index}")
+async def upload_session_chunk(
+    session_id: str,
+    index: int,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    x_chunk_sha256: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Stage chunk `index` of a session. The raw request body is the chunk;
+    `offset` must equal index * chunk_size so clients cannot silently
+    misplace data. An optional X-Chunk-SHA256 header (hex) is checked
+    against the received bytes. Re-sending a chunk replaces the staged copy.
+    """
+    session = get_upload_session(db, session_id, user_id)
+
+    if session.status != UploadSessionStatus.OPEN:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload session is {session.status.value}"
+        )
+
+    total_chunks = resumable.chunk_count(session.total_size, session.chunk_size)
+    if index < 0 or index >= total_chunks:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Chunk index must be between 0 and {total_chunks - 1}"
+        )
+
+    if offset != index * session.chunk_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Chunk {index} must start at offset {index * session.chunk_size}"
+        )
+
+    expected = resumable.expected_chunk_length(index, session.total_size, session.chunk_size)
+    writer = resumable.ChunkWriter(session.id, index)
+    try:
+        async for data in request.stream():
+            writer.write(data)
+            if writer.size > expected:
+                break
+    except Exception:
+        writer.abort()
+        raise
+
+    if writer.size != expected:
+        writer.abort()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Only CSV files are allowed"
+            detail=f"Chunk {index} must be exactly {expected} bytes"
         )
 
-    # Check file size
-    contents = await file.read()
-    file_size = len(contents)
+    if x_chunk_sha256 and writer.hexdigest() != x_chunk_sha256.strip().lower():
+        writer.abort()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Chunk {index} does not match its X-Chunk-SHA256 checksum"
+        )
+
+    writer.commit()
+
+    return {
+        "session_id": session.id,
+        "index": index,
+        "offset": offset,
+        "size": expected
+    }
+
+def assemble_staged_upload(db: Session, user_id: int, session: UploadSession, total_chunks: int,
+                           safe_filename: str, sink) -> dict:
+    """Stream the staged chunks of a session through the upload pipeline into an Analysis"""
+    pipeline = UploadPipeline(session.filename, sink)
+    for data in resumable.read_staged(session.id, total_chunks, settings.UPLOAD_CHUNK_SIZE):
+        pipeline.feed(data)
+    file_size, content_hash = pipeline.result()
+
+    return create_analysis_for_upload(db, user_id, safe_filename, sink, file_size, content_hash)
+
+@router.post("/sessions/{session_id}/finalize")
+async def finalize_upload_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Assemble the staged chunks and hand the file to processing.
+    The OPEN -> FINALIZING transition is a conditional UPDATE, so concurrent
+    or repeated finalize calls enqueue the analysis exactly once.
+    """
+    session = get_upload_session(db, session_id, user_id)
+
+    if session.status == UploadSessionStatus.COMPLETED:
+        analysis = db.query(Analysis).filter(Analysis.id == session.analysis_id).first()
+        return {
+            "message": "Upload session already finalized",
+            "analysis_id": session.analysis_id,
+            "status": analysis.status.value if analysis else None,
+            "task_id": None,
+            "already_finalized": True
+        }
+
+    if session.status != UploadSessionStatus.OPEN:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload session is {session.status.value}"
+        )
+
+    total_chunks = resumable.chunk_count(session.total_size, session.chunk_size)
+    received = resumable.staged_chunks(session.id, session.total_size, session.chunk_size)
+    if len(received) != total_chunks:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Upload incomplete: {total_chunks - len(received)} chunk(s) missing"
+        )
+
+    claimed = db.query(UploadSession).filter(
+        UploadSession.id == session.id,
+        UploadSession.status == UploadSessionStatus.OPEN
+    ).update({UploadSession.status: UploadSessionStatus.FINALIZING}, synchronize_session=False)
+    db.commit()
+
+    if claimed != 1:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload session is already being finalized"
+        )
+
+    safe_filename = make_safe_filename(user_id, session.filename)
+    sink = get_storage().open_upload(safe_filename)
+    try:
+        # Reading, hashing and uploading the whole file is blocking work
+        response = await asyncio.to_thread(
+            assemble_staged_upload, db, user_id, session, total_chunks, safe_filename, sink
+        )
+    except Exception:
+        # Let the client retry the finalize with the chunks still staged
+        db.rollback()
+        sink.abort()
+        db.query(UploadSession).filter(UploadSession.id == session.id).update(
+            {UploadSession.status: UploadSessionStatus.OPEN}, synchronize_session=False
+        )
+        db.commit()
+        raise
+
+    db.query(UploadSession).filter(UploadSession.id == session.id).update({
+        UploadSession.status: UploadSessionStatus.COMPLETED,
+        UploadSession.analysis_id: response["analysis_id"]
+    }, synchronize_session=False)
+    db.commit()
+
+    resumable.discard_session(session.id)
+
+    response["session_id"] = session.id
+    response["already_finalized"] = False
+    return response
+
+@router.delete("/sessions/{session_id}")
+async def abort_upload_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    session = get_upload_session(db, session_id, user_id)
+
+    claimed = db.query(UploadSession).filter(
+        UploadSession.id == session.id,
+        UploadSession.status == UploadSessionStatus.OPEN
+    ).update({UploadSession.status: UploadSessionStatus.ABORTED}, synchronize_session=False)
+    db.commit()
+
+    if claimed != 1:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload session is {session.status.value}"
+        )
+
+    resumable.discard_session(session.id)
+
+    return {"message": "Upload session aborted"}
+
+# ---- Direct-to-storage uploads ------------------------------------------------
+# The client uploads straight to storage with a signed target, then calls
+# complete; the API never handles the CSV bytes. The local backend simulates
+# the presigned URL with a token-authenticated PUT route below.
+
+@router.post("/direct", response_model=DirectUploadTarget)
+async def create_direct_upload(
+    payload: UploadSessionCreate,
+    request: Request,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    validate_upload_filename(payload.filename)
+    validate_upload_size(payload.total_size)
+
+    safe_filename = make_safe_filename(user_id, payload.filename)
+    try:
+        target = get_storage().signed_upload(
+            safe_filename, settings.MAX_FILE_SIZE, settings.DIRECT_UPLOAD_EXPIRES
+        )
+    except NotImplementedError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The configured storage backend does not support direct uploads"
+        )
+
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        filename=payload.filename,
+        total_size=payload.total_size,
+        method=UploadMethod.DIRECT,
+        storage_url=target["storage_url"],
+        status=UploadSessionStatus.OPEN
+    )
+
+    db.add(session)
+    db.commit()
+
+    url = target["url"]
+    if url.startswith("/"):
+        # Simulated targets are routes on this API
+        url = str(request.base_url).rstrip("/") + url
+
+    return {
+        "session_id": session.id,
+        "method": target["method"],
+        "url": url,
+        "fields": target["fields"],
+        "headers": target["headers"],
+        "file_field": target["file_field"],
+        "expires_at": datetime.utcnow() + timedelta(seconds=settings.DIRECT_UPLOAD_EXPIRES)
+    }
+
+@router.put("/direct/local/{token}")
+async def receive_local_direct_upload(token: str, request: Request):
+    """
+    Stand-in for a presigned storage URL when STORAGE_BACKEND=local.
+    Authenticated by the signed token alone, like a real presigned URL, and
+    the token is consumed by the first request that presents it.
+    """
+    storage = get_storage()
+    claims = storage.consume_upload_token(token) if isinstance(storage, LocalStorage) else None
+    if claims is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid, expired or already used upload token"
+        )
+
+    sink = storage.open_upload_for_key(claims["key"])
+    try:
+        async for data in request.stream():
+            sink.write(data)
+            if sink.size > claims["max_size"]:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"File size exceeds maximum limit of {settings.MAX_FILE_SIZE / (1024*1024)}MB"
+                )
+    except Exception:
+        sink.abort()
+        raise
+
+    await asyncio.to_thread(sink.finish)
+    return {"size": sink.size}
+
+@router.post("/direct/{session_id}/complete")
+async def complete_direct_upload(
+    session_id: str,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Register a file the client uploaded to storage and start processing.
+    Same exactly-once claim as resumable finalize. The API never sees the
+    bytes, so the worker computes the content hash and, when an earlier
+    analysis of the same content completed, reuses its results instead of
+    re-running the analysis (content_hash is null in this response).
+    """
+    session = get_upload_session(db, session_id, user_id, UploadMethod.DIRECT)
+
+    if session.status == UploadSessionStatus.COMPLETED:
+        analysis = db.query(Analysis).filter(Analysis.id == session.analysis_id).first()
+        return {
+            "message": "Upload already completed",
+            "analysis_id": session.analysis_id,
+            "status": analysis.status.value if analysis else None,
+            "task_id": None,
+            "already_finalized": True
+        }
+
+    if session.status != UploadSessionStatus.OPEN:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload session is {session.status.value}"
+        )
+
+    storage = storage_for_url(session.storage_url)
+    file_size = storage.object_size(session.storage_url)
+    if file_size is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File has not been uploaded to storage yet"
+        )
 
     if file_size > settings.MAX_FILE_SIZE:
+        storage.delete(session.storage_url)
+        db.query(UploadSession).filter(UploadSession.id == session.id).update(
+            {UploadSession.status: UploadSessionStatus.ABORTED}, synchronize_session=False
+        )
+        db.commit()
         raise HTTPException(
             status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
             detail=f"File size exceeds maximum limit of {settings.MAX_FILE_SIZE / (1024*1024)}MB"
         )
 
-    # Generate safe filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    safe_filename = f"{user_id}_{timestamp}_{file.filename}"
+    claimed = db.query(UploadSession).filter(
+        UploadSession.id == session.id,
+        UploadSession.status == UploadSessionStatus.OPEN
+    ).update({UploadSession.status: UploadSessionStatus.FINALIZING}, synchronize_session=False)
+    db.commit()
 
-    # Upload to Cloudinary
-    try:
-        csv_url = upload_csv_to_cloudinary(contents, safe_filename)
-    except Exception as e:
+    if claimed != 1:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to upload file: {str(e)}"
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload session is already being finalized"
         )
 
-    # Create analysis record with Cloudinary URL
     analysis = Analysis(
         user_id=user_id,
-        csv_filename=safe_filename,
-        csv_url=csv_url,  # Store Cloudinary URL
+        csv_filename=session.storage_url.rsplit("/", 1)[-1],
+        csv_url=session.storage_url,
         status=AnalysisStatus.PENDING
     )
 
     db.add(analysis)
+    db.flush()
+
+    db.query(UploadSession).filter(UploadSession.id == session.id).update({
+        UploadSession.status: UploadSessionStatus.COMPLETED,
+        UploadSession.analysis_id: analysis.id
+    }, synchronize_session=False)
     db.commit()
     db.refresh(analysis)
 
@@ -75,7 +644,12 @@ async def upload_csv(
         "message": "File uploaded successfully",
         "analysis_id": analysis.id,
         "status": analysis.status.value,
-        "task_id": task_result.id
+        "task_id": task_result.id,
+        "file_size": file_size,
+        "content_hash": None,
+        "cache_hit": False,
+        "session_id": session.id,
+        "already_finalized": False
     }
 
 @router.get("/queue-status")
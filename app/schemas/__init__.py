@@ -18,6 +18,7 @@ from .report import (
     ReportStatusEnum,
     ReportSourceTypeEnum
 )
+from .upload import UploadSessionCreate, UploadSessionResponse, DirectUploadTarget
 
 __all__ = [
     "UserCreate", "UserLogin", "UserResponse", "Token",
@@ -26,5 +27,6 @@ __all__ = [
     "SocialAccountCreate", "SocialAccountResponse", "SocialAccountUpdate",
     "CampaignCreate", "CampaignResponse", "CampaignUpdate",
     "ReportGenerate", "ReportResponse", "ReportStatusResponse",
-    "EmailReportRequest", "ReportStatusEnum", "ReportSourceTypeEnum"
+    "EmailReportRequest", "ReportStatusEnum", "ReportSourceTypeEnum",
+    "UploadSessionCreate", "UploadSessionResponse", "DirectUploadTarget"
 ]
@@ -6,6 +6,7 @@ class AnalysisResponse(BaseModel):
     id: int
     user_id: int
     csv_filename: str
+    content_hash: Optional[str] = None
     status: str
     results_json: Optional[str] = None
     error_message: Optional[str] = None
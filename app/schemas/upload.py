@@ -0,0 +1,28 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Optional, List, Dict
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    total_size: int = Field(..., gt=0)
+
+class DirectUploadTarget(BaseModel):
+    session_id: str
+    method: str  # HTTP method the client uses against url
+    url: str
+    fields: Dict[str, str] = {}  # Form fields for multipart POST targets
+    headers: Dict[str, str] = {}  # Headers for PUT targets
+    file_field: Optional[str] = None  # Form field name for the file in POST targets
+    expires_at: datetime
+
+class UploadSessionResponse(BaseModel):
+    session_id: str
+    filename: str
+    status: str
+    total_size: int
+    chunk_size: int
+    total_chunks: int
+    received_ranges: List[List[int]]  # [start, end) byte ranges already staged
+    missing_chunks: List[int]
+    analysis_id: Optional[int] = None
+    created_at: datetime
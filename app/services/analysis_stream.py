@@ -0,0 +1,116 @@
+import json
+from typing import Any, AsyncIterator, Dict, Optional
+from config import settings
+
+REDIS_PREFIX = "analysis_stream"
+
+# Seconds an analysis's published events are kept for clients that connect late
+EVENTS_TTL = 3600
+# Seconds between SSE keep-alive comments; also how often a listener re-checks
+# whether the analysis finished without a "done" event (worker killed mid-task)
+HEARTBEAT_SECONDS = 15
+
+def _json_default(value):
+    # numpy scalars from the analytics -> plain Python numbers
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+def _channel(analysis_id: int) -> str:
+    return f"{REDIS_PREFIX}:{analysis_id}"
+
+def _events_key(analysis_id: int) -> str:
+    return f"{REDIS_PREFIX}:{analysis_id}:events"
+
+_redis = None
+
+def _get_redis():
+    global _redis
+    if _redis is None:
+        import redis
+        _redis = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis
+
+def publish(analysis_id: int, event: str, data: Dict[str, Any]):
+    """
+    Publish one event for an analysis's stream listeners (errors are logged,
+    never raised). Events are also appended to a replay list, since pub/sub
+    only reaches clients that are already subscribed.
+    """
+    try:
+        client = _get_redis()
+        seq = client.incr(f"{_events_key(analysis_id)}:seq")
+        message = json.dumps({"seq": seq, "event": event, "data": data}, default=_json_default)
+        pipe = client.pipeline()
+        pipe.rpush(_events_key(analysis_id), message)
+        pipe.expire(_events_key(analysis_id), EVENTS_TTL)
+        pipe.expire(f"{_events_key(analysis_id)}:seq", EVENTS_TTL)
+        pipe.publish(_channel(analysis_id), message)
+        pipe.execute()
+    except Exception as e:
+        print(f"Warning: Analysis stream publish failed for analysis {analysis_id}: {e}")
+
+def reset(analysis_id: int):
+    """Drop a previous run's events (before a retry) so late clients do not replay them"""
+    try:
+        _get_redis().delete(_events_key(analysis_id))
+    except Exception as e:
+        print(f"Warning: Analysis stream reset failed for analysis {analysis_id}: {e}")
+
+def publish_section(analysis_id: int, key: str, value: Any):
+    """One finished results_json section, e.g. ("ai_insights", [...])"""
+    publish(analysis_id, "section", {"key": key, "value": value})
+
+def publish_done(analysis_id: int, status: str, error: Optional[str] = None):
+    """Final event: the analysis completed (full results at /results) or failed"""
+    publish(analysis_id, "done", {"status": status, "error": error})
+
+def format_sse(event: str, data: Dict[str, Any], seq: Optional[int] = None) -> str:
+    lines = [f"id: {seq}"] if seq is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data, default=_json_default)}"]
+    return "\n".join(lines) + "\n\n"
+
+async def listen(analysis_id: int, finished_status) -> AsyncIterator[str]:
+    """
+    SSE messages for an analysis in progress: events published so far, then
+    live ones, until "done".
+    Args:
+        analysis_id: Analysis to follow
+        finished_status: Async callable returning the stored status ("completed"
+            or "failed") once the analysis is finished, else None; used when the
+            worker died before publishing "done"
+    """
+    import redis.asyncio as aioredis
+    client = aioredis.Redis.from_url(settings.REDIS_URL)
+    pubsub = client.pubsub()
+    try:
+        # Subscribe before reading the replay list so no event falls in between
+        await pubsub.subscribe(_channel(analysis_id))
+        last_seq = 0
+        for raw in await client.lrange(_events_key(analysis_id), 0, -1):
+            message = json.loads(raw)
+            last_seq = message["seq"]
+            yield format_sse(message["event"], message["data"], message["seq"])
+            if message["event"] == "done":
+                return
+
+        while True:
+            raw = await pubsub.get_message(ignore_subscribe_messages=True, timeout=HEARTBEAT_SECONDS)
+            if raw is None:
+                status = await finished_status()
+                if status:
+                    yield format_sse("done", {"status": status, "error": None})
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            message = json.loads(raw["data"])
+            if message["seq"] <= last_seq:
+                continue
+            last_seq = message["seq"]
+            yield format_sse(message["event"], message["data"], message["seq"])
+            if message["event"] == "done":
+                return
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.close()
+        await client.close()
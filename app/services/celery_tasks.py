@@ -2,12 +2,56 @@ from app.services.celery_app import celery_app
 from app.database import SessionLocal
 from app.models.analysis import Analysis, AnalysisStatus
 from app.utils.csv_parser import parse_meta_ads_csv, format_metrics_for_ai
-from app.services.openai_service import analyze_meta_ads
+from app.services.openai_service import analyze_meta_ads, refresh_competitors
 from app.services.email_service import send_analysis_email
 from app.services.pdf_service import generate_pdf
-from app.services.cloudinary_service import download_csv_from_cloudinary, delete_csv_from_cloudinary
+from app.services.storage_service import storage_for_url
+from app.utils.compression import strip_extension
+from app.utils.fingerprint import fingerprint_file
+from app.utils.snapshot import reuse_snapshot, snapshot_path, store_snapshot
+from app.services.summary_cache import get_cached_summary, cache_summary
+from app.services import analysis_stream
+from config import settings
 from datetime import datetime
 import json
+import os
+import tempfile
+
+def copy_previous_results(analysis: Analysis, previous: Analysis):
+    """
+    Give an analysis the outputs of an earlier one of the same content: its
+    results, its prompt (to regenerate sections) and its own copy of the row
+    snapshot (for /data and /breakdowns). analysis.id must already be assigned.
+    """
+    analysis.results_json = previous.results_json
+    analysis.ai_prompt = previous.ai_prompt
+    # Analyses from before snapshots were stored keep theirs on the worker's disk
+    source = {"analysis_id": previous.id}
+    if previous.snapshot_url:
+        source["url"] = previous.snapshot_url
+    else:
+        source["path"] = snapshot_path(previous.id)
+    snapshot = reuse_snapshot(source, analysis.id)
+    analysis.snapshot_url = (snapshot or {}).get("url")
+
+def _reuse_previous_analysis(db, analysis: Analysis, previous: Analysis) -> dict:
+    """Complete an analysis with the results of an earlier one of the same content"""
+    print(f"Analysis {analysis.id} has the same content as {previous.id}, reusing its results")
+    csv_url = analysis.csv_url
+    copy_previous_results(analysis, previous)
+    analysis.csv_url = None
+    analysis.status = AnalysisStatus.COMPLETED
+    analysis.completed_at = datetime.utcnow()
+    db.commit()
+    analysis_stream.publish_done(analysis.id, AnalysisStatus.COMPLETED.value)
+
+    # Like a proxied duplicate upload, the file itself is not kept
+    try:
+        storage_for_url(csv_url).delete(csv_url)
+    except Exception as cleanup_error:
+        print(f"Warning: Storage cleanup failed: {cleanup_error}")
+
+    return {"status": "success", "analysis_id": analysis.id, "cache_hit": True, "source_analysis_id": previous.id}
 
 @celery_app.task(name="process_csv_task")
 def process_csv_task(analysis_id: int):
@@ -16,6 +60,8 @@ def process_csv_task(analysis_id: int):
     """
     db = SessionLocal()
     analysis = None
+    csv_path = None
+    temp_path = None
 
     try:
         # Get analysis record
@@ -29,28 +75,95 @@ def process_csv_task(analysis_id: int):
         # Update status to processing
         analysis.status = AnalysisStatus.PROCESSING
         db.commit()
+        analysis_stream.reset(analysis_id)
+
+        # Retries and re-uploads of the same content skip straight to the AI stage
+        cached = get_cached_summary(analysis.content_hash)
+
+        if cached is None:
+            # Local storage is parsed in place; remote storage is streamed to a
+            # temp file that keeps the extension so the parser can pick the decompressor
+            storage = storage_for_url(analysis.csv_url)
+            csv_path = storage.local_path(analysis.csv_url)
+            if csv_path is None:
+                extension = analysis.csv_filename[len(strip_extension(analysis.csv_filename)):] or ".csv"
+                fd, temp_path = tempfile.mkstemp(suffix=extension)
+                os.close(fd)
+                print(f"Downloading CSV from {storage.name} storage for analysis {analysis_id}")
+                csv_path = storage.download_to_file(analysis.csv_url, temp_path)
 
-        # Download CSV from Cloudinary
-        print(f"Downloading CSV from Cloudinary for analysis {analysis_id}")
-        csv_content = download_csv_from_cloudinary(analysis.csv_url)
+            # Direct-to-storage uploads never pass through the API, so hash
+            # and deduplicate here, as the upload routes do for proxied uploads
+            if not analysis.content_hash:
+                analysis.content_hash = fingerprint_file(csv_path)
+                db.commit()
+                previous = db.query(Analysis).filter(
+                    Analysis.user_id == analysis.user_id,
+                    Analysis.id != analysis_id,
+                    Analysis.content_hash == analysis.content_hash,
+                    Analysis.status == AnalysisStatus.COMPLETED,
+                    Analysis.results_json.isnot(None)
+                ).order_by(Analysis.completed_at.desc()).first()
+                if previous:
+                    return _reuse_previous_analysis(db, analysis, previous)
+                cached = get_cached_summary(analysis.content_hash)
 
-        # Parse CSV
-        print(f"Parsing CSV content for analysis {analysis_id}")
-        parsed_data = parse_meta_ads_csv(csv_content, from_string=True)
+        if cached is not None:
+            print(f"Reusing cached parse for analysis {analysis_id}")
+            parsed_data, ai_prompt = cached["parsed"], cached["prompt"]
+            parsed_data["snapshot"] = reuse_snapshot(parsed_data.get("snapshot"), analysis_id)
+        else:
+            # Parse CSV
+            print(f"Parsing CSV content for analysis {analysis_id}")
+            parsed_data = parse_meta_ads_csv(
+                csv_path,
+                chunksize=settings.CSV_CHUNK_SIZE or None,
+                snapshot_id=analysis_id,
+                workers=settings.CSV_PARALLEL_WORKERS
+            )
+
+            # The API service reads the snapshot, so it goes to shared storage
+            parsed_data["snapshot"] = store_snapshot(parsed_data.get("snapshot"))
+
+            # Format for AI
+            print(f"Formatting data for AI analysis")
+            ai_prompt = format_metrics_for_ai(parsed_data)
+            cache_summary(analysis.content_hash, parsed_data, ai_prompt)
 
-        # Format for AI
-        print(f"Formatting data for AI analysis")
-        ai_prompt = format_metrics_for_ai(parsed_data)
+        analysis.snapshot_url = (parsed_data.get("snapshot") or {}).get("url")
 
-        # Get AI analysis
+        # Locally computed sections are ready before the AI call; stream them first
+        analytics = parsed_data.get("analytics", {})
+        local_sections = {
+            "performance_report": analytics.get("performance_report") or None,
+            "breakdowns": parsed_data.get("breakdowns", {}),
+            "analytics": {key: value for key, value in analytics.items() if key != "performance_report"},
+            "anomalies": parsed_data.get("anomalies", []),
+        }
+        for key, value in local_sections.items():
+            if value is not None:
+                analysis_stream.publish_section(analysis_id, key, value)
+
+        # Get AI analysis; each section is streamed to /api/analysis/{id}/stream as it completes
         print(f"Running AI analysis for analysis {analysis_id}")
-        ai_results = analyze_meta_ads(ai_prompt)
+        ai_results = analyze_meta_ads(
+            ai_prompt,
+            local_sections["performance_report"],
+            on_section=lambda key, value: analysis_stream.publish_section(analysis_id, key, value)
+        )
+        ai_results["breakdowns"] = local_sections["breakdowns"]
+        ai_results["analytics"] = local_sections["analytics"]
+        ai_results["anomalies"] = local_sections["anomalies"]
+        # Regenerating a section needs to know which system prompt the analysis used
+        ai_results["local_report"] = local_sections["performance_report"] is not None
 
         # Store results and mark as completed
         analysis.results_json = json.dumps(ai_results)
+        analysis.ai_prompt = ai_prompt
         analysis.status = AnalysisStatus.COMPLETED
         analysis.completed_at = datetime.utcnow()
         db.commit()
+        analysis_stream.publish_done(analysis_id, AnalysisStatus.COMPLETED.value)
         
         print(f"Analysis {analysis_id} completed successfully")
 
@@ -78,13 +191,13 @@ def process_csv_task(analysis_id: int):
         except Exception as email_error:
             print(f"Warning: Email sending failed (this is OK, analysis still completed): {email_error}")
 
-        # Cleanup - delete CSV from Cloudinary (optional)
+        # Cleanup - delete CSV from storage (optional)
         try:
             if analysis.csv_url:
-                delete_csv_from_cloudinary(analysis.csv_url)
-                print(f"Cleaned up CSV from Cloudinary")
+                storage_for_url(analysis.csv_url).delete(analysis.csv_url)
+                print(f"Cleaned up CSV from storage")
         except Exception as cleanup_error:
-            print(f"Warning: Cloudinary cleanup failed: {cleanup_error}")
+            print(f"Warning: Storage cleanup failed: {cleanup_error}")
 
         return {"status": "success", "analysis_id": analysis_id}
 
@@ -96,8 +209,25 @@ def process_csv_task(analysis_id: int):
             analysis.status = AnalysisStatus.FAILED
             analysis.error_message = str(e)
             db.commit()
+            analysis_stream.publish_done(analysis_id, AnalysisStatus.FAILED.value, str(e))
             
         return {"status": "failed", "error": str(e)}
 
     finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
         db.close()
+
+@celery_app.task(name="refresh_competitor_niche")
+def refresh_competitor_niche(niche: str):
+    """
+    Background refresh of one niche in the shared competitor directory,
+    queued when an analysis was served a stale or similar-niche entry
+    """
+    try:
+        businesses = refresh_competitors(niche)
+        print(f"Refreshed {len(businesses)} competitors for niche '{niche}'")
+        return {"status": "success", "niche": niche, "businesses": len(businesses)}
+    except Exception as e:
+        print(f"Warning: Competitor refresh for niche '{niche}' failed: {e}")
+        return {"status": "failed", "niche": niche, "error": str(e)}
@@ -1,7 +1,32 @@
 import cloudinary
 import cloudinary.uploader
+import cloudinary.api
+import cloudinary.exceptions
+import cloudinary.utils
 from config import settings
 from io import BytesIO
+from app.utils.compression import compression_for
+import tempfile
+import time
+
+# Part size for Cloudinary chunked uploads (Cloudinary requires at least 5MB per part)
+CLOUDINARY_PART_SIZE = 6 * 1024 * 1024
+# Bytes kept in memory before a streamed upload spills to a temp file
+SPOOL_MAX_SIZE = 1024 * 1024
+# Read size when streaming a download to disk
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Cloudinary rejects signed requests whose timestamp is older than this
+SIGNATURE_MAX_AGE = 3600
+
+def _upload_options(filename: str) -> dict:
+    """
+    public_id/format for a raw upload. Plain CSVs keep the original scheme
+    (extension moved to format); compressed files and other files (Parquet
+    snapshots) keep their full name so the extension survives in the URL.
+    """
+    if compression_for(filename) or not filename.endswith(".csv"):
+        return {"public_id": filename}
+    return {"public_id": filename.replace('.csv', ''), "format": "csv"}
 
 # Configure Cloudinary
 cloudinary.config(
@@ -35,23 +60,153 @@ def upload_csv_to_cloudinary(file_content: bytes, filename: str) -> str:
     except Exception as e:
         raise Exception(f"Failed to upload to Cloudinary: {str(e)}")
 
-def download_csv_from_cloudinary(url: str) -> str:
+class CloudinaryUploadStream:
+    """
+    Write-as-you-go sink for CSV uploads. Bytes are spooled to a temp file as
+    they arrive and sent to Cloudinary in fixed-size parts on finish(), so the
+    API process never holds more than one part in memory. Cloudinary's chunked
+    upload needs the total size for the Content-Range of each part, which is
+    only known at the end, so the whole transfer happens in finish(); async
+    callers run it in a worker thread.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.size = 0
+        self._buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+
+    def write(self, chunk: bytes):
+        self._buffer.write(chunk)
+        self.size += len(chunk)
+
+    def finish(self) -> str:
+        """
+        Upload the spooled bytes and return the Cloudinary secure URL
+        """
+        try:
+            self._buffer.seek(0)
+            upload_result = cloudinary.uploader.upload_large(
+                self._buffer,
+                resource_type="raw",
+                folder="meta_ads_csv",
+                filename=self.filename,
+                overwrite=True,
+                chunk_size=CLOUDINARY_PART_SIZE,
+                **_upload_options(self.filename)
+            )
+            return upload_result['secure_url']
+
+        except Exception as e:
+            raise Exception(f"Failed to upload to Cloudinary: {str(e)}")
+
+        finally:
+            self._buffer.close()
+
+    def abort(self):
+        """Drop anything buffered so far"""
+        self._buffer.close()
+
+def download_csv_to_file(url: str, path: str) -> str:
     """
-    Download CSV content from Cloudinary URL
+    Stream a stored CSV (or compressed export) to a local file without
+    holding it in memory
     Args:
         url: Cloudinary secure URL
+        path: Destination file path
     Returns:
-        CSV content as string
+        The destination path
     """
     try:
         import requests
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.text
+        with requests.get(url, stream=True) as response:
+            response.raise_for_status()
+            with open(path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+        return path
 
     except Exception as e:
         raise Exception(f"Failed to download from Cloudinary: {str(e)}")
 
+def read_range(url: str, start: int, end: int) -> bytes:
+    """Bytes [start, end) of a stored file, fetched with an HTTP range request"""
+    import requests
+    response = requests.get(url, headers={"Range": f"bytes={start}-{end - 1}"})
+    response.raise_for_status()
+    if response.status_code == 206:
+        return response.content
+    # The server ignored the range and sent the whole file
+    return response.content[start:end]
+
+def content_length(url: str):
+    """Size in bytes of a stored file from the CDN, or None if it does not exist"""
+    import requests
+    response = requests.head(url, allow_redirects=True)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return int(response.headers["Content-Length"])
+
+def signed_upload_params(filename: str, expires_in: int) -> dict:
+    """
+    Signed form fields for a browser-side upload straight to Cloudinary
+    Args:
+        filename: Storage filename (already made unique per user)
+        expires_in: Seconds the signature stays valid. Cloudinary accepts a
+            signature for SIGNATURE_MAX_AGE after its timestamp, so the
+            timestamp is backdated to make it lapse after expires_in instead.
+    Returns:
+        storage_url the file will have once uploaded, plus the request the
+        client must make (multipart POST of fields and the file)
+    """
+    options = _upload_options(filename)
+    params = {
+        "timestamp": int(time.time()) - max(0, SIGNATURE_MAX_AGE - expires_in),
+        "folder": "meta_ads_csv",
+        "public_id": options["public_id"],
+        "overwrite": "true",
+    }
+    if "format" in options:
+        params["format"] = options["format"]
+    params["signature"] = cloudinary.utils.api_sign_request(params, settings.CLOUDINARY_API_SECRET)
+    params["api_key"] = settings.CLOUDINARY_API_KEY
+
+    storage_url, _ = cloudinary.utils.cloudinary_url(
+        f"meta_ads_csv/{options['public_id']}",
+        resource_type="raw",
+        format=options.get("format"),
+        secure=True
+    )
+
+    return {
+        "storage_url": storage_url,
+        "method": "POST",
+        "url": f"https://api.cloudinary.com/v1_1/{settings.CLOUDINARY_CLOUD_NAME}/raw/upload",
+        "fields": {key: str(value) for key, value in params.items()},
+        "headers": {},
+        "file_field": "file"
+    }
+
+def _public_id_from_url(url: str) -> str:
+    # URL format: https://res.cloudinary.com/{cloud_name}/raw/upload/{version}/meta_ads_csv/{public_id}.csv
+    public_id_with_ext = url.split('/')[-1]  # e.g., "filename.csv" or "filename.csv.gz"
+    if compression_for(public_id_with_ext):
+        public_id = public_id_with_ext
+    else:
+        public_id = public_id_with_ext.replace('.csv', '')
+    return f"meta_ads_csv/{public_id}"
+
+def csv_size_in_cloudinary(url: str):
+    """
+    Size in bytes of a stored CSV, or None if it was never uploaded
+    Args:
+        url: Cloudinary secure URL
+    """
+    try:
+        return cloudinary.api.resource(_public_id_from_url(url), resource_type="raw")["bytes"]
+    except cloudinary.exceptions.NotFound:
+        return None
+
 def delete_csv_from_cloudinary(url: str) -> bool:
     """
     Delete CSV file from Cloudinary
@@ -62,11 +217,7 @@ def delete_csv_from_cloudinary(url: str) -> bool:
     """
     try:
         # Extract public_id from URL
-        # URL format: https://res.cloudinary.com/{cloud_name}/raw/upload/{version}/meta_ads_csv/{public_id}.csv
-        parts = url.split('/')
-        public_id_with_ext = parts[-1]  # e.g., "filename.csv"
-        public_id = public_id_with_ext.replace('.csv', '')
-        full_public_id = f"meta_ads_csv/{public_id}"
+        full_public_id = _public_id_from_url(url)
 
         cloudinary.uploader.destroy(full_public_id, resource_type="raw")
         return True
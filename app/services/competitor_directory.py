@@ -0,0 +1,213 @@
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func, literal_column, or_
+from sqlalchemy.exc import IntegrityError
+from app.database import SessionLocal
+from app.models.competitor import CompetitorNiche
+from config import settings
+
+# Words that do not tell one niche from another
+NICHE_STOPWORDS = {
+    "a", "an", "and", "the", "of", "for", "in", "industry", "business", "businesses",
+    "sector", "market", "niche", "company", "companies", "services", "service",
+}
+
+# Candidates fetched by the full-text search before scoring
+SIMILAR_CANDIDATES = 20
+# Share of niche words two niches must have in common to reuse each other's competitors
+SIMILAR_NICHE_MIN_OVERLAP = 0.5
+# Words sharing a stem this long, covering most of the shorter word, count as
+# the same word (roaster / roasting, cosmetic / cosmetics)
+MIN_SHARED_STEM = 5
+MIN_SHARED_STEM_SHARE = 0.7
+# Seconds a queued refresh blocks other workers from queueing the same niche
+REFRESH_CLAIM_SECONDS = 600
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+def _singular(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def normalize_niche(niche: str) -> str:
+    """
+    Directory key for a niche: lowercase singular words without filler, sorted,
+    so "Coffee Roasters" and "roaster, coffee industry" share an entry
+    """
+    words = _NON_ALNUM.sub(" ", str(niche or "").lower()).split()
+    key_words = sorted({_singular(word) for word in words if word not in NICHE_STOPWORDS})
+    return " ".join(key_words or words)
+
+def _words_match(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    stem = len(os.path.commonprefix([a, b]))
+    return stem >= MIN_SHARED_STEM and stem >= MIN_SHARED_STEM_SHARE * min(len(a), len(b))
+
+def niche_overlap(key: str, other_key: str) -> float:
+    """Jaccard overlap of two niche keys, counting words with a shared stem as equal"""
+    words, other_words = key.split(), other_key.split()
+    if not words or not other_words:
+        return 0.0
+    shared = sum(1 for word in words if any(_words_match(word, other) for other in other_words))
+    return shared / (len(words) + len(other_words) - shared)
+
+def _search_text(niche: str, businesses: List[Dict[str, Any]]) -> str:
+    parts = [niche]
+    for business in businesses:
+        if isinstance(business, dict):
+            parts.extend(str(business.get(field) or "") for field in ("name", "description"))
+    return " ".join(part for part in parts if part)
+
+def _similar_entry(db, key: str) -> Optional[CompetitorNiche]:
+    """Closest stored niche by word overlap, among full-text search candidates"""
+    words = key.split()
+    if db.bind.dialect.name == "postgresql":
+        document = func.to_tsvector(literal_column("'english'"), CompetitorNiche.search_text)
+        # Keys are alphanumeric words, so they are safe to join into tsquery syntax
+        query = func.to_tsquery(literal_column("'english'"), " | ".join(words))
+        candidates = (
+            db.query(CompetitorNiche)
+            .filter(document.op("@@")(query))
+            .order_by(func.ts_rank(document, query).desc())
+            .limit(SIMILAR_CANDIDATES)
+            .all()
+        )
+    else:
+        candidates = (
+            db.query(CompetitorNiche)
+            .filter(or_(*[CompetitorNiche.niche_key.contains(word) for word in words]))
+            .limit(SIMILAR_CANDIDATES)
+            .all()
+        )
+
+    best, best_overlap = None, SIMILAR_NICHE_MIN_OVERLAP
+    for candidate in candidates:
+        overlap = niche_overlap(key, candidate.niche_key)
+        if candidate.businesses and overlap >= best_overlap and (best is None or overlap > best_overlap):
+            best, best_overlap = candidate, overlap
+    return best
+
+def lookup(niche: str) -> Optional[Dict[str, Any]]:
+    """
+    Stored competitors for a niche
+    Returns:
+        {"niche", "businesses", "match": "exact" or "similar", "stale"} or None.
+        A similar match is the closest other niche found by full-text search.
+    """
+    key = normalize_niche(niche)
+    if not key:
+        return None
+    db = SessionLocal()
+    try:
+        entry = db.query(CompetitorNiche).filter(CompetitorNiche.niche_key == key).first()
+        match = "exact"
+        if entry is None or not entry.businesses:
+            entry, match = _similar_entry(db, key), "similar"
+        if entry is None:
+            return None
+        age = datetime.utcnow() - (entry.refreshed_at or entry.created_at)
+        return {
+            "niche": entry.niche,
+            "businesses": entry.businesses,
+            "match": match,
+            "stale": age > timedelta(seconds=settings.COMPETITOR_REFRESH_TTL)
+        }
+    finally:
+        db.close()
+
+def store(niche: str, businesses: List[Dict[str, Any]], source: str):
+    """Save a niche's competitors (errors are logged, never raised)"""
+    key = normalize_niche(niche)
+    if not key or not businesses:
+        return
+    db = SessionLocal()
+    try:
+        entry = db.query(CompetitorNiche).filter(CompetitorNiche.niche_key == key).first()
+        if entry is None:
+            entry = CompetitorNiche(niche_key=key, niche=niche)
+            db.add(entry)
+        entry.businesses = businesses
+        entry.source = source
+        entry.search_text = _search_text(niche, businesses)
+        entry.refreshed_at = datetime.utcnow()
+        entry.refresh_requested_at = None
+        db.commit()
+    except IntegrityError:
+        # Another worker stored the same niche first; its entry is as fresh
+        db.rollback()
+    except Exception as e:
+        db.rollback()
+        print(f"Warning: Competitor directory write failed: {e}")
+    finally:
+        db.close()
+
+def request_refresh(niche: str) -> bool:
+    """
+    Queue a background refresh of a niche unless one is already queued.
+    Returns True when this call queued it.
+    """
+    key = normalize_niche(niche)
+    if not key:
+        return False
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        # Claim the niche atomically so concurrent analyses queue one refresh
+        claimed = (
+            db.query(CompetitorNiche)
+            .filter(
+                CompetitorNiche.niche_key == key,
+                or_(
+                    CompetitorNiche.refresh_requested_at.is_(None),
+                    CompetitorNiche.refresh_requested_at < now - timedelta(seconds=REFRESH_CLAIM_SECONDS)
+                )
+            )
+            .update({CompetitorNiche.refresh_requested_at: now}, synchronize_session=False)
+        )
+        if not claimed:
+            if db.query(CompetitorNiche.id).filter(CompetitorNiche.niche_key == key).first():
+                return False
+            # Served from a similar niche: a placeholder row holds the claim
+            # until the refresh fills it in
+            db.add(CompetitorNiche(niche_key=key, niche=niche, businesses=[], refresh_requested_at=now))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    except Exception as e:
+        db.rollback()
+        print(f"Warning: Competitor refresh claim failed: {e}")
+        return False
+    finally:
+        db.close()
+
+    try:
+        from app.services.celery_app import celery_app
+        celery_app.send_task("refresh_competitor_niche", args=[niche])
+        return True
+    except Exception as e:
+        print(f"Warning: Could not queue competitor refresh for '{niche}': {e}")
+        return False
+
+def directory_stats() -> Dict[str, Any]:
+    """Entry counts, and how many are past the refresh TTL"""
+    db = SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.COMPETITOR_REFRESH_TTL)
+        entries = db.query(func.count(CompetitorNiche.id)).filter(CompetitorNiche.source.isnot(None)).scalar()
+        stale = (
+            db.query(func.count(CompetitorNiche.id))
+            .filter(CompetitorNiche.source.isnot(None), CompetitorNiche.refreshed_at < cutoff)
+            .scalar()
+        )
+        return {"entries": entries, "stale": stale}
+    except Exception as e:
+        return {"error": str(e)}
+    finally:
+        db.close()
@@ -0,0 +1,121 @@
+import hashlib
+import json
+from typing import Any, Dict, Optional
+from config import settings
+from app.services.redis_lru import RedisLRUStore
+
+# Bump when cached response handling changes so stale entries are ignored
+LLM_CACHE_VERSION = 2
+REDIS_PREFIX = f"llm_cache:v{LLM_CACHE_VERSION}"
+
+# Seconds a response stays cached, per call type in openai_service
+CALL_TTLS = {
+    "analysis": settings.LLM_CACHE_TTL_ANALYSIS,
+    "niche": settings.LLM_CACHE_TTL_NICHE,
+    "businesses": settings.LLM_CACHE_TTL_BUSINESSES,
+}
+
+def _normalize(text: str) -> str:
+    # Prompts that differ only in whitespace (indentation, trailing newlines) share an entry
+    return " ".join(str(text).split())
+
+def request_hash(request: Dict[str, Any]) -> str:
+    """
+    Hash of a chat completion request: model, messages and every sampling
+    parameter, with message text whitespace-normalized
+    """
+    normalized = dict(request)
+    normalized["messages"] = [
+        dict(message, content=_normalize(message.get("content", "")))
+        for message in request.get("messages", [])
+    ]
+    payload = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+_store = None
+
+def _get_store():
+    global _store
+    if _store is None:
+        if (settings.LLM_CACHE_BACKEND or "off").lower() == "redis":
+            _store = RedisLRUStore(settings.REDIS_URL, REDIS_PREFIX, settings.LLM_CACHE_MAX_ENTRIES)
+        else:
+            _store = False
+    return _store
+
+def get_cached_response(call: str, key_hash: str) -> Optional[str]:
+    """
+    Cached completion text for a request hash, or None on a miss.
+    Cache errors are logged and treated as misses.
+    """
+    if not CALL_TTLS.get(call):
+        return None
+    try:
+        store = _get_store()
+        data = store.get(key_hash, stat=call) if store else None
+        if data is None:
+            return None
+        entry = json.loads(data)
+        store.incr({
+            f"prompt_tokens_saved:{call}": entry.get("prompt_tokens") or 0,
+            f"completion_tokens_saved:{call}": entry.get("completion_tokens") or 0,
+        })
+        return entry["content"]
+    except Exception as e:
+        print(f"Warning: LLM cache read failed: {e}")
+        return None
+
+def cache_response(call: str, key_hash: str, content: str,
+                   prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None):
+    """
+    Store completion text under a request hash, with the usage it cost so
+    hits can report prompt and completion tokens saved separately (errors
+    are logged, never raised)
+    """
+    ttl = CALL_TTLS.get(call)
+    if not ttl or content is None:
+        return
+    try:
+        store = _get_store()
+        if store:
+            entry = {"content": content, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+            store.set(key_hash, json.dumps(entry), ttl)
+    except Exception as e:
+        print(f"Warning: LLM cache write failed: {e}")
+
+def llm_cache_stats() -> Dict[str, Any]:
+    """
+    Hit/miss counters and prompt/completion tokens saved per call type, plus
+    evictions and entry count
+    """
+    try:
+        store = _get_store()
+        if not store:
+            return {"backend": "off"}
+        counters = store.stats()
+    except Exception as e:
+        return {"backend": settings.LLM_CACHE_BACKEND, "error": str(e)}
+
+    calls = {}
+    for call in CALL_TTLS:
+        hits, misses = counters.get(f"hits:{call}", 0), counters.get(f"misses:{call}", 0)
+        calls[call] = {
+            "hits": hits,
+            "misses": misses,
+            "prompt_tokens_saved": counters.get(f"prompt_tokens_saved:{call}", 0),
+            "completion_tokens_saved": counters.get(f"completion_tokens_saved:{call}", 0),
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None
+        }
+    hits = sum(call["hits"] for call in calls.values())
+    misses = sum(call["misses"] for call in calls.values())
+    return {
+        "backend": settings.LLM_CACHE_BACKEND,
+        "hits": hits,
+        "misses": misses,
+        "evictions": counters.get("evictions", 0),
+        "entries": counters.get("entries", 0),
+        "prompt_tokens_saved": sum(call["prompt_tokens_saved"] for call in calls.values()),
+        "completion_tokens_saved": sum(call["completion_tokens_saved"] for call in calls.values()),
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+        "calls": calls
+    }
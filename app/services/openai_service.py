@@ -1,87 +1,162 @@
-from openai import OpenAI
+from openai import AsyncOpenAI, RateLimitError
 from config import settings
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Callable, Awaitable, Sequence
+from app.services.llm_cache import cache_response, get_cached_response, request_hash
+from app.services import competitor_directory, rate_limiter, web_search
+from app.utils.tokens import count_tokens
+from app.utils.call_graph import run_call_graph
+from app.utils.json_sections import SectionParser
+import asyncio
 import json
-import requests
+import time
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+# Seconds each call may take, retries included
+CALL_TIMEOUTS = {
+    "analysis": settings.OPENAI_ANALYSIS_TIMEOUT,
+    "niche": settings.OPENAI_CALL_TIMEOUT,
+    "businesses": settings.OPENAI_CALL_TIMEOUT,
+}
+
+# Completion tokens each call type is expected to produce, reserved from the
+# tokens-per-minute budget up front and trued up from usage afterwards.
+# Analysis calls reserve the sum of SECTION_COMPLETION_TOKENS for their sections.
+COMPLETION_TOKEN_ESTIMATES = {
+    "niche": 20,
+    "businesses": 1000,
+}
+
+# Times a call is retried after the API itself answers 429
+RATE_LIMIT_RETRIES = 4
+
+# Leading characters of the analysis prompt used for niche extraction when the
+# analysis did not name one; the overview and top ads near the top identify the business
+NICHE_CONTEXT_CHARS = 6000
 
-def search_similar_businesses(business_niche: str) -> list:
+def _client() -> AsyncOpenAI:
+    # One client per analysis: its connection pool is bound to the event loop
+    # asyncio.run creates, so it cannot be shared across tasks
+    return AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+
+async def _with_timeout(call: str, awaitable, deadline: Optional[float] = None):
+    """Await with the call's timeout, or only what is left of it before deadline (time.monotonic())"""
+    timeout = CALL_TIMEOUTS[call]
+    if deadline is not None:
+        timeout = max(0, deadline - time.monotonic())
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        if timeout < CALL_TIMEOUTS[call]:
+            raise TimeoutError(f"{call} call timed out after the {timeout:.1f}s left of its {CALL_TIMEOUTS[call]}s budget")
+        raise TimeoutError(f"{call} call timed out after {timeout}s")
+
+async def _stream_completion(client: AsyncOpenAI, request: Dict[str, Any], on_text: Callable[[str], Awaitable[None]]):
+    """Stream a completion, handing each text delta to on_text; returns (text, usage)"""
+    # stream_options is newer than the pinned client, so it goes in the raw body;
+    # the final chunk then carries the usage for the rate limiter and cache
+    stream = await client.chat.completions.create(
+        **request, stream=True, extra_body={"stream_options": {"include_usage": True}}
+    )
+    parts, usage = [], None
+    async for chunk in stream:
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+            await on_text(chunk.choices[0].delta.content)
+    return "".join(parts), usage
+
+async def _chat(
+    client: AsyncOpenAI,
+    call: str,
+    refresh: bool = False,
+    on_text: Optional[Callable[[str], Awaitable[None]]] = None,
+    completion_tokens: Optional[int] = None,
+    **kwargs
+) -> str:
     """
-    Search for real similar businesses using web search APIs
-    Falls back to AI-generated suggestions if web search fails
+    Completion text for one request, served from the shared LLM cache when possible.
+    With refresh, the cache is skipped and the new answer replaces the cached one.
+    With on_text, the completion is streamed and each text delta passed to it as it
+    arrives (a cached response is passed in one piece).
+    completion_tokens overrides COMPLETION_TOKEN_ESTIMATES[call] for the budget reservation.
     """
-    try:
-        # Use OpenAI to identify the business niche first
-        niche_response = client.chat.completions.create(
-            model="gpt-4o",
+    request = dict(model="gpt-4o", **kwargs)
+    key_hash = request_hash(request)
+    if not refresh:
+        # The cache client is blocking, so keep it off the event loop
+        cached = await asyncio.to_thread(get_cached_response, call, key_hash)
+        if cached is not None:
+            if on_text:
+                await on_text(cached)
+            return cached
+
+    model = request["model"]
+    if completion_tokens is None:
+        completion_tokens = COMPLETION_TOKEN_ESTIMATES[call]
+    estimate = count_tokens("\n".join(m["content"] for m in request["messages"])) + completion_tokens
+    # Waiting for budget, every attempt and the backoff between them share one
+    # deadline, so CALL_TIMEOUTS bounds the whole call
+    deadline = time.monotonic() + CALL_TIMEOUTS[call]
+    attempt = 0
+    while True:
+        # Waits (with jittered backoff) while the shared RPM/TPM/concurrency budget is spent
+        lease = await rate_limiter.acquire(model, estimate, CALL_TIMEOUTS[call], deadline)
+        usage = None
+        try:
+            if on_text:
+                content, usage = await _with_timeout(call, _stream_completion(client, request, on_text), deadline)
+            else:
+                response = await _with_timeout(call, client.chat.completions.create(**request), deadline)
+                content = response.choices[0].message.content
+                usage = getattr(response, "usage", None)
+            break
+        except RateLimitError as e:
+            # Other consumers of the key can still exhaust it: back off and retry
+            await rate_limiter.record_rate_limited(model)
+            if attempt >= RATE_LIMIT_RETRIES:
+                raise
+            print(f"Warning: OpenAI {call} call rate limited ({e}), retrying")
+        finally:
+            await rate_limiter.release(model, lease, estimate, usage.total_tokens if usage else None)
+        await asyncio.sleep(min(rate_limiter.backoff_delay(attempt), max(0, deadline - time.monotonic())))
+        attempt += 1
+
+    await asyncio.to_thread(
+        cache_response, call, key_hash, content,
+        usage.prompt_tokens if usage else None, usage.completion_tokens if usage else None
+    )
+    return content
+
+async def extract_niche(client: AsyncOpenAI, business_context: str) -> str:
+    """Main business niche/industry of the data in 2-3 words"""
+    niche = await _chat(
+        client, "niche",
+        messages=[
+            {"role": "system", "content": "Extract the main business niche/industry from this data in 2-3 words. Be specific."},
+            {"role": "user", "content": business_context}
+        ],
+        temperature=0.3
+    )
+    niche = niche.strip()
+    print(f"Identified niche: {niche}")
+    return niche
+
+async def find_businesses(client: AsyncOpenAI, niche: str, web_results: list) -> list:
+    """
+    Structure real companies from web results, falling back to the model's
+    own knowledge when there are none
+    """
+    if web_results:
+        # Prepare web results summary for AI
+        web_summary = "\n".join([
+            f"- {r.get('title', r.get('name', 'Unknown'))}: {r.get('snippet', r.get('description', r.get('content', '')[:200]))}"
+            for r in web_results[:15]
+        ])
+
+        content = await _chat(
+            client, "businesses",
             messages=[
-                {"role": "system", "content": "Extract the main business niche/industry from this data in 2-3 words. Be specific."},
-                {"role": "user", "content": business_niche}
-            ],
-            temperature=0.3
-        )
-        niche = niche_response.choices[0].message.content.strip()
-        
-        print(f"Identified niche: {niche}")
-
-        # Try to use web search API if available
-        web_results = []
-        
-        # Option 1: Try Tavily API (if configured)
-        tavily_api_key = settings.TAVILY_API_KEY if hasattr(settings, 'TAVILY_API_KEY') else None
-        if tavily_api_key:
-            try:
-                tavily_response = requests.post(
-                    "https://api.tavily.com/search",
-                    json={
-                        "api_key": tavily_api_key,
-                        "query": f"top companies in {niche} industry with websites",
-                        "search_depth": "advanced",
-                        "max_results": 10
-                    },
-                    timeout=10
-                )
-                if tavily_response.status_code == 200:
-                    tavily_data = tavily_response.json()
-                    web_results = tavily_data.get('results', [])
-                    print(f"Tavily search returned {len(web_results)} results")
-            except Exception as e:
-                print(f"Tavily search failed: {e}")
-        
-        # Option 2: Try SerpAPI (if configured and Tavily didn't work)
-        if not web_results:
-            serpapi_key = settings.SERPAPI_KEY if hasattr(settings, 'SERPAPI_KEY') else None
-            if serpapi_key:
-                try:
-                    serp_response = requests.get(
-                        "https://serpapi.com/search",
-                        params={
-                            "api_key": serpapi_key,
-                            "q": f"top companies in {niche} industry",
-                            "num": 10
-                        },
-                        timeout=10
-                    )
-                    if serp_response.status_code == 200:
-                        serp_data = serp_response.json()
-                        web_results = serp_data.get('organic_results', [])
-                        print(f"SerpAPI search returned {len(web_results)} results")
-                except Exception as e:
-                    print(f"SerpAPI search failed: {e}")
-
-        # If we have web results, use AI to structure them
-        if web_results:
-            # Prepare web results summary for AI
-            web_summary = "\n".join([
-                f"- {r.get('title', r.get('name', 'Unknown'))}: {r.get('snippet', r.get('description', r.get('content', '')[:200]))}"
-                for r in web_results[:15]
-            ])
-            
-            structure_response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": f"""You are a business research expert. Based on these web search results about the {niche} industry, extract and structure information about real companies.
+                {"role": "system", "content": f"""You are a business research expert. Based on these web search results about the {niche} industry, extract and structure information about real companies.
 
 For each company found, provide:
 1. name: Exact company name
@@ -90,102 +165,350 @@ For each company found, provide:
 
 Return as JSON with a 'businesses' array containing 8-10 companies.
 Only include real, existing companies mentioned in the search results."""},
-                    {"role": "user", "content": f"Web search results:\n{web_summary}\n\nExtract structured information about companies in the {niche} industry."}
-                ],
-                temperature=0.3,
-                response_format={"type": "json_object"}
-            )
-            
-            result = json.loads(structure_response.choices[0].message.content)
-            businesses = result.get('businesses', [])
-            
-            if businesses:
-                print(f"Structured {len(businesses)} businesses from web results")
-                return businesses
-
-        # Fallback: Use AI knowledge to suggest real companies
-        print("Using AI knowledge fallback for business suggestions")
-        search_response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": f"""You are a business research expert. Find REAL, EXISTING companies in the {niche} industry.
+                {"role": "user", "content": f"Web search results:\n{web_summary}\n\nExtract structured information about companies in the {niche} industry."}
+            ],
+            temperature=0.3,
+            response_format={"type": "json_object"}
+        )
+
+        businesses = json.loads(content).get('businesses', [])
+        if businesses:
+            print(f"Structured {len(businesses)} businesses from web results")
+            return businesses
+
+    # Fallback: Use AI knowledge to suggest real companies
+    print("Using AI knowledge fallback for business suggestions")
+    content = await _chat(
+        client, "businesses",
+        messages=[
+            {"role": "system", "content": f"""You are a business research expert. Find REAL, EXISTING companies in the {niche} industry.
 For each business, provide:
 1. name: Exact company name (real company that exists)
 2. description: Brief description (what they do)
 3. website: Website URL if known
 
 Return as JSON with a 'businesses' array. Include both well-known companies and emerging startups."""},
-                {"role": "user", "content": f"List 8-10 real existing businesses/competitors in the {niche} industry based on your knowledge."}
-            ],
-            temperature=0.7,
-            response_format={"type": "json_object"}
-        )
+            {"role": "user", "content": f"List 8-10 real existing businesses/competitors in the {niche} industry based on your knowledge."}
+        ],
+        temperature=0.7,
+        response_format={"type": "json_object"}
+    )
 
-        result = json.loads(search_response.choices[0].message.content)
-        businesses = result.get('businesses', result.get('companies', result.get('results', [])))
+    result = json.loads(content)
+    businesses = result.get('businesses', result.get('companies', result.get('results', [])))
+    return businesses if businesses else []
 
-        return businesses if businesses else []
+async def research_competitors(client: AsyncOpenAI, niche: str) -> list:
+    """Search the web for a niche's competitors and save them to the shared directory"""
+    web_results = await web_search.search(niche)
+    businesses = await find_businesses(client, niche, web_results)
+    await asyncio.to_thread(competitor_directory.store, niche, businesses, "web" if web_results else "ai")
+    return businesses
 
+async def find_similar_businesses(client: AsyncOpenAI, niche: str) -> list:
+    """
+    Competitors for a niche from the directory shared by all users, falling back
+    to web research on a miss. Stale entries and similar-niche matches are served
+    as they are while a background task refreshes the niche.
+    """
+    try:
+        match = await asyncio.to_thread(competitor_directory.lookup, niche)
     except Exception as e:
-        print(f"Business search failed: {e}")
-        return []
+        print(f"Warning: Competitor directory lookup failed: {e}")
+        match = None
+
+    if match:
+        print(f"Competitors for '{niche}' from directory ({match['match']} match '{match['niche']}'{', stale' if match['stale'] else ''})")
+        if match["stale"] or match["match"] == "similar":
+            await asyncio.to_thread(competitor_directory.request_refresh, niche)
+        return match["businesses"]
+    return await research_competitors(client, niche)
 
-def analyze_meta_ads(csv_data_summary: str) -> Dict[str, Any]:
+def refresh_competitors(niche: str) -> list:
+    """Blocking directory refresh for one niche (run by the Celery refresh task)"""
+    async def refresh():
+        client = _client()
+        try:
+            return await research_competitors(client, niche)
+        finally:
+            await client.close()
+    return asyncio.run(refresh())
+
+async def _refined_competitors(niche: str, businesses: list, context: Dict[str, Any]) -> list:
     """
-    Use OpenAI to analyze Meta Ads data and generate insights
+    Competitors once business_context has named the niche too. The niche
+    extracted from the prompt head already picked competitors concurrently;
+    when business_context names a different niche, its directory entry is
+    preferred if there is an exact one, else it is queued for background research.
     """
+    refined = str(context.get("business_niche") or "").strip()
+    if not refined or competitor_directory.normalize_niche(refined) == competitor_directory.normalize_niche(niche):
+        return businesses
+    try:
+        match = await asyncio.to_thread(competitor_directory.lookup, refined)
+    except Exception as e:
+        print(f"Warning: Competitor directory lookup failed: {e}")
+        return businesses
 
-    system_prompt = """You are an expert marketing and business analyst.
-Analyze the provided campaign/business data and provide comprehensive insights in the following structured format:
+    if match and match["match"] == "exact":
+        print(f"Competitors for refined niche '{refined}' (extracted '{niche}') from directory")
+        if match["stale"]:
+            await asyncio.to_thread(competitor_directory.request_refresh, refined)
+        return match["businesses"]
+    await asyncio.to_thread(competitor_directory.request_refresh, refined)
+    return businesses
 
-1. Performance Report: Key metrics analysis and trends
-2. AI Insights: 5-7 actionable insights based on the data
-3. Next Ad Plan: Specific recommendations for the next campaign
-4. 30-Day Content Strategy: Week-by-week content plan
-5. Creative Prompts: 5-10 creative ideas for ads
-6. Captions + Hashtags: 5-10 ready-to-use captions with relevant hashtags
+# Shared by every section call, so the data prompt after it forms one identical
+# prefix per analysis that OpenAI's prompt cache can reuse across the calls
+ANALYSIS_SYSTEM_PROMPT = """You are an expert marketing and business analyst.
+Analyze the provided campaign/business data. Each request asks for some sections of the
+analysis: answer with those sections only, as valid JSON with the exact keys requested.
+"""
 
-Return your response in valid JSON format with these exact keys:
-{
-  "performance_report": {},
-  "ai_insights": [],
-  "next_ad_plan": {},
-  "content_strategy": {},
-  "creative_prompts": [],
-  "captions_hashtags": [],
-  "business_context": "Brief description of the business/industry based on the data"
-}
+# Used when the numeric report was computed locally
+NARRATIVE_SYSTEM_PROMPT = """You are an expert marketing and business analyst.
+The performance metrics, weekly trends, ad rankings and outliers in the data below were computed exactly
+from the full export. Treat them as ground truth: do not recompute or restate them, interpret them.
+Each request asks for some sections of the analysis: answer with those sections only, as valid JSON
+with the exact keys requested.
 """
 
-    try:
-        # Get main analysis
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Analyze this campaign data:\n\n{csv_data_summary}"}
-            ],
-            temperature=0.7,
-            response_format={"type": "json_object"}
-        )
+# results_json sections, each written by its own call: name -> (instruction, JSON
+# keys with an example of each value). Order is the order of keys in results_json.
+ANALYSIS_SECTIONS = {
+    "performance_report": ("Performance Report: Key metrics analysis and trends", {"performance_report": {}}),
+    "ai_insights": ("AI Insights: 5-7 actionable insights based on the data, citing the figures they rely on", {"ai_insights": []}),
+    "next_ad_plan": ("Next Ad Plan: Specific recommendations for the next campaign", {"next_ad_plan": {}}),
+    "content_strategy": ("30-Day Content Strategy: Week-by-week content plan", {"content_strategy": {}}),
+    "creative_prompts": ("Creative Prompts: 5-10 creative ideas for ads", {"creative_prompts": []}),
+    "captions_hashtags": ("Captions + Hashtags: 5-10 ready-to-use captions with relevant hashtags", {"captions_hashtags": []}),
+    "business_context": ("Business Context: The business/industry behind the data", {
+        "business_context": "Brief description of the business/industry based on the data",
+        "business_niche": "Main business niche/industry in 2-3 words, e.g. specialty coffee roasting"
+    }),
+}
 
-        result = json.loads(response.choices[0].message.content)
+# Rough completion size of each section, summed into the budget reservation of a call
+SECTION_COMPLETION_TOKENS = {
+    "performance_report": 600,
+    "ai_insights": 500,
+    "next_ad_plan": 500,
+    "content_strategy": 900,
+    "creative_prompts": 500,
+    "captions_hashtags": 700,
+    "business_context": 80,
+}
 
-        # Extract business context for better company search
-        business_context = result.get('business_context', csv_data_summary)
-        
-        # Search for real similar businesses from the web
-        try:
-            print("Searching for similar businesses...")
-            similar_businesses = search_similar_businesses(business_context)
-            result['similar_businesses'] = similar_businesses
-            print(f"Found {len(similar_businesses)} similar businesses")
-        except Exception as e:
-            print(f"Similar businesses search failed: {e}")
-            result['similar_businesses'] = []
+# Sections written by the first call. It runs alone, so OpenAI's prompt cache
+# (which only holds a prefix once a request with it has been processed) has the
+# shared prefix before the other calls send it. Its answer is short, so the
+# fan-out starts soon after the prompt has been read once.
+LEAD_SECTIONS = ("business_context",)
+# Sections written together by each call fanned out once the lead call is done,
+# balanced by SECTION_COMPLETION_TOKENS since decoding dominates a call's time.
+# Together with LEAD_SECTIONS they cover ANALYSIS_SECTIONS. Grouping sends the
+# data prompt (up to PROMPT_TOKEN_BUDGET tokens) four times per analysis instead
+# of once per section, which is what the tokens-per-minute limit is spent on.
+FAN_OUT_GROUPS = (
+    ("content_strategy", "performance_report"),
+    ("captions_hashtags", "ai_insights"),
+    ("next_ad_plan", "creative_prompts"),
+)
 
-        return result
+# Sections that can be regenerated on their own for an existing analysis
+# (performance_report may be locally computed; business_context drives the competitors)
+REGENERABLE_SECTIONS = ("ai_insights", "next_ad_plan", "content_strategy", "creative_prompts", "captions_hashtags")
 
+# Blocking callback taking each finished results section as (key, value)
+SectionCallback = Callable[[str, Any], None]
+
+def _empty_section(section: str) -> Dict[str, Any]:
+    # Same types as a real answer, so results readers need no special case
+    return {key: type(value)() for key, value in ANALYSIS_SECTIONS[section][1].items()}
+
+async def _analysis_sections(
+    client: AsyncOpenAI,
+    sections: Sequence[str],
+    csv_data_summary: str,
+    local_report: bool,
+    on_section: Optional[SectionCallback] = None,
+    refresh: bool = False
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Sections of the analysis written by one call.
+    Args:
+        sections: Keys of ANALYSIS_SECTIONS, asked for in this order
+        csv_data_summary: Prompt built by format_metrics_for_ai
+        local_report: Whether the performance report was computed locally
+        on_section: Called with each key of the sections as soon as the streamed
+            response completes it
+        refresh: Skip the LLM cache (regeneration)
+    Returns:
+        section -> its results_json keys; a section the answer left out is missing
+    """
+    keys = {}
+    for section in sections:
+        keys.update(ANALYSIS_SECTIONS[section][1])
+    instructions = "\n".join(f"- {ANALYSIS_SECTIONS[section][0]}" for section in sections)
+
+    on_text = None
+    if on_section:
+        parser = SectionParser()
+
+        async def on_text(text: str):
+            for key, value in parser.feed(text):
+                if key in keys:
+                    await asyncio.to_thread(on_section, key, value)
+
+    content = await _chat(
+        client, "analysis", refresh, on_text,
+        completion_tokens=sum(SECTION_COMPLETION_TOKENS[section] for section in sections),
+        messages=[
+            {"role": "system", "content": NARRATIVE_SYSTEM_PROMPT if local_report else ANALYSIS_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Analyze this campaign data:\n\n{csv_data_summary}"},
+            # Only this last message differs between calls
+            {"role": "user", "content": f"Write only these sections:\n{instructions}\n\nReturn your response in valid JSON format with these exact keys:\n{json.dumps(keys, indent=2)}"}
+        ],
+        temperature=0.7,
+        response_format={"type": "json_object"}
+    )
+    answer = json.loads(content)
+    return {
+        section: {key: answer[key] for key in ANALYSIS_SECTIONS[section][1] if key in answer}
+        for section in sections if section in answer
+    }
+
+async def _settled(awaitable) -> Any:
+    """The awaitable's result, or the exception it raised, so call graph dependents still run"""
+    try:
+        return await awaitable
     except Exception as e:
-        raise Exception(f"OpenAI analysis failed: {str(e)}")
+        return e
 
+def analyze_meta_ads(
+    csv_data_summary: str,
+    performance_report: Optional[Dict[str, Any]] = None,
+    on_section: Optional[SectionCallback] = None
+) -> Dict[str, Any]:
+    """
+    Use OpenAI to analyze Meta Ads data and generate insights.
+    Blocking entry point for Celery tasks; must not be called from a running event loop.
+    Args:
+        csv_data_summary: Prompt built by format_metrics_for_ai
+        performance_report: Locally computed report; when given, the model only
+            writes the narrative sections and this is returned as performance_report
+        on_section: Called with each top-level key of the result as soon as the
+            streamed response of its section call completes it, then with similar_businesses
+    """
+    return asyncio.run(analyze_meta_ads_async(csv_data_summary, performance_report, on_section))
+
+async def analyze_meta_ads_async(
+    csv_data_summary: str,
+    performance_report: Optional[Dict[str, Any]] = None,
+    on_section: Optional[SectionCallback] = None
+) -> Dict[str, Any]:
+    """
+    Run the analysis calls as a dependency graph on the async client.
+    The sections are written by a lead call (LEAD_SECTIONS) and then by the
+    FAN_OUT_GROUPS calls concurrently, which read the shared prefix from the
+    prompt cache. A failed call leaves its sections empty (listed under
+    section_errors) instead of failing the rest.
+    The niche is extracted from the head of the prompt alongside the sections,
+    and competitors for it come from the shared directory; web research only
+    runs for niches the directory has nothing close to. The niche business_context
+    names then only refines that choice (see _refined_competitors).
+    """
+    local_report = bool(performance_report)
+    sections = [section for section in ANALYSIS_SECTIONS if not (local_report and section == "performance_report")]
+
+    lead = tuple(section for section in LEAD_SECTIONS if section in sections)
+    groups = [("lead_sections", lead)] if lead else []
+    for index, group in enumerate(FAN_OUT_GROUPS):
+        group = tuple(section for section in group if section in sections)
+        if group:
+            groups.append((f"sections_{index + 1}", group))
+
+    client = _client()
+
+    def section_call(group):
+        return _analysis_sections(client, group, csv_data_summary, local_report, on_section)
+
+    graph = {}
+    for node, group in groups:
+        if node == "lead_sections":
+            # Settled, so the fan-out still runs (without a warm cache) if the lead call fails
+            graph[node] = ((), lambda group=group: _settled(section_call(group)))
+        else:
+            graph[node] = (("lead_sections",) if lead else (), lambda *lead_answer, group=group: section_call(group))
+    # Independent of business_context, so the directory lookup (or web research)
+    # overlaps the section calls instead of waiting for them
+    graph["niche"] = ((), lambda: extract_niche(client, csv_data_summary[:NICHE_CONTEXT_CHARS]))
+    graph["similar_businesses"] = (("niche",), lambda niche: find_similar_businesses(client, niche))
+    try:
+        results, seconds = await run_call_graph(graph)
+        similar_businesses = results["similar_businesses"]
+        answers, failed = {}, {}
+        for node, group in groups:
+            for section in group:
+                if isinstance(results[node], Exception):
+                    failed[section] = results[node]
+                elif section not in results[node]:
+                    failed[section] = ValueError(f"Response has no '{section}' key")
+                else:
+                    answers[section] = results[node][section]
+        if not isinstance(similar_businesses, Exception) and "business_context" in answers:
+            similar_businesses = await _refined_competitors(
+                results["niche"], similar_businesses, answers["business_context"]
+            )
+    finally:
+        await client.close()
+    print(f"OpenAI call graph timings (s): {seconds}")
+
+    if len(failed) == len(sections):
+        raise Exception(f"OpenAI analysis failed: {str(next(iter(failed.values())))}")
+
+    result = {}
+    for section in ANALYSIS_SECTIONS:
+        if section == "performance_report" and local_report:
+            result["performance_report"] = performance_report
+        elif section in failed:
+            print(f"Warning: Analysis section {section} failed: {failed[section]}")
+            result.update(_empty_section(section))
+        else:
+            result.update(answers[section])
+    if failed:
+        # Failed sections can be regenerated on their own
+        result["section_errors"] = {section: str(error) for section, error in failed.items()}
+    if "business_context" in failed and not isinstance(results["niche"], Exception):
+        # The niche extracted for the competitor lookup stands in
+        result["business_niche"] = results["niche"]
+
+    if isinstance(similar_businesses, Exception):
+        # Competitors are optional; the analysis stands without them
+        print(f"Similar businesses search failed: {similar_businesses}")
+        similar_businesses = []
+    result['similar_businesses'] = similar_businesses
+    print(f"Found {len(similar_businesses)} similar businesses")
+    if on_section:
+        await asyncio.to_thread(on_section, "similar_businesses", similar_businesses)
+    return result
+
+async def regenerate_section(csv_data_summary: str, section: str, local_report: bool) -> Any:
+    """
+    A fresh answer for one section of an existing analysis, bypassing the LLM cache.
+    Only this section is asked for; the shared prefix keeps its prompt cacheable.
+    Args:
+        csv_data_summary: The analysis's prompt built by format_metrics_for_ai
+        section: One of REGENERABLE_SECTIONS
+        local_report: Whether the analysis had a locally computed performance report
+    Returns:
+        The new value of results_json[section]
+    """
+    client = _client()
+    try:
+        answer = await _analysis_sections(client, (section,), csv_data_summary, local_report, refresh=True)
+    finally:
+        await client.close()
+    if section not in answer:
+        raise ValueError(f"Response has no '{section}' key")
+    return answer[section][section]
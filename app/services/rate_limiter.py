@@ -0,0 +1,239 @@
+import asyncio
+import random
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+from config import settings
+
+REDIS_PREFIX = "rate_limit"
+
+# Jittered exponential backoff between attempts, in seconds
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 20.0
+# Extra seconds a concurrency lease outlives its call's timeout, so a worker
+# that dies mid-call frees its slot instead of holding it forever
+LEASE_MARGIN = 30
+# Buckets idle this long are dropped; they refill to full anyway
+BUCKET_IDLE_TTL = 300
+
+# Refills both buckets for the time elapsed, then takes one request and
+# `tokens` tokens plus a concurrency lease only if all three are available.
+# Uses the Redis clock so workers with skewed clocks share one timeline.
+# Returns {reason, seconds to wait}; reason "ok" means acquired.
+_ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local rpm, tpm = tonumber(ARGV[1]), tonumber(ARGV[2])
+local need, cap = math.min(tonumber(ARGV[3]), tpm), tonumber(ARGV[4])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+local bucket = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'ts')
+local elapsed = math.max(0, now - (tonumber(bucket[3]) or now))
+local requests = math.min(rpm, (tonumber(bucket[1]) or rpm) + elapsed * rpm / 60)
+local tokens = math.min(tpm, (tonumber(bucket[2]) or tpm) + elapsed * tpm / 60)
+
+local reason, wait = 'ok', 0
+if redis.call('ZCARD', KEYS[2]) >= cap then
+    reason = 'concurrency'
+end
+if requests < 1 and (1 - requests) * 60 / rpm > wait then
+    reason, wait = 'requests', (1 - requests) * 60 / rpm
+end
+if tokens < need and (need - tokens) * 60 / tpm > wait then
+    reason, wait = 'tokens', (need - tokens) * 60 / tpm
+end
+if reason == 'ok' then
+    requests, tokens = requests - 1, tokens - need
+    redis.call('ZADD', KEYS[2], now + tonumber(ARGV[6]), ARGV[5])
+end
+redis.call('HSET', KEYS[1], 'requests', requests, 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[7]))
+return {reason, tostring(wait)}
+"""
+
+# Frees a lease and corrects the token bucket by (actual - estimated) usage;
+# an underestimate leaves the bucket in debt, which later refills repay
+_RELEASE_SCRIPT = """
+redis.call('ZREM', KEYS[2], ARGV[1])
+local adjustment = tonumber(ARGV[2])
+if adjustment ~= 0 and redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HINCRBYFLOAT', KEYS[1], 'tokens', -adjustment)
+end
+return 1
+"""
+
+def backoff_delay(attempt: int, wait_hint: float = 0.0) -> float:
+    """
+    Seconds to sleep before retry `attempt` (0-based): the limiter's hint plus
+    full jitter over an exponential window, so throttled workers spread out
+    instead of retrying in lockstep
+    """
+    return wait_hint + random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+class _RedisRateLimiter:
+    """
+    Token buckets for requests and tokens per minute plus a concurrency
+    semaphore, per model and shared by every worker. The semaphore is a
+    sorted set of lease ids scored by expiry time.
+    """
+
+    def __init__(self, url: str, rpm: int, tpm: int, max_concurrency: int):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.acquire_script = self.client.register_script(_ACQUIRE_SCRIPT)
+        self.release_script = self.client.register_script(_RELEASE_SCRIPT)
+
+    def _keys(self, model: str):
+        return [f"{REDIS_PREFIX}:{model}:bucket", f"{REDIS_PREFIX}:{model}:leases"]
+
+    def try_acquire(self, model: str, tokens: int, lease_id: str, lease_ttl: float) -> Tuple[str, float]:
+        reason, wait = self.acquire_script(
+            keys=self._keys(model),
+            args=[self.rpm, self.tpm, tokens, self.max_concurrency, lease_id, lease_ttl, BUCKET_IDLE_TTL]
+        )
+        reason = reason.decode() if isinstance(reason, bytes) else reason
+        return reason, float(wait)
+
+    def release(self, model: str, lease_id: str, token_adjustment: int):
+        self.release_script(keys=self._keys(model), args=[lease_id, token_adjustment])
+
+    def record(self, model: str, counter: str, amount: float = 1):
+        self.client.hincrbyfloat(f"{REDIS_PREFIX}:{model}:stats", counter, amount)
+
+    def stats(self, model: str) -> Dict[str, Any]:
+        bucket_key, leases_key = self._keys(model)
+        seconds, micros = self.client.time()
+        now = seconds + micros / 1000000
+        pipe = self.client.pipeline()
+        pipe.hmget(bucket_key, "requests", "tokens", "ts")
+        pipe.zcount(leases_key, now, "+inf")
+        pipe.hgetall(f"{REDIS_PREFIX}:{model}:stats")
+        bucket, in_flight, raw = pipe.execute()
+
+        # Refill as the acquire script would, without writing
+        elapsed = max(0.0, now - float(bucket[2])) if bucket[2] else 0.0
+        requests = min(self.rpm, float(bucket[0]) + elapsed * self.rpm / 60) if bucket[0] else self.rpm
+        tokens = min(self.tpm, float(bucket[1]) + elapsed * self.tpm / 60) if bucket[1] else self.tpm
+        counters = {
+            (key.decode() if isinstance(key, bytes) else key): float(value)
+            for key, value in raw.items()
+        }
+        return {
+            "requests_per_minute": self.rpm,
+            "tokens_per_minute": self.tpm,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": in_flight,
+            # Share of each budget currently spent (1.0 = callers are waiting)
+            "request_utilization": round(1 - max(requests, 0) / self.rpm, 4),
+            "token_utilization": round(1 - max(tokens, 0) / self.tpm, 4),
+            "concurrency_utilization": round(in_flight / self.max_concurrency, 4),
+            "acquired": int(counters.get("acquired", 0)),
+            "throttled": int(counters.get("throttled", 0)),
+            "wait_seconds": round(counters.get("wait_seconds", 0), 3),
+            "rate_limited_responses": int(counters.get("rate_limited_responses", 0)),
+        }
+
+_limiter = None
+
+def _get_limiter():
+    global _limiter
+    if _limiter is None:
+        if (settings.RATE_LIMIT_BACKEND or "off").lower() == "redis":
+            _limiter = _RedisRateLimiter(
+                settings.REDIS_URL, settings.OPENAI_RPM_LIMIT, settings.OPENAI_TPM_LIMIT, settings.OPENAI_MAX_CONCURRENCY
+            )
+        else:
+            _limiter = False
+    return _limiter
+
+async def acquire(model: str, tokens: int, call_timeout: float, deadline: Optional[float] = None) -> Optional[str]:
+    """
+    Wait until `model` has a free concurrency slot and budget for one request
+    of about `tokens` tokens, then take them.
+    Args:
+        model: Model the request goes to; each model has its own limits
+        tokens: Estimated prompt + completion tokens
+        call_timeout: The call's own timeout; the slot is reclaimed after it
+        deadline: time.monotonic() by which the whole call must finish; the
+            wait never runs past it, so waiting counts against the call's timeout
+    Returns:
+        Lease id to pass to release(), or None when limiting is off or Redis is
+        unreachable (calls then go through unthrottled)
+    Raises:
+        TimeoutError: Still throttled at the deadline or after RATE_LIMIT_MAX_WAIT seconds
+    """
+    limiter = _get_limiter()
+    if not limiter:
+        return None
+
+    lease_id = uuid.uuid4().hex
+    started = time.monotonic()
+    give_up_at = started + settings.RATE_LIMIT_MAX_WAIT
+    if deadline is not None:
+        give_up_at = min(give_up_at, deadline)
+    attempt = 0
+    while True:
+        try:
+            reason, wait = await asyncio.to_thread(
+                limiter.try_acquire, model, tokens, lease_id, call_timeout + LEASE_MARGIN
+            )
+        except Exception as e:
+            print(f"Warning: Rate limiter unavailable, calling {model} unthrottled: {e}")
+            return None
+
+        now = time.monotonic()
+        waited = now - started
+        if reason == "ok":
+            await asyncio.to_thread(_record, limiter, model, waited, attempt)
+            return lease_id
+        # Budget that cannot free up in time fails now instead of at the deadline
+        if now + wait >= give_up_at:
+            raise TimeoutError(f"Rate limited on {model} ({reason}), no budget within the call's time limit")
+
+        await asyncio.sleep(min(backoff_delay(attempt, wait), give_up_at - now))
+        attempt += 1
+
+def _record(limiter: _RedisRateLimiter, model: str, waited: float, attempts: int):
+    try:
+        limiter.record(model, "acquired")
+        if attempts:
+            limiter.record(model, "throttled")
+            limiter.record(model, "wait_seconds", waited)
+    except Exception as e:
+        print(f"Warning: Rate limiter stats update failed: {e}")
+
+async def release(model: str, lease_id: Optional[str], estimated_tokens: int = 0, used_tokens: Optional[int] = None):
+    """Free a lease and true up the token bucket with the tokens actually used"""
+    limiter = _get_limiter()
+    if not limiter or not lease_id:
+        return
+    # acquire() took at most a full bucket, so correct against what was taken
+    charged = min(estimated_tokens, limiter.tpm)
+    adjustment = used_tokens - charged if used_tokens is not None else 0
+    try:
+        await asyncio.to_thread(limiter.release, model, lease_id, adjustment)
+    except Exception as e:
+        # The lease expires on its own after the call timeout
+        print(f"Warning: Rate limiter release failed: {e}")
+
+async def record_rate_limited(model: str):
+    """Count a 429 the API returned despite the limiter (limits set too high)"""
+    limiter = _get_limiter()
+    if limiter:
+        try:
+            await asyncio.to_thread(limiter.record, model, "rate_limited_responses")
+        except Exception as e:
+            print(f"Warning: Rate limiter stats update failed: {e}")
+
+def rate_limiter_stats(models=("gpt-4o",)) -> Dict[str, Any]:
+    """Current bucket and concurrency utilization plus wait counters per model"""
+    try:
+        limiter = _get_limiter()
+        if not limiter:
+            return {"backend": "off"}
+        return {"backend": settings.RATE_LIMIT_BACKEND, "models": {model: limiter.stats(model) for model in models}}
+    except Exception as e:
+        return {"backend": settings.RATE_LIMIT_BACKEND, "error": str(e)}
@@ -0,0 +1,74 @@
+import time
+from typing import Dict, Optional
+
+class RedisLRUStore:
+    """
+    Size-bounded Redis cache shared by the summary and LLM response caches.
+    Entries are plain keys under `prefix` with a TTL; a sorted set of entry
+    ids scored by last access time gives LRU order for trimming to
+    max_entries. Counters live in one hash next to them.
+    """
+
+    def __init__(self, url: str, prefix: str, max_entries: int, ttl: Optional[int] = None):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lru_key = f"{prefix}:lru"
+        self.stats_key = f"{prefix}:stats"
+
+    def _key(self, entry_id: str) -> str:
+        return f"{self.prefix}:entry:{entry_id}"
+
+    def get(self, entry_id: str, stat: Optional[str] = None) -> Optional[bytes]:
+        """
+        Stored data, or None on a miss. Counts a hit or miss, as
+        "hits:<stat>" / "misses:<stat>" when stat is given.
+        """
+        data = self.client.get(self._key(entry_id))
+        suffix = f":{stat}" if stat else ""
+        pipe = self.client.pipeline()
+        if data is None:
+            # Expired by TTL (or never cached): drop it from the LRU index too
+            pipe.zrem(self.lru_key, entry_id)
+            pipe.hincrby(self.stats_key, f"misses{suffix}", 1)
+        else:
+            pipe.zadd(self.lru_key, {entry_id: time.time()})
+            pipe.hincrby(self.stats_key, f"hits{suffix}", 1)
+        pipe.execute()
+        return data
+
+    def set(self, entry_id: str, data: str, ttl: Optional[int] = None):
+        """Store data for ttl seconds (default: the store's ttl), evicting the least recently used"""
+        pipe = self.client.pipeline()
+        pipe.setex(self._key(entry_id), ttl or self.ttl, data)
+        pipe.zadd(self.lru_key, {entry_id: time.time()})
+        pipe.execute()
+
+        overflow = self.client.zcard(self.lru_key) - self.max_entries
+        if overflow > 0:
+            oldest = self.client.zrange(self.lru_key, 0, overflow - 1)
+            pipe = self.client.pipeline()
+            for member in oldest:
+                member = member.decode() if isinstance(member, bytes) else member
+                pipe.delete(self._key(member))
+                pipe.zrem(self.lru_key, member)
+            pipe.hincrby(self.stats_key, "evictions", len(oldest))
+            pipe.execute()
+
+    def incr(self, counters: Dict[str, int]):
+        """Add to caller-defined counters (e.g. tokens saved), reported by stats()"""
+        pipe = self.client.pipeline()
+        for counter, amount in counters.items():
+            pipe.hincrby(self.stats_key, counter, amount)
+        pipe.execute()
+
+    def stats(self) -> Dict[str, int]:
+        raw = self.client.hgetall(self.stats_key)
+        counters = {
+            (key.decode() if isinstance(key, bytes) else key): int(value)
+            for key, value in raw.items()
+        }
+        counters["entries"] = self.client.zcard(self.lru_key)
+        return counters
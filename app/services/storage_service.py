@@ -0,0 +1,497 @@
+import hashlib
+import io
+import os
+import shutil
+import uuid
+from datetime import timedelta
+from typing import Any, BinaryIO, Dict, Optional
+from config import settings
+from app.services import cloudinary_service
+from app.utils.auth import create_access_token, decode_access_token
+
+# Read size when copying a stored object to disk
+COPY_CHUNK_SIZE = 1024 * 1024
+# Part size for S3 multipart uploads (S3 requires at least 5MB for every part but the last)
+S3_PART_SIZE = 8 * 1024 * 1024
+# Smallest ranged read of a stored object; small reads (Parquet footers) are
+# served from this buffer instead of one request each
+RANGE_READ_BUFFER = 1024 * 1024
+
+# API route that plays the role of the presigned URL for the local backend
+LOCAL_UPLOAD_ROUTE = "/api/upload/direct/local"
+LOCAL_UPLOAD_SCOPE = "local_upload"
+# Folder under the local storage root recording upload tokens already used
+USED_TOKENS_FOLDER = ".used_upload_tokens"
+
+LOCAL_SCHEME = "local://"
+S3_SCHEME = "s3://"
+
+class StorageBackend:
+    """
+    Where uploaded CSVs live between the API and the worker.
+    Objects are addressed by the URL returned from an upload sink's finish(),
+    which is what gets stored in Analysis.csv_url.
+    """
+
+    name = "base"
+
+    def open_upload(self, filename: str):
+        """Return a sink with write(bytes), finish() -> url and abort()"""
+        raise NotImplementedError
+
+    def open_read(self, url: str) -> BinaryIO:
+        """Return a binary file-like object streaming the stored bytes"""
+        raise NotImplementedError
+
+    def delete(self, url: str) -> bool:
+        raise NotImplementedError
+
+    def object_size(self, url: str) -> Optional[int]:
+        """Size of a stored object in bytes, or None if it does not exist"""
+        raise NotImplementedError
+
+    def signed_upload(self, filename: str, max_size: int, expires_in: int) -> Dict[str, Any]:
+        """
+        Target the client can upload a file to without going through the API
+        Args:
+            filename: Storage filename (already made unique per user)
+            max_size: Largest upload the target should accept, in bytes
+            expires_in: Seconds the target stays valid
+        Returns:
+            Dict with storage_url plus method, url, fields, headers and
+            file_field describing the request the client must make
+        """
+        raise NotImplementedError
+
+    def read_range(self, url: str, start: int, end: int) -> bytes:
+        """Bytes [start, end) of a stored object"""
+        raise NotImplementedError
+
+    def open_seekable(self, url: str) -> BinaryIO:
+        """
+        Seekable read-only file for a stored object that fetches only the byte
+        ranges actually read, so a Parquet reader can pick single row groups
+        """
+        path = self.local_path(url)
+        if path:
+            return open(path, "rb")
+        size = self.object_size(url)
+        if size is None:
+            raise FileNotFoundError(f"Stored object not found: {url}")
+        return io.BufferedReader(_RangeFile(self, url, size), buffer_size=RANGE_READ_BUFFER)
+
+    def copy(self, url: str, filename: str) -> str:
+        """Copy a stored object to a new filename on this backend, returning its URL"""
+        sink = self.open_upload(filename)
+        try:
+            with self.open_read(url) as source:
+                while True:
+                    chunk = source.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    sink.write(chunk)
+            return sink.finish()
+        except Exception:
+            sink.abort()
+            raise
+
+    def local_path(self, url: str) -> Optional[str]:
+        """Path of the object on this machine, when it can be read in place"""
+        return None
+
+    def download_to_file(self, url: str, path: str) -> str:
+        """
+        Stream a stored object to a local file without holding it in memory
+        Args:
+            url: Storage URL
+            path: Destination file path
+        Returns:
+            The destination path
+        """
+        with self.open_read(url) as source, open(path, "wb") as f:
+            shutil.copyfileobj(source, f, COPY_CHUNK_SIZE)
+        return path
+
+class _RangeFile(io.RawIOBase):
+    """Raw file over a stored object; every read becomes a ranged request"""
+
+    def __init__(self, storage: StorageBackend, url: str, size: int):
+        self.storage = storage
+        self.url = url
+        self.size = size
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        end = min(self.position + len(buffer), self.size)
+        if end <= self.position:
+            return 0
+        data = self.storage.read_range(self.url, self.position, end)
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+class CloudinaryStorage(StorageBackend):
+    name = "cloudinary"
+
+    def open_upload(self, filename: str):
+        return cloudinary_service.CloudinaryUploadStream(filename)
+
+    def open_read(self, url: str) -> BinaryIO:
+        import requests
+        response = requests.get(url, stream=True)
+        response.raise_for_status()
+        # Let urllib3 undo any transfer encoding while still streaming
+        response.raw.decode_content = True
+        return response.raw
+
+    def download_to_file(self, url: str, path: str) -> str:
+        return cloudinary_service.download_csv_to_file(url, path)
+
+    def read_range(self, url: str, start: int, end: int) -> bytes:
+        return cloudinary_service.read_range(url, start, end)
+
+    def open_seekable(self, url: str) -> BinaryIO:
+        # Size from the CDN rather than the rate-limited admin API
+        size = cloudinary_service.content_length(url)
+        if size is None:
+            raise FileNotFoundError(f"Stored object not found: {url}")
+        return io.BufferedReader(_RangeFile(self, url, size), buffer_size=RANGE_READ_BUFFER)
+
+    def delete(self, url: str) -> bool:
+        return cloudinary_service.delete_csv_from_cloudinary(url)
+
+    def object_size(self, url: str) -> Optional[int]:
+        return cloudinary_service.csv_size_in_cloudinary(url)
+
+    def signed_upload(self, filename: str, max_size: int, expires_in: int) -> Dict[str, Any]:
+        # Cloudinary enforces the expiry through the signed timestamp. It has
+        # no size cap for signed uploads, so max_size is enforced on completion
+        # (oversized files are deleted there).
+        return cloudinary_service.signed_upload_params(filename, expires_in)
+
+class _LocalUploadStream:
+    """Writes into a temp file next to the destination and renames on finish()"""
+
+    def __init__(self, storage: "LocalStorage", key: str):
+        self.storage = storage
+        self.key = key
+        self.size = 0
+        self.path = storage.path_for(key)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        self._handle = open(self._temp_path, "wb")
+
+    def write(self, chunk: bytes):
+        self._handle.write(chunk)
+        self.size += len(chunk)
+
+    def finish(self) -> str:
+        self._handle.close()
+        os.replace(self._temp_path, self.path)
+        return f"{LOCAL_SCHEME}{self.key}"
+
+    def abort(self):
+        self._handle.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+class LocalStorage(StorageBackend):
+    """
+    Files under LOCAL_STORAGE_PATH, addressed as local://<key>.
+    Lets the whole pipeline run offline; the worker parses files in place.
+    """
+
+    name = "local"
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.abspath(root or settings.LOCAL_STORAGE_PATH or
+                                    os.path.join(settings.UPLOAD_FOLDER, "storage"))
+
+    def key_for(self, filename: str) -> str:
+        return f"meta_ads_csv/{os.path.basename(filename)}"
+
+    def path_for(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise ValueError(f"Storage key escapes the storage root: {key}")
+        return path
+
+    def _key(self, url: str) -> str:
+        if not url.startswith(LOCAL_SCHEME):
+            raise ValueError(f"Not a local storage URL: {url}")
+        return url[len(LOCAL_SCHEME):]
+
+    def open_upload(self, filename: str):
+        return _LocalUploadStream(self, self.key_for(filename))
+
+    def open_read(self, url: str) -> BinaryIO:
+        return open(self.local_path(url), "rb")
+
+    def local_path(self, url: str) -> Optional[str]:
+        return self.path_for(self._key(url))
+
+    def download_to_file(self, url: str, path: str) -> str:
+        shutil.copyfile(self.local_path(url), path)
+        return path
+
+    def read_range(self, url: str, start: int, end: int) -> bytes:
+        with open(self.local_path(url), "rb") as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    def delete(self, url: str) -> bool:
+        try:
+            os.remove(self.local_path(url))
+            return True
+        except OSError as e:
+            print(f"Warning: Failed to delete local file: {str(e)}")
+            return False
+
+    def object_size(self, url: str) -> Optional[int]:
+        path = self.local_path(url)
+        return os.path.getsize(path) if os.path.exists(path) else None
+
+    def signed_upload(self, filename: str, max_size: int, expires_in: int) -> Dict[str, Any]:
+        """
+        Simulates a presigned PUT: the token names the storage key and size
+        cap, and the API route that accepts it writes straight to disk
+        """
+        key = self.key_for(filename)
+        token = create_access_token(
+            {"scope": LOCAL_UPLOAD_SCOPE, "key": key, "max_size": max_size, "jti": uuid.uuid4().hex},
+            timedelta(seconds=expires_in)
+        )
+        return {
+            "storage_url": f"{LOCAL_SCHEME}{key}",
+            "method": "PUT",
+            "url": f"{LOCAL_UPLOAD_ROUTE}/{token}",
+            "fields": {},
+            "headers": {"Content-Type": "application/octet-stream"},
+            "file_field": None
+        }
+
+    def verify_upload_token(self, token: str) -> Optional[Dict[str, Any]]:
+        """Claims of a token from signed_upload(), or None if invalid or expired"""
+        payload = decode_access_token(token)
+        if not payload or payload.get("scope") != LOCAL_UPLOAD_SCOPE or not payload.get("key"):
+            return None
+        return payload
+
+    def consume_upload_token(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        verify_upload_token() that also marks the token used, so it works
+        once like a single-use presigned URL. A replayed token returns None.
+        """
+        claims = self.verify_upload_token(token)
+        if claims is None:
+            return None
+        folder = os.path.join(self.root, USED_TOKENS_FOLDER)
+        os.makedirs(folder, exist_ok=True)
+        marker = os.path.join(folder, hashlib.sha256(token.encode()).hexdigest())
+        try:
+            # O_EXCL makes the first request to arrive the only one that gets through
+            os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return None
+        return claims
+
+    def open_upload_for_key(self, key: str):
+        return _LocalUploadStream(self, key)
+
+class _S3UploadStream:
+    """
+    Sends the upload to S3 while it arrives: bytes are buffered until a part
+    is full and each full part is uploaded as part of a multipart upload, so
+    finish() only sends the last part. Uploads smaller than one part are sent
+    with a single put_object.
+    """
+
+    def __init__(self, storage: "S3Storage", key: str):
+        self.storage = storage
+        self.key = key
+        self.size = 0
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+
+    def write(self, chunk: bytes):
+        self._buffer += chunk
+        self.size += len(chunk)
+        while len(self._buffer) >= S3_PART_SIZE:
+            try:
+                self._upload_part(bytes(self._buffer[:S3_PART_SIZE]))
+            except Exception as e:
+                self.abort()
+                raise Exception(f"Failed to upload to S3: {str(e)}")
+            del self._buffer[:S3_PART_SIZE]
+
+    def _upload_part(self, data: bytes):
+        client, bucket = self.storage.client, self.storage.bucket
+        if self._upload_id is None:
+            self._upload_id = client.create_multipart_upload(Bucket=bucket, Key=self.key)["UploadId"]
+        number = len(self._parts) + 1
+        response = client.upload_part(
+            Bucket=bucket, Key=self.key, UploadId=self._upload_id, PartNumber=number, Body=data
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": number})
+
+    def finish(self) -> str:
+        client, bucket = self.storage.client, self.storage.bucket
+        try:
+            if self._upload_id is None:
+                client.put_object(Bucket=bucket, Key=self.key, Body=bytes(self._buffer))
+            else:
+                if self._buffer:
+                    self._upload_part(bytes(self._buffer))
+                client.complete_multipart_upload(
+                    Bucket=bucket, Key=self.key, UploadId=self._upload_id,
+                    MultipartUpload={"Parts": self._parts}
+                )
+            self._upload_id = None
+            return f"{S3_SCHEME}{bucket}/{self.key}"
+
+        except Exception as e:
+            self.abort()
+            raise Exception(f"Failed to upload to S3: {str(e)}")
+
+        finally:
+            self._buffer = bytearray()
+
+    def abort(self):
+        """Drop the buffer and any parts already sent"""
+        self._buffer = bytearray()
+        if self._upload_id is not None:
+            try:
+                self.storage.client.abort_multipart_upload(
+                    Bucket=self.storage.bucket, Key=self.key, UploadId=self._upload_id
+                )
+            except Exception as e:
+                print(f"Warning: Failed to abort S3 multipart upload: {str(e)}")
+            self._upload_id = None
+
+class S3Storage(StorageBackend):
+    """S3 or any S3-compatible service (MinIO, R2), addressed as s3://bucket/key"""
+
+    name = "s3"
+
+    def __init__(self):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+
+        self.bucket = settings.S3_BUCKET
+        self.prefix = settings.S3_PREFIX.strip("/")
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL or None,
+            region_name=settings.S3_REGION or None,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID or None,
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY or None
+        )
+
+    def key_for(self, filename: str) -> str:
+        name = os.path.basename(filename)
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def _split(self, url: str) -> tuple:
+        if not url.startswith(S3_SCHEME):
+            raise ValueError(f"Not an S3 URL: {url}")
+        bucket, _, key = url[len(S3_SCHEME):].partition("/")
+        return bucket, key
+
+    def open_upload(self, filename: str):
+        return _S3UploadStream(self, self.key_for(filename))
+
+    def open_read(self, url: str) -> BinaryIO:
+        bucket, key = self._split(url)
+        return self.client.get_object(Bucket=bucket, Key=key)["Body"]
+
+    def download_to_file(self, url: str, path: str) -> str:
+        bucket, key = self._split(url)
+        self.client.download_file(bucket, key, path)
+        return path
+
+    def read_range(self, url: str, start: int, end: int) -> bytes:
+        bucket, key = self._split(url)
+        return self.client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end - 1}")["Body"].read()
+
+    def object_size(self, url: str) -> Optional[int]:
+        bucket, key = self._split(url)
+        try:
+            return self.client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        except self.client.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def signed_upload(self, filename: str, max_size: int, expires_in: int) -> Dict[str, Any]:
+        # A presigned POST (rather than PUT) lets S3 itself enforce the size cap
+        key = self.key_for(filename)
+        post = self.client.generate_presigned_post(
+            Bucket=self.bucket,
+            Key=key,
+            Conditions=[["content-length-range", 1, max_size]],
+            ExpiresIn=expires_in
+        )
+        return {
+            "storage_url": f"{S3_SCHEME}{self.bucket}/{key}",
+            "method": "POST",
+            "url": post["url"],
+            "fields": post["fields"],
+            "headers": {},
+            "file_field": "file"
+        }
+
+    def delete(self, url: str) -> bool:
+        try:
+            bucket, key = self._split(url)
+            self.client.delete_object(Bucket=bucket, Key=key)
+            return True
+        except Exception as e:
+            print(f"Warning: Failed to delete from S3: {str(e)}")
+            return False
+
+STORAGE_BACKENDS = {
+    "cloudinary": CloudinaryStorage,
+    "local": LocalStorage,
+    "s3": S3Storage,
+}
+
+_instances = {}
+
+def _backend(name: str) -> StorageBackend:
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND '{name}' (expected one of {', '.join(STORAGE_BACKENDS)})")
+    if name not in _instances:
+        _instances[name] = STORAGE_BACKENDS[name]()
+    return _instances[name]
+
+def get_storage() -> StorageBackend:
+    """Backend new uploads are written to (STORAGE_BACKEND)"""
+    return _backend((settings.STORAGE_BACKEND or "cloudinary").lower())
+
+def storage_for_url(url: str) -> StorageBackend:
+    """
+    Backend holding an existing object, picked from its URL so analyses
+    uploaded before a STORAGE_BACKEND switch can still be processed
+    """
+    if url.startswith(LOCAL_SCHEME):
+        return _backend("local")
+    if url.startswith(S3_SCHEME):
+        return _backend("s3")
+    return _backend("cloudinary")
@@ -0,0 +1,164 @@
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+from config import settings
+from app.services.redis_lru import RedisLRUStore
+
+# Bump when the parsed summary or prompt format changes so stale entries are ignored
+SUMMARY_CACHE_VERSION = 5
+REDIS_PREFIX = f"summary_cache:v{SUMMARY_CACHE_VERSION}"
+
+def _json_default(value):
+    # numpy scalars (np.int64 counts, np.float64 sums) -> plain Python numbers
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+class _DiskSummaryStore:
+    """
+    Disk counterpart of RedisLRUStore: one JSON file per content hash. File
+    mtime is refreshed on every hit and gives LRU order; the write time stored
+    in the file drives TTL expiry.
+    """
+
+    def __init__(self, folder: str, ttl: int, max_entries: int):
+        self.folder = folder
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats_path = os.path.join(folder, "stats.json")
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.folder, f"v{SUMMARY_CACHE_VERSION}_{content_hash}.json")
+
+    def _bump(self, counter: str, amount: int = 1):
+        # Best effort: concurrent workers may occasionally lose an increment
+        counters = self._read_stats()
+        counters[counter] = counters.get(counter, 0) + amount
+        temp_path = f"{self.stats_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(counters, f)
+        os.replace(temp_path, self.stats_path)
+
+    def _read_stats(self) -> Dict[str, int]:
+        try:
+            with open(self.stats_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _entries(self):
+        prefix = f"v{SUMMARY_CACHE_VERSION}_"
+        return [
+            os.path.join(self.folder, name) for name in os.listdir(self.folder)
+            if name.startswith(prefix) and name.endswith(".json")
+        ]
+
+    def get(self, content_hash: str) -> Optional[str]:
+        path = self._path(content_hash)
+        try:
+            with open(path) as f:
+                cached_at, data = f.readline(), f.read()
+            if time.time() - float(cached_at) > self.ttl:
+                os.remove(path)
+                data = None
+        except (OSError, ValueError):
+            data = None
+
+        if data is None:
+            self._bump("misses")
+            return None
+
+        os.utime(path)
+        self._bump("hits")
+        return data
+
+    def set(self, content_hash: str, data: str):
+        path = self._path(content_hash)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(f"{time.time()}\n")
+            f.write(data)
+        os.replace(temp_path, path)
+
+        entries = self._entries()
+        overflow = len(entries) - self.max_entries
+        if overflow > 0:
+            entries.sort(key=os.path.getmtime)
+            for old_path in entries[:overflow]:
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+            self._bump("evictions", overflow)
+
+    def stats(self) -> Dict[str, int]:
+        counters = self._read_stats()
+        counters["entries"] = len(self._entries())
+        return counters
+
+_store = None
+
+def _get_store():
+    global _store
+    if _store is None:
+        backend = (settings.SUMMARY_CACHE_BACKEND or "off").lower()
+        if backend == "redis":
+            _store = RedisLRUStore(
+                settings.REDIS_URL, REDIS_PREFIX, settings.SUMMARY_CACHE_MAX_ENTRIES, settings.SUMMARY_CACHE_TTL
+            )
+        elif backend == "disk":
+            folder = settings.SUMMARY_CACHE_DIR or os.path.join(settings.UPLOAD_FOLDER, "summary_cache")
+            _store = _DiskSummaryStore(folder, settings.SUMMARY_CACHE_TTL, settings.SUMMARY_CACHE_MAX_ENTRIES)
+        else:
+            _store = False
+    return _store
+
+def get_cached_summary(content_hash: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Cached parse output for a file's content hash
+    Returns:
+        {"parsed": parse_meta_ads_csv output, "prompt": format_metrics_for_ai output}
+        or None on a miss. Cache errors are logged and treated as misses.
+    """
+    if not content_hash:
+        return None
+    try:
+        store = _get_store()
+        data = store.get(content_hash) if store else None
+        return json.loads(data) if data else None
+    except Exception as e:
+        print(f"Warning: Summary cache read failed: {e}")
+        return None
+
+def cache_summary(content_hash: Optional[str], parsed: Dict[str, Any], prompt: str):
+    """Store parse output for a content hash (errors are logged, never raised)"""
+    if not content_hash:
+        return
+    try:
+        store = _get_store()
+        if store:
+            store.set(content_hash, json.dumps({"parsed": parsed, "prompt": prompt}, default=_json_default))
+    except Exception as e:
+        print(f"Warning: Summary cache write failed: {e}")
+
+def summary_cache_stats() -> Dict[str, Any]:
+    """Hit/miss/eviction counters plus current entry count"""
+    try:
+        store = _get_store()
+        if not store:
+            return {"backend": "off"}
+        counters = store.stats()
+    except Exception as e:
+        return {"backend": settings.SUMMARY_CACHE_BACKEND, "error": str(e)}
+
+    hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+    return {
+        "backend": settings.SUMMARY_CACHE_BACKEND,
+        "hits": hits,
+        "misses": misses,
+        "evictions": counters.get("evictions", 0),
+        "entries": counters.get("entries", 0),
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None
+    }
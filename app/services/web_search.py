@@ -0,0 +1,310 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+import httpx
+from config import settings
+
+REDIS_PREFIX = "web_search"
+
+# Upper bounds in seconds of the latency histogram buckets (plus an open-ended last bucket)
+LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# Consecutive failures that open a provider's circuit
+BREAKER_FAILURE_THRESHOLD = 3
+# Seconds an open circuit skips the provider before letting one probe request through
+BREAKER_RESET_SECONDS = 60
+
+# Connection pool shared by every search in the worker process
+POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+
+async def _search_tavily(client: httpx.AsyncClient, niche: str) -> list:
+    response = await client.post(
+        f"{settings.TAVILY_BASE_URL}/search",
+        json={
+            "api_key": settings.TAVILY_API_KEY,
+            "query": f"top companies in {niche} industry with websites",
+            "search_depth": "advanced",
+            "max_results": 10
+        }
+    )
+    response.raise_for_status()
+    return response.json().get('results', [])
+
+async def _search_serpapi(client: httpx.AsyncClient, niche: str) -> list:
+    response = await client.get(
+        f"{settings.SERPAPI_BASE_URL}/search",
+        params={
+            "api_key": settings.SERPAPI_KEY,
+            "q": f"top companies in {niche} industry",
+            "num": 10
+        }
+    )
+    response.raise_for_status()
+    return response.json().get('organic_results', [])
+
+# (name, API key setting, search function) in order of preference
+PROVIDERS = [
+    ("tavily", "TAVILY_API_KEY", _search_tavily),
+    ("serpapi", "SERPAPI_KEY", _search_serpapi),
+]
+
+class CircuitBreaker:
+    """
+    Per-process breaker for one provider. Opens after BREAKER_FAILURE_THRESHOLD
+    consecutive failures so searches skip the provider instead of waiting out
+    its timeout; after BREAKER_RESET_SECONDS a single probe is let through and
+    its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.probing or time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self) -> bool:
+        """Whether a request may go out now (claims the probe slot when half-open)"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if not self.probing and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.probing = True
+                return True
+            return False
+
+    def release_probe(self):
+        """Give back an unfinished probe (the request was cancelled, not failed)"""
+        with self.lock:
+            self.probing = False
+
+    def record_success(self):
+        with self.lock:
+            reopened = self.opened_at is not None
+            self.failures, self.opened_at, self.probing = 0, None, False
+        if reopened:
+            print(f"{self.name} circuit closed")
+            _record_async(self.name, {}, circuit="closed")
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            opened = self.failures >= self.threshold
+            if opened:
+                self.opened_at = time.monotonic()
+        if opened:
+            print(f"Warning: {self.name} circuit open after {self.failures} consecutive failures")
+            _record_async(self.name, {"circuit_opened": 1}, circuit="open")
+
+_breakers = {name: CircuitBreaker(name) for name, _, _ in PROVIDERS}
+
+# Event loop thread that owns the pooled client. Each Celery task runs its own
+# short-lived asyncio.run loop, and an httpx pool is bound to the loop that
+# created it, so the pool lives on this long-lived loop instead.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+_loop_lock = threading.Lock()
+_client: Optional[httpx.AsyncClient] = None
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _loop_pid, _client
+    with _loop_lock:
+        # A forked worker inherits the loop object but not its thread
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            _client = None
+            threading.Thread(target=_loop.run_forever, name="web-search-loop", daemon=True).start()
+        return _loop
+
+def _get_client() -> httpx.AsyncClient:
+    # Only called on the search loop thread
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(limits=POOL_LIMITS, timeout=settings.WEB_SEARCH_TIMEOUT)
+    return _client
+
+# Seconds stats writes are skipped after Redis fails, so an outage logs once per pause
+STATS_RETRY_SECONDS = 60
+
+_redis = None
+_stats_paused_until = 0.0
+
+def _get_redis():
+    global _redis
+    if _redis is None:
+        import redis
+        _redis = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis
+
+def _record(provider: str, counters: Dict[str, float], circuit: Optional[str] = None):
+    """Add to a provider's counters in Redis so every worker's searches show up at /api/metrics"""
+    global _stats_paused_until
+    if time.monotonic() < _stats_paused_until:
+        return
+    try:
+        key = f"{REDIS_PREFIX}:{provider}:stats"
+        pipe = _get_redis().pipeline()
+        for field, amount in counters.items():
+            pipe.hincrbyfloat(key, field, amount)
+        if circuit:
+            pipe.hset(key, "circuit", circuit)
+        pipe.execute()
+    except Exception as e:
+        _stats_paused_until = time.monotonic() + STATS_RETRY_SECONDS
+        print(f"Warning: Web search stats update failed, pausing for {STATS_RETRY_SECONDS}s: {e}")
+
+def _record_async(provider: str, counters: Dict[str, float], circuit: Optional[str] = None):
+    # Keep the blocking Redis write off the search loop
+    try:
+        asyncio.get_running_loop().run_in_executor(None, _record, provider, counters, circuit)
+    except RuntimeError:
+        _record(provider, counters, circuit)
+
+def _bucket(seconds: float) -> str:
+    for bound in LATENCY_BUCKETS:
+        if seconds <= bound:
+            return f"le_{bound}"
+    return "le_inf"
+
+async def _call(provider: str, search, niche: str) -> list:
+    """One provider request; failures return [] and count against its breaker"""
+    breaker = _breakers[provider]
+    started = time.perf_counter()
+    try:
+        results = await asyncio.wait_for(search(_get_client(), niche), settings.WEB_SEARCH_TIMEOUT)
+    except asyncio.CancelledError:
+        # Lost a hedge race: not the provider's fault, and not a full latency sample
+        breaker.release_probe()
+        _record_async(provider, {"cancelled": 1})
+        raise
+    except Exception as e:
+        outcome = "timeout" if isinstance(e, (asyncio.TimeoutError, httpx.TimeoutException)) else "error"
+        print(f"{provider} search failed ({outcome}): {e!r}")
+        breaker.record_failure()
+        results = None
+    else:
+        outcome = "success"
+        breaker.record_success()
+        print(f"{provider} search returned {len(results)} results")
+
+    seconds = time.perf_counter() - started
+    _record_async(provider, {outcome: 1, "count": 1, "sum": seconds, _bucket(seconds): 1})
+    return results or []
+
+async def _hedged_search(niche: str) -> list:
+    providers = [(name, search) for name, key_setting, search in PROVIDERS if getattr(settings, key_setting, "")]
+    pending: Dict[asyncio.Task, str] = {}
+    next_provider = 0
+
+    def launch_next() -> Optional[str]:
+        # Start the next provider whose circuit allows a request
+        nonlocal next_provider
+        while next_provider < len(providers):
+            name, search = providers[next_provider]
+            next_provider += 1
+            if _breakers[name].allow():
+                pending[asyncio.ensure_future(_call(name, search, niche))] = name
+                return name
+            print(f"Skipping {name} search (circuit {_breakers[name].state})")
+            _record_async(name, {"short_circuited": 1})
+        return None
+
+    launch_next()
+    hedged = False
+    try:
+        while pending:
+            # While a fallback provider remains, give the in-flight ones only the hedge delay
+            hedge_delay = settings.WEB_SEARCH_HEDGE_DELAY if next_provider < len(providers) else None
+            done, _ = await asyncio.wait(pending, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                hedge = launch_next()
+                if hedge:
+                    print(f"Search slow after {hedge_delay}s, racing {hedge}")
+                    _record_async(hedge, {"hedged": 1})
+                    hedged = True
+                continue
+            for task in done:
+                provider = pending.pop(task)
+                results = task.result()
+                if results:
+                    if hedged:
+                        _record_async(provider, {"won_hedge": 1})
+                    return results
+            if not pending:
+                # Failed or empty: fall through to the next provider at once
+                launch_next()
+        return []
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def search(niche: str) -> list:
+    """
+    Web search results about companies in a niche. Providers are tried in
+    PROVIDERS order: a failed or empty answer falls through to the next one,
+    and a primary slower than WEB_SEARCH_HEDGE_DELAY is raced against the
+    next; the first non-empty answer wins. Returns [] when no provider is
+    configured or all fail. Runs on the shared pooled client.
+    """
+    future = asyncio.run_coroutine_threadsafe(_hedged_search(niche), _get_loop())
+    return await asyncio.wrap_future(future)
+
+def web_search_stats() -> Dict[str, Any]:
+    """Outcome counters, latency histogram and percentiles per provider, across all workers"""
+    try:
+        pipe = _get_redis().pipeline()
+        for name, _, _ in PROVIDERS:
+            pipe.hgetall(f"{REDIS_PREFIX}:{name}:stats")
+        raw_stats = pipe.execute()
+    except Exception as e:
+        return {"error": str(e)}
+
+    providers = {}
+    for (name, key_setting, _), raw in zip(PROVIDERS, raw_stats):
+        fields = {
+            (key.decode() if isinstance(key, bytes) else key): (value.decode() if isinstance(value, bytes) else value)
+            for key, value in raw.items()
+        }
+        circuit = fields.pop("circuit", "closed")
+        counters = {key: float(value) for key, value in fields.items()}
+        count = int(counters.get("count", 0))
+
+        # Cumulative counts per upper bound, as in a Prometheus histogram
+        histogram, cumulative = {}, 0
+        for bound in LATENCY_BUCKETS + ["inf"]:
+            cumulative += int(counters.get(f"le_{bound}", 0))
+            histogram[str(bound)] = cumulative
+
+        providers[name] = {
+            "configured": bool(getattr(settings, key_setting, "")),
+            "circuit": circuit,
+            "requests": count,
+            **{key: int(counters.get(key, 0)) for key in
+               ("success", "error", "timeout", "cancelled", "short_circuited", "hedged", "won_hedge", "circuit_opened")},
+            "mean_seconds": round(counters.get("sum", 0) / count, 3) if count else None,
+            "p50_seconds": _percentile(histogram, count, 0.5),
+            "p95_seconds": _percentile(histogram, count, 0.95),
+            "latency_histogram": histogram,
+        }
+    return {"hedge_delay": settings.WEB_SEARCH_HEDGE_DELAY, "providers": providers}
+
+def _percentile(histogram: Dict[str, int], count: int, quantile: float) -> Optional[float]:
+    """Upper bound of the bucket holding the quantile (None past the last finite bucket)"""
+    if not count:
+        return None
+    for bound, cumulative in histogram.items():
+        if cumulative >= quantile * count:
+            return None if bound == "inf" else float(bound)
+    return None
@@ -0,0 +1,232 @@
+"""
+Deterministic analytics computed locally from the parser's aggregates, so
+the numeric parts of a report never depend on the LLM. Everything here works
+on the per-ad and per-day sums held by BreakdownAccumulator, which means the
+streaming, in-memory and parallel parsers all feed it the same input.
+"""
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+from app.utils.breakdowns import BreakdownAccumulator, derive_ratios
+
+# Ads ranked and checked for outliers: those with at least the median ad's
+# spend, capped to the biggest spenders so huge exports stay cheap
+ELIGIBLE_ADS_LIMIT = 500
+# Best/worst ads reported
+RANKED_ADS_LIMIT = 5
+# Weeks of history kept in the weekly trend table
+TREND_WEEKS = 8
+# Robust z-score (median/MAD) above which an ad's ratio is an outlier
+OUTLIER_Z = 3.5
+OUTLIERS_LIMIT = 10
+# MAD -> standard deviation for normally distributed data
+MAD_SCALE = 1.4826
+
+def _num(value, digits: int = 4) -> Optional[float]:
+    """Round to a JSON-safe float, None for NaN/inf"""
+    if value is None:
+        return None
+    value = float(value)
+    return round(value, digits) if np.isfinite(value) else None
+
+def _pct_change(current: float, previous: float) -> Optional[float]:
+    if previous is None or current is None or not previous or not np.isfinite(previous):
+        return None
+    return _num((current - previous) / abs(previous) * 100, 2)
+
+def efficiency_metric(totals: pd.Series) -> Optional[str]:
+    """
+    Ratio used to rank ads: CPA when the export tracks conversions, then
+    CPC, then CTR. Returns the column name (lower is better except for CTR).
+    """
+    if totals.get("conversions", 0) > 0 and "spend" in totals:
+        return "cpa"
+    if totals.get("clicks", 0) > 0 and "spend" in totals:
+        return "cpc"
+    if "clicks" in totals and "impressions" in totals:
+        return "ctr"
+    return None
+
+def performance_report(breakdowns: BreakdownAccumulator, date_range: Dict[str, str]) -> Dict[str, Any]:
+    """Blended totals and ratios for the whole export"""
+    totals = breakdowns.totals()
+    if totals is None:
+        return {}
+    overall = derive_ratios(totals.to_frame().T).iloc[0]
+
+    report: Dict[str, Any] = {}
+    for key in ("spend", "impressions", "clicks", "conversions"):
+        if key in overall:
+            report[f"total_{key}"] = _num(overall[key], 2)
+    for key in ("ctr", "cpc", "cpm", "cpa"):
+        if key in overall:
+            report[key] = _num(overall[key])
+    if "conversions" in overall and "clicks" in overall and overall["clicks"]:
+        report["conversion_rate"] = _num(overall["conversions"] / overall["clicks"] * 100)
+
+    daily = breakdowns.daily_frame()
+    if daily is not None:
+        report["days"] = len(daily)
+        if "spend" in daily:
+            report["average_daily_spend"] = _num(daily["spend"].mean(), 2)
+    if date_range and date_range.get("start") not in (None, "nan"):
+        report["date_range"] = f"{date_range['start']} to {date_range['end']}"
+
+    for name in ("campaign", "ad_set", "ad"):
+        sums = breakdowns.sums(name)
+        if sums is not None:
+            report[f"{name}_count"] = len(sums)
+    return report
+
+def weekly_trends(breakdowns: BreakdownAccumulator) -> Dict[str, Any]:
+    """
+    Metrics per 7-day window, counted back from the last day so the latest
+    week is always complete, plus the change of the latest week over the one before
+    """
+    daily = breakdowns.daily_frame()
+    if daily is None or len(daily) < 7:
+        return {}
+
+    summable = [col for col in ("impressions", "clicks", "spend", "conversions") if col in daily]
+    # Week number counted back from the last day: 0 = latest 7 days
+    week_index = (len(daily) - 1 - np.arange(len(daily))) // 7
+    weekly = daily[summable].groupby(week_index).sum()
+    days_per_week = pd.Series(week_index).value_counts()
+    # Drop a leading partial week so every row covers 7 days
+    weekly = weekly[days_per_week.reindex(weekly.index).to_numpy() == 7]
+    # Latest week first
+    weekly = derive_ratios(weekly.sort_index().head(TREND_WEEKS))
+
+    starts = {week: daily.index[week_index == week][0] for week in weekly.index}
+    rows = []
+    for week, values in weekly.iterrows():
+        row = {"week_start": starts[week].strftime("%Y-%m-%d")}
+        row.update({key: _num(value) for key, value in values.items()})
+        rows.append(row)
+
+    result: Dict[str, Any] = {"weeks": rows}
+    if len(weekly) >= 2:
+        latest, previous = weekly.iloc[0], weekly.iloc[1]
+        result["week_over_week"] = {
+            key: _pct_change(latest[key], previous[key]) for key in weekly.columns
+        }
+    return result
+
+def _eligible_ads(breakdowns: BreakdownAccumulator) -> Optional[pd.DataFrame]:
+    sums = breakdowns.sums("ad")
+    if sums is None or "spend" not in sums:
+        return None
+    sums = sums[sums["spend"] >= sums["spend"].median()].nlargest(ELIGIBLE_ADS_LIMIT, "spend")
+    return derive_ratios(sums)
+
+def ranked_ads(breakdowns: BreakdownAccumulator) -> Dict[str, Any]:
+    """Best and worst ads by efficiency among ads with meaningful spend"""
+    ads = _eligible_ads(breakdowns)
+    totals = breakdowns.totals()
+    metric = efficiency_metric(totals) if totals is not None else None
+    if ads is None or ads.empty or metric is None:
+        return {}
+
+    higher_is_better = metric == "ctr"
+    # Ads with no conversions/clicks have an undefined ratio; they rank last
+    values = ads[metric].to_numpy(dtype="float64")
+    score = np.where(np.isnan(values), -np.inf if higher_is_better else np.inf, values)
+    if higher_is_better:
+        score = -score
+    # Ties (e.g. several ads with no conversions) rank the bigger spender first
+    spend = ads["spend"].to_numpy(dtype="float64")
+    best_order = np.lexsort((-spend, score))
+    worst_order = np.lexsort((-spend, -score))
+
+    def rows(indexes) -> List[Dict[str, Any]]:
+        out = []
+        for i in indexes:
+            row = {"ad": str(ads.index[i])}
+            row.update({key: _num(value) for key, value in ads.iloc[i].items()})
+            out.append(row)
+        return out
+
+    limit = min(RANKED_ADS_LIMIT, len(ads) // 2) or 1
+    return {
+        "metric": metric,
+        "eligible_ads": len(ads),
+        "best": rows(best_order[:limit]),
+        "worst": rows(worst_order[:limit]) if len(ads) > 1 else []
+    }
+
+def spend_concentration(breakdowns: BreakdownAccumulator) -> Dict[str, Any]:
+    """How much of the budget a few ads and campaigns absorb"""
+    result: Dict[str, Any] = {}
+    for name in ("ad", "campaign"):
+        sums = breakdowns.sums(name)
+        if sums is None or "spend" not in sums:
+            continue
+        spend = np.sort(sums["spend"].to_numpy(dtype="float64"))[::-1]
+        spend = spend[spend > 0]
+        total = spend.sum()
+        if not total:
+            continue
+        shares = spend / total
+        cumulative = np.cumsum(shares)
+        # Gini coefficient over ascending spend
+        ascending = spend[::-1]
+        n = len(ascending)
+        gini = (2 * np.arange(1, n + 1) - n - 1).dot(ascending) / (n * total) if n > 1 else 0.0
+        result[name] = {
+            "count": n,
+            "top_1_share": _num(shares[0] * 100, 2),
+            "top_5_share": _num(shares[:5].sum() * 100, 2),
+            "count_for_80_percent": int(min(n, np.searchsorted(cumulative, 0.8) + 1)),
+            "hhi": _num((shares ** 2).sum() * 10000, 1),
+            "gini": _num(gini)
+        }
+    return result
+
+def ratio_outliers(breakdowns: BreakdownAccumulator) -> List[Dict[str, Any]]:
+    """
+    Ads whose CTR, CPC or CPA sits far from the typical ad, using robust
+    z-scores (median/MAD) so a few extreme ads cannot hide each other
+    """
+    ads = _eligible_ads(breakdowns)
+    if ads is None or len(ads) < 5:
+        return []
+
+    outliers = []
+    for metric in ("ctr", "cpc", "cpa"):
+        if metric not in ads:
+            continue
+        values = ads[metric].to_numpy(dtype="float64")
+        valid = np.isfinite(values)
+        if valid.sum() < 5:
+            continue
+        median = np.median(values[valid])
+        mad = np.median(np.abs(values[valid] - median)) * MAD_SCALE
+        if not mad:
+            continue
+        z = (values - median) / mad
+        for i in np.flatnonzero(valid & (np.abs(z) >= OUTLIER_Z)):
+            outliers.append({
+                "ad": str(ads.index[i]),
+                "metric": metric,
+                "value": _num(values[i]),
+                "median": _num(median),
+                "z_score": _num(z[i], 2),
+                "spend": _num(ads["spend"].iloc[i], 2)
+            })
+
+    outliers.sort(key=lambda row: abs(row["z_score"]), reverse=True)
+    return outliers[:OUTLIERS_LIMIT]
+
+def compute_analytics(breakdowns: BreakdownAccumulator, date_range: Dict[str, str]) -> Dict[str, Any]:
+    """
+    All local analytics for a parsed export
+    Returns:
+        {"performance_report", "trends", "ads", "spend_concentration", "outliers"}
+    """
+    return {
+        "performance_report": performance_report(breakdowns, date_range),
+        "trends": weekly_trends(breakdowns),
+        "ads": ranked_ads(breakdowns),
+        "spend_concentration": spend_concentration(breakdowns),
+        "outliers": ratio_outliers(breakdowns)
+    }
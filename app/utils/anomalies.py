@@ -0,0 +1,198 @@
+"""
+Anomaly detection over the daily series, per campaign and for the account as
+a whole. Every campaign is scored at once as one row of a campaigns x days
+array, so the cost depends on campaigns x days, not on the number of rows in
+the export.
+"""
+import warnings
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Tuple
+from app.utils.breakdowns import BreakdownAccumulator
+
+# Trailing days forming the baseline each day is compared against
+ANOMALY_WINDOW = 7
+# Baseline days with data needed before a day is scored
+ANOMALY_MIN_PERIODS = 5
+# A day is flagged when both its rolling z-score (vs the trailing window) and
+# its robust z-score (vs the series median/MAD) pass these thresholds
+ROLLING_Z_THRESHOLD = 3.0
+ROBUST_Z_THRESHOLD = 3.5
+# Smallest move from the baseline worth reporting, as a fraction of it;
+# on steady series a statistically significant day can still be a small one
+MIN_RELATIVE_CHANGE = 0.3
+# Spread floor as a fraction of the baseline level, so flat series don't turn
+# tiny wobbles into huge z-scores
+MIN_RELATIVE_SPREAD = 0.05
+# MAD -> standard deviation for normally distributed data
+MAD_SCALE = 1.4826
+ANOMALIES_LIMIT = 20
+
+# Smallest daily denominators a ratio is trusted with
+MIN_DAILY_CLICKS = 20
+MIN_DAILY_IMPRESSIONS = 1000
+MIN_DAILY_CONVERSIONS = 5
+
+ACCOUNT_LABEL = "All campaigns"
+
+# Metric -> direction flagged ("spike", "drop" or "both")
+ANOMALY_RULES = {
+    "cpc": "spike",
+    "ctr": "drop",
+    "cpa": "spike",
+    "spend": "both",
+}
+
+ANOMALY_LABELS = {
+    ("cpc", "spike"): "CPC spike",
+    ("ctr", "drop"): "CTR collapse",
+    ("cpa", "spike"): "CPA spike",
+    ("spend", "spike"): "Spend spike",
+    ("spend", "drop"): "Spend drop",
+}
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray, minimum: float, scale: float = 1.0) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator >= minimum, numerator / denominator * scale, np.nan)
+
+def daily_metric_arrays(sums: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Daily spend and ratios to score, as series x days arrays
+    Args:
+        sums: Summed metrics per series per day (NaN where a series had no rows)
+    Returns:
+        Metric -> array, NaN outside each series' active days and where a
+        ratio's denominator is too small to be meaningful
+    """
+    values = {metric: np.nan_to_num(array) for metric, array in sums.items()}
+    activity = np.zeros_like(next(iter(values.values())), dtype=bool)
+    for metric in ("spend", "impressions"):
+        if metric in values:
+            activity |= values[metric] > 0
+    # Active from a series' first delivering day to its last; a zero day in
+    # between is a pacing gap, days outside are before launch or after pause
+    active = np.maximum.accumulate(activity, axis=1) & np.maximum.accumulate(activity[:, ::-1], axis=1)[:, ::-1]
+
+    arrays = {}
+    if "spend" in values:
+        arrays["spend"] = np.where(active, values["spend"], np.nan)
+    if "spend" in values and "clicks" in values:
+        arrays["cpc"] = _ratio(values["spend"], values["clicks"], MIN_DAILY_CLICKS)
+    if "clicks" in values and "impressions" in values:
+        arrays["ctr"] = _ratio(values["clicks"], values["impressions"], MIN_DAILY_IMPRESSIONS, 100.0)
+    if "spend" in values and "conversions" in values:
+        arrays["cpa"] = _ratio(values["spend"], values["conversions"], MIN_DAILY_CONVERSIONS)
+    return arrays
+
+def _trailing_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """Sum over the `window` days before each day (the day itself excluded)"""
+    cumulative = np.zeros((values.shape[0], values.shape[1] + 1))
+    np.cumsum(values, axis=1, out=cumulative[:, 1:])
+    days = np.arange(values.shape[1])
+    return cumulative[:, days] - cumulative[:, np.maximum(days - window, 0)]
+
+def rolling_zscores(values: np.ndarray, window: int = ANOMALY_WINDOW,
+                    min_periods: int = ANOMALY_MIN_PERIODS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Z-score of each day against the mean and standard deviation of the
+    trailing window, from cumulative sums so every series is done in one pass
+    Returns:
+        (z-scores, baseline means), NaN where the window has too few values
+    """
+    valid = np.isfinite(values)
+    x = np.where(valid, values, 0.0)
+    count = _trailing_sum(valid.astype("float64"), window)
+    total = _trailing_sum(x, window)
+    squares = _trailing_sum(x * x, window)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = total / count
+        variance = np.maximum(squares - total * mean, 0) / (count - 1)
+        spread = np.maximum(np.sqrt(variance), np.abs(mean) * MIN_RELATIVE_SPREAD)
+        z = (values - mean) / spread
+    mean[count < min_periods] = np.nan
+    z[~np.isfinite(mean) | (spread == 0)] = np.nan
+    return z, mean
+
+def robust_zscores(values: np.ndarray) -> np.ndarray:
+    """Z-score of each day against its series' median and MAD"""
+    with warnings.catch_warnings():
+        # Series with no valid days give all-NaN slices
+        warnings.simplefilter("ignore", RuntimeWarning)
+        median = np.nanmedian(values, axis=1, keepdims=True)
+        mad = np.nanmedian(np.abs(values - median), axis=1, keepdims=True) * MAD_SCALE
+    spread = np.maximum(mad, np.abs(median) * MIN_RELATIVE_SPREAD)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (values - median) / spread
+    z[~np.isfinite(z)] = np.nan
+    return z
+
+def detect_anomalies(sums: Dict[str, np.ndarray], labels: List[str], days: pd.DatetimeIndex,
+                     limit: int = ANOMALIES_LIMIT) -> List[Dict[str, Any]]:
+    """
+    Flag days whose spend, CPC, CTR or CPA breaks sharply from both the
+    trailing week and the series' typical level, by at least MIN_RELATIVE_CHANGE
+    Args:
+        sums: Summed metrics, one series x days array per metric
+        labels: Series names (campaigns), one per row
+        days: Calendar day of each column
+        limit: Most anomalies returned, strongest first
+    Returns:
+        List of {"date", "campaign", "metric", "type", "value", "baseline",
+        "change_pct", "z_score", "robust_z"}
+    """
+    found = []
+    for metric, values in daily_metric_arrays(sums).items():
+        direction = ANOMALY_RULES[metric]
+        z, baseline = rolling_zscores(values)
+        robust = robust_zscores(values)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            material = np.abs(values - baseline) >= np.abs(baseline) * MIN_RELATIVE_CHANGE
+            spike = material & (z >= ROLLING_Z_THRESHOLD) & (robust >= ROBUST_Z_THRESHOLD)
+            drop = material & (z <= -ROLLING_Z_THRESHOLD) & (robust <= -ROBUST_Z_THRESHOLD)
+        flagged = {"spike": spike, "drop": drop, "both": spike | drop}[direction]
+
+        for row, col in zip(*np.nonzero(flagged)):
+            kind = "spike" if z[row, col] > 0 else "drop"
+            found.append({
+                "date": days[col].strftime("%Y-%m-%d"),
+                "campaign": labels[row],
+                "metric": metric,
+                "type": ANOMALY_LABELS[(metric, kind)],
+                "value": round(float(values[row, col]), 4),
+                "baseline": round(float(baseline[row, col]), 4),
+                "change_pct": round(float((values[row, col] - baseline[row, col]) / baseline[row, col] * 100), 1)
+                    if baseline[row, col] else None,
+                "z_score": round(float(z[row, col]), 2),
+                "robust_z": round(float(robust[row, col]), 2)
+            })
+
+    found.sort(key=lambda item: abs(item["z_score"]), reverse=True)
+    return found[:limit]
+
+def find_anomalies(breakdowns: BreakdownAccumulator) -> List[Dict[str, Any]]:
+    """
+    Anomalies for every campaign plus the account total, from the parser's
+    daily sums. Empty when the export has no parseable dates.
+    """
+    daily = breakdowns.daily_frame()
+    if daily is None or len(daily) <= ANOMALY_MIN_PERIODS:
+        return []
+
+    metrics = [col for col in ("spend", "impressions", "clicks", "conversions") if col in daily]
+    if not metrics:
+        return []
+    campaigns = breakdowns.campaign_daily() or {}
+
+    # Account total as the first row, then one row per campaign
+    labels = [ACCOUNT_LABEL]
+    if campaigns:
+        labels += [str(name) for name in campaigns[metrics[0]].index]
+    sums = {
+        metric: np.vstack([daily[metric].to_numpy(dtype="float64")[np.newaxis, :]] + (
+            [campaigns[metric].to_numpy(dtype="float64")] if campaigns else []
+        ))
+        for metric in metrics
+    }
+    return detect_anomalies(sums, labels, daily.index)
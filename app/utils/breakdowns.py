@@ -0,0 +1,196 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+from app.utils.schema_resolver import ColumnSchema
+
+# Additive metrics that can be summed per group; ratios are derived from these
+SUMMABLE_METRICS = ["impressions", "clicks", "spend", "conversions"]
+
+# Breakdown name -> schema dimension role used as the group key
+BREAKDOWN_DIMENSIONS = {
+    "campaign": "campaign",
+    "ad_set": "ad_set",
+    "day": "date",
+    "ad": "ad_name",
+}
+
+# Two-level breakdowns kept for local analysis only (not part of result()):
+# name -> (row dimension role, date dimension role)
+PANEL_DIMENSIONS = {
+    "campaign_day": ("campaign", "date"),
+}
+
+# Max groups kept per breakdown (ranked by spend); days are never truncated
+BREAKDOWN_LIMIT = 25
+
+def _ratio(numerator: pd.Series, denominator: pd.Series, scale: float = 1.0) -> pd.Series:
+    """Vectorized numerator/denominator * scale, NaN where the denominator is 0"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = numerator.to_numpy(dtype="float64") / denominator.to_numpy(dtype="float64") * scale
+    values[~np.isfinite(values)] = np.nan
+    return pd.Series(values, index=numerator.index)
+
+def derive_ratios(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add CTR (%), CPC, CPM and CPA columns computed from summed numerators and
+    denominators, so group ratios are weighted correctly instead of averaged.
+    """
+    frame = frame.copy()
+    if "clicks" in frame and "impressions" in frame:
+        frame["ctr"] = _ratio(frame["clicks"], frame["impressions"], 100.0)
+    if "spend" in frame and "clicks" in frame:
+        frame["cpc"] = _ratio(frame["spend"], frame["clicks"])
+    if "spend" in frame and "impressions" in frame:
+        frame["cpm"] = _ratio(frame["spend"], frame["impressions"], 1000.0)
+    if "spend" in frame and "conversions" in frame:
+        frame["cpa"] = _ratio(frame["spend"], frame["conversions"])
+    return frame
+
+def _records(frame: pd.DataFrame, key: str) -> List[Dict[str, Any]]:
+    """Compact JSON-safe rows: NaN -> None, floats rounded"""
+    labels = frame.index.strftime("%Y-%m-%d") if isinstance(frame.index, pd.DatetimeIndex) else frame.index
+    frame = frame.round(4).astype(object).where(frame.notna(), None)
+    frame.insert(0, key, [str(value) for value in labels])
+    return frame.to_dict("records")
+
+def _fold_panel(current: Optional[pd.DataFrame], partial: pd.DataFrame) -> pd.DataFrame:
+    if current is None:
+        return partial
+    return pd.concat([current, partial]).groupby(level=[0, 1], observed=True, sort=False).sum()
+
+class BreakdownAccumulator:
+    """
+    Per-campaign, per-ad-set and per-day sums built with groupby, foldable
+    across chunks: partial group sums are added together, then ratios are
+    derived once at the end.
+    """
+
+    def __init__(self, schema: ColumnSchema):
+        self.metric_columns = {
+            metric: schema.metrics[metric] for metric in SUMMABLE_METRICS if metric in schema.metrics
+        }
+        self.keys = {
+            name: schema.dimensions[role]
+            for name, role in BREAKDOWN_DIMENSIONS.items() if role in schema.dimensions
+        }
+        self.panel_keys = {
+            name: [schema.dimensions[role] for role in roles]
+            for name, roles in PANEL_DIMENSIONS.items() if all(role in schema.dimensions for role in roles)
+        }
+        self._sums: Dict[str, Optional[pd.DataFrame]] = {name: None for name in self.keys}
+        self._panels: Dict[str, Optional[pd.DataFrame]] = {name: None for name in self.panel_keys}
+        self._totals: Optional[pd.Series] = None
+
+    def update(self, df: pd.DataFrame):
+        # Only numeric metric columns can be summed; text-polluted ones are skipped
+        columns = {
+            metric: col for metric, col in self.metric_columns.items()
+            if pd.api.types.is_numeric_dtype(df[col])
+        }
+        if not columns or df.empty:
+            return
+
+        values = df[list(columns.values())].rename(columns={col: metric for metric, col in columns.items()})
+        totals = values.sum()
+        self._totals = totals if self._totals is None else self._totals.add(totals, fill_value=0)
+
+        for name, key_col in self.keys.items():
+            partial = values.groupby(df[key_col], observed=True, sort=False).sum()
+            if self._sums[name] is not None:
+                partial = pd.concat([self._sums[name], partial]).groupby(level=0, observed=True, sort=False).sum()
+            self._sums[name] = partial
+
+        for name, key_cols in self.panel_keys.items():
+            # Grouping by column names; a list of Series keys takes a much slower path
+            keyed = pd.concat([df[key_cols], values], axis=1)
+            partial = keyed.groupby(key_cols, observed=True, sort=False).sum()
+            self._panels[name] = _fold_panel(self._panels[name], partial)
+
+    def merge(self, other: "BreakdownAccumulator"):
+        """Fold in another accumulator, as if its chunks had been passed to update()"""
+        if other._totals is not None:
+            self._totals = other._totals if self._totals is None else self._totals.add(other._totals, fill_value=0)
+        for name, partial in other._sums.items():
+            if partial is None:
+                continue
+            if self._sums[name] is not None:
+                partial = pd.concat([self._sums[name], partial]).groupby(level=0, observed=True, sort=False).sum()
+            self._sums[name] = partial
+        for name, partial in other._panels.items():
+            if partial is not None:
+                self._panels[name] = _fold_panel(self._panels[name], partial)
+
+    def totals(self) -> Optional[pd.Series]:
+        """Summed metrics over every row seen so far"""
+        return self._totals
+
+    def sums(self, name: str) -> Optional[pd.DataFrame]:
+        """Summed metrics for every group of one breakdown (untruncated)"""
+        sums = self._sums.get(name)
+        return None if sums is None or sums.empty else sums
+
+    def daily_frame(self) -> Optional[pd.DataFrame]:
+        """
+        Summed metrics per calendar day with derived ratios, on a gap-free
+        daily index (days without rows are zero). None unless the date
+        column was parsed to datetimes.
+        """
+        sums = self._sums.get("day")
+        if sums is None or sums.empty or not isinstance(sums.index, pd.DatetimeIndex):
+            return None
+        sums = sums[sums.index.notna()].sort_index()
+        if sums.empty:
+            return None
+        days = pd.date_range(sums.index[0], sums.index[-1], freq="D")
+        return derive_ratios(sums.reindex(days, fill_value=0))
+
+    def campaign_daily(self) -> Optional[Dict[str, pd.DataFrame]]:
+        """
+        Summed metrics per campaign per day: one campaigns x days frame per
+        metric, on the same gap-free index as daily_frame(). Cells are NaN
+        where a campaign had no rows that day. None unless both campaign and
+        parsed date columns exist.
+        """
+        panel = self._panels.get("campaign_day")
+        daily = self.daily_frame()
+        if panel is None or panel.empty or daily is None:
+            return None
+        days = panel.index.get_level_values(1)
+        if not pd.api.types.is_datetime64_any_dtype(days):
+            return None
+        wide = panel[days.notna()].unstack(level=1)
+        return {metric: wide[metric].reindex(columns=daily.index) for metric in panel.columns}
+
+    def daily_series(self) -> Dict[str, Any]:
+        """JSON-safe daily time series for trend and anomaly computation"""
+        frame = self.daily_frame()
+        if frame is None:
+            return {}
+        return {
+            "start": frame.index[0].strftime("%Y-%m-%d"),
+            "end": frame.index[-1].strftime("%Y-%m-%d"),
+            "days": len(frame),
+            "rows": _records(frame, "date")
+        }
+
+    def result(self, limit: int = BREAKDOWN_LIMIT) -> Dict[str, Any]:
+        breakdowns = {}
+        if self._totals is not None:
+            overall = derive_ratios(self._totals.to_frame().T)
+            breakdowns["overall"] = _records(overall, "scope")[0]
+            breakdowns["overall"]["scope"] = "all"
+        for name, sums in self._sums.items():
+            if sums is None or sums.empty:
+                continue
+            frame = derive_ratios(sums)
+            if name == "day":
+                frame = frame.sort_index()
+                rows = frame
+            else:
+                order = "spend" if "spend" in frame else frame.columns[0]
+                rows = frame.sort_values(order, ascending=False).head(limit)
+            breakdowns[name] = {
+                "groups": len(frame),
+                "rows": _records(rows, name)
+            }
+        return breakdowns
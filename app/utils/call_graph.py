@@ -0,0 +1,52 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Sequence, Tuple
+
+# Node name -> (names of the nodes it depends on, async function called with their results)
+CallGraph = Dict[str, Tuple[Sequence[str], Callable[..., Awaitable[Any]]]]
+
+def _check_graph(graph: CallGraph):
+    """Reject unknown dependencies and cycles, which would otherwise deadlock"""
+    for name, (deps, _) in graph.items():
+        missing = [dep for dep in deps if dep not in graph]
+        if missing:
+            raise ValueError(f"Call graph node '{name}' depends on unknown nodes {missing}")
+
+    remaining = {name: set(deps) for name, (deps, _) in graph.items()}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Call graph has a cycle through {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+async def run_call_graph(graph: CallGraph) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """
+    Run async calls concurrently, each as soon as its dependencies have finished
+    Args:
+        graph: Node name -> (dependency names, coroutine function). The function
+            is called with the dependencies' results, in the order listed.
+    Returns:
+        (results, seconds) keyed by node name. A node that raised has its
+        exception as result, and so does every node depending on it.
+    """
+    _check_graph(graph)
+    tasks: Dict[str, asyncio.Future] = {}
+    seconds: Dict[str, float] = {}
+
+    async def run(name: str):
+        deps, call = graph[name]
+        inputs = [await tasks[dep] for dep in deps]
+        start = time.perf_counter()
+        try:
+            return await call(*inputs)
+        finally:
+            seconds[name] = round(time.perf_counter() - start, 3)
+
+    # Every task exists before any starts running, so dependents can await them
+    for name in graph:
+        tasks[name] = asyncio.ensure_future(run(name))
+    outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    return dict(zip(tasks, outcomes)), seconds
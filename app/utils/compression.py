@@ -0,0 +1,75 @@
+import zipfile
+import zlib
+from typing import List, Optional
+
+# Upload extension -> compression name (pandas naming); None means plain CSV
+SUPPORTED_EXTENSIONS = {
+    ".csv": None,
+    ".csv.gz": "gzip",
+    ".csv.zst": "zstd",
+    ".zip": "zip",
+}
+
+# Cap on bytes produced per decompress call so one compressed chunk can't balloon
+DECOMPRESS_OUTPUT_LIMIT = 4 * 1024 * 1024
+
+def is_supported_upload(filename: str) -> bool:
+    return any(filename.lower().endswith(ext) for ext in SUPPORTED_EXTENSIONS)
+
+def compression_for(filename: str) -> Optional[str]:
+    """Compression implied by a filename, or None for plain CSV"""
+    lowered = filename.lower()
+    for ext, compression in SUPPORTED_EXTENSIONS.items():
+        if compression and lowered.endswith(ext):
+            return compression
+    return None
+
+def strip_extension(filename: str) -> str:
+    """Filename without its supported CSV/archive extension"""
+    lowered = filename.lower()
+    for ext in sorted(SUPPORTED_EXTENSIONS, key=len, reverse=True):
+        if lowered.endswith(ext):
+            return filename[:-len(ext)]
+    return filename
+
+class StreamDecompressor:
+    """
+    Incremental decompressor for gzip and zstd streams. Each call to
+    decompress() yields output pieces of at most DECOMPRESS_OUTPUT_LIMIT bytes.
+    """
+
+    def __init__(self, compression: str):
+        self.compression = compression
+        if compression == "gzip":
+            self._zlib = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        elif compression == "zstd":
+            import zstandard
+            self._zstd = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            raise ValueError(f"Streaming decompression not supported for {compression}")
+
+    def decompress(self, data: bytes):
+        if self.compression == "gzip":
+            while data:
+                output = self._zlib.decompress(data, DECOMPRESS_OUTPUT_LIMIT)
+                if output:
+                    yield output
+                data = self._zlib.unconsumed_tail
+                if self._zlib.eof and self._zlib.unused_data:
+                    # Concatenated gzip members (e.g. from parallel gzip tools)
+                    data = self._zlib.unused_data
+                    self._zlib = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        else:
+            output = self._zstd.decompress(data)
+            for start in range(0, len(output), DECOMPRESS_OUTPUT_LIMIT):
+                yield output[start:start + DECOMPRESS_OUTPUT_LIMIT]
+
+def zip_csv_members(path: str) -> List[str]:
+    """CSV members of a ZIP archive in archive order, skipping macOS metadata"""
+    with zipfile.ZipFile(path) as archive:
+        return [
+            info.filename for info in archive.infolist()
+            if not info.is_dir()
+            and info.filename.lower().endswith(".csv")
+            and not info.filename.startswith("__MACOSX/")
+        ]
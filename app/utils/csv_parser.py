@@ -1,100 +1,612 @@
 import pandas as pd
-from typing import Dict, Any, List
+import zipfile
+from typing import Dict, Any, List, Optional
 from io import StringIO
+from app.utils.compression import compression_for, zip_csv_members
+from app.utils.snapshot import SnapshotWriter
+from app.utils.schema_resolver import ColumnSchema, resolve_schema
+from app.utils.breakdowns import BreakdownAccumulator
+from app.utils.dates import DateParser, DATE_SAMPLE_ROWS
+from app.utils.analytics import compute_analytics
+from app.utils.anomalies import find_anomalies
+from app.utils.row_sampling import RowSampler, build_row_section
+from app.utils.tokens import count_tokens
+from config import settings
 
-def parse_meta_ads_csv(file_path_or_content: str, from_string: bool = False) -> Dict[str, Any]:
+TOP_ADS_LIMIT = 5
+
+# Rows per chunk for ZIP archives, which are always streamed
+ZIP_CHUNK_SIZE = 100000
+
+# (breakdown key, prompt heading, max rows in the prompt)
+BREAKDOWN_SECTIONS = [
+    ("campaign", "By Campaign (top by spend)", 10),
+    ("ad_set", "By Ad Set (top by spend)", 10),
+    ("day", "By Day (most recent)", 31),
+]
+
+def _read_header(source) -> List[str]:
+    """Read just the header row, rewinding file-like sources afterwards"""
+    columns = list(pd.read_csv(source, nrows=0).columns)
+    _rewind(source)
+    return columns
+
+def _date_parser(source, schema: ColumnSchema) -> DateParser:
+    """Pick date formats for the whole file from its first rows"""
+    columns = [col for col in (schema.date_column, schema.date_end_column) if col]
+    if not columns:
+        return DateParser(schema, {})
+    try:
+        sample = pd.read_csv(source, usecols=columns, dtype=str, nrows=DATE_SAMPLE_ROWS)
+    finally:
+        _rewind(source)
+    return DateParser.from_sample(schema, sample)
+
+def _rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+def _read_csv_kwargs(schema: ColumnSchema, typed: bool = True, engine: Optional[str] = None) -> Dict[str, Any]:
+    """
+    pd.read_csv options that load only the columns the schema resolved.
+    typed=True also pins metric columns to float64 and text dimensions to
+    categoricals; typed=False leaves metric dtypes to pandas inference.
+    """
+    kwargs = {"engine": engine} if engine else {}
+    if not schema.usecols:
+        return kwargs
+    kwargs["usecols"] = schema.usecols
+    kwargs["dtype"] = schema.dtypes if typed else schema.text_dtypes
+    return kwargs
+
+def parse_meta_ads_csv(
+    file_path_or_content: str,
+    from_string: bool = False,
+    chunksize: Optional[int] = None,
+    snapshot_id: Optional[int] = None,
+    engine: Optional[str] = None,
+    workers: Optional[int] = None
+) -> Dict[str, Any]:
     """
     Parse Meta Ads CSV and extract relevant metrics
     Args:
         file_path_or_content: Either a file path or CSV content string
         from_string: If True, treat first argument as CSV content string
+        chunksize: If set, stream the CSV in chunks of this many rows so peak
+            memory stays bounded. The summary matches the in-memory path up
+            to float rounding (metrics are summed chunk by chunk).
+        snapshot_id: If set, also write the parsed rows to a columnar snapshot
+            keyed by this analysis id and return its handle under "snapshot"
+        engine: pd.read_csv engine for the in-memory path ("c" or "pyarrow");
+            defaults to settings.CSV_ENGINE
+        workers: With chunksize and a file path, aggregate byte ranges of the
+            file in this many processes (see app/utils/parallel_parser.py).
+            The result matches the serial chunked path up to float rounding
+            (~1e-9 relative on summed metrics).
     """
+    source = StringIO(file_path_or_content) if from_string else file_path_or_content
+    engine = engine or settings.CSV_ENGINE or None
+    compression = None if from_string else compression_for(str(source))
+
+    if compression == "zip":
+        return _parse_zip_archive(source, chunksize or ZIP_CHUNK_SIZE, snapshot_id)
+
     try:
-        # Read CSV from file path or string content
-        if from_string:
-            df = pd.read_csv(StringIO(file_path_or_content))
-        else:
-            df = pd.read_csv(file_path_or_content)
+        # Resolve the header once; the mapping decides which columns are read.
+        # .csv.gz / .csv.zst paths are decompressed on the fly by pandas.
+        schema = resolve_schema(_read_header(source))
+        dates = _date_parser(source, schema)
+    except Exception as e:
+        raise ValueError(f"Error parsing CSV: {str(e)}")
+
+    def parse(typed: bool) -> Dict[str, Any]:
+        if chunksize:
+            # The pyarrow engine cannot stream, so chunked reads always use the C engine
+            read_kwargs = _read_csv_kwargs(schema, typed)
+            # Byte-range splitting only works on uncompressed files
+            if workers and workers > 1 and isinstance(source, str) and compression is None:
+                try:
+                    from app.utils.parallel_parser import parse_ranges_in_parallel
+                    return parse_ranges_in_parallel(source, schema, chunksize, read_kwargs, workers, snapshot_id, dates)
+                except Exception as e:
+                    # e.g. a worker process died or could not be started
+                    print(f"Warning: Parallel CSV parse failed ({e}), falling back to serial")
+            if isinstance(source, str) and compression is None:
+                # Read the file through mmap instead of buffered copies
+                read_kwargs = dict(read_kwargs, memory_map=True)
+            return _parse_meta_ads_csv_chunked([source], schema, chunksize, read_kwargs, snapshot_id, dates)
+        # The untyped retry sticks to the default engine, which is the most lenient
+        read_kwargs = _read_csv_kwargs(schema, typed, engine if typed else None)
+        return _parse_meta_ads_frame(source, schema, read_kwargs, snapshot_id, dates)
 
-        # Common Meta Ads columns (adjust based on actual CSV format)
-        # This is a flexible parser that handles various Meta Ads export formats
+    try:
+        return parse(typed=True)
+    except ValueError as e:
+        if not schema.metrics:
+            raise
+        # A metric column holds non-numeric text; re-read with inferred dtypes
+        # so only that metric is dropped, as in the untyped parser
+        print(f"Warning: Typed CSV read failed ({e}), retrying with inferred dtypes")
+        _rewind(source)
+        return parse(typed=False)
+
+def _zip_member_sources(archive: zipfile.ZipFile, members: List[str], schema: ColumnSchema):
+    """Open archive members one at a time, skipping any whose header differs from the first"""
+    for name in members:
+        with archive.open(name) as member:
+            if _read_header(member) != schema.columns:
+                print(f"Warning: Skipping {name} in archive, its columns differ from the first CSV")
+                continue
+            yield member
+
+def _parse_zip_archive(path: str, chunksize: int, snapshot_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Parse every CSV in a ZIP archive as one export. Members are decompressed
+    as streams and fed chunk by chunk into a single set of aggregates.
+    """
+    try:
+        members = zip_csv_members(path)
+        if not members:
+            raise ValueError("No CSV files found in archive")
+        with zipfile.ZipFile(path) as archive:
+            with archive.open(members[0]) as first:
+                schema = resolve_schema(_read_header(first))
+                dates = _date_parser(first, schema)
+    except Exception as e:
+        raise ValueError(f"Error parsing CSV: {str(e)}")
+
+    def parse(typed: bool) -> Dict[str, Any]:
+        with zipfile.ZipFile(path) as archive:
+            sources = _zip_member_sources(archive, members, schema)
+            return _parse_meta_ads_csv_chunked(sources, schema, chunksize, _read_csv_kwargs(schema, typed), snapshot_id, dates)
+
+    try:
+        return parse(typed=True)
+    except ValueError as e:
+        if not schema.metrics:
+            raise
+        print(f"Warning: Typed CSV read failed ({e}), retrying with inferred dtypes")
+        return parse(typed=False)
+
+def _parse_meta_ads_frame(
+    source,
+    schema: ColumnSchema,
+    read_kwargs: Dict[str, Any],
+    snapshot_id: Optional[int] = None,
+    dates: Optional[DateParser] = None
+) -> Dict[str, Any]:
+    """In-memory path: load the pruned frame once and aggregate it"""
+    try:
+        # Read CSV from file path or string content
+        raw = pd.read_csv(source, **read_kwargs)
+        dates = dates or DateParser(schema)
+        df = dates.apply(raw)
 
         # Calculate summary metrics
         summary = {
             "total_rows": len(df),
-            "columns": list(df.columns),
+            "columns": schema.columns,
             "date_range": {},
             "metrics": {}
         }
 
-        # Try to find common columns with flexible matching
-        column_mappings = {
-            "impressions": ["impressions", "Impressions", "Reach"],
-            "clicks": ["clicks", "Clicks", "Link Clicks"],
-            "spend": ["spend", "Spend", "Amount Spent", "amount_spent"],
-            "conversions": ["conversions", "Conversions", "Results"],
-            "ctr": ["ctr", "CTR", "Link Click-Through Rate"],
-            "cpc": ["cpc", "CPC", "Cost per Link Click"],
-            "date": ["date", "Date", "Reporting Starts", "reporting_starts"]
-        }
+        # Extract metrics for every resolved column
+        for metric, col in schema.metrics.items():
+            try:
+                summary["metrics"][metric] = {
+                    "total": float(df[col].sum()),
+                    "average": float(df[col].mean()),
+                    "max": float(df[col].max()),
+                    "min": float(df[col].min())
+                }
+            except:
+                pass
 
-        # Extract metrics if columns exist
-        for metric, possible_cols in column_mappings.items():
-            for col in possible_cols:
-                if col in df.columns:
-                    if metric == "date":
-                        try:
-                            summary["date_range"] = {
-                                "start": str(df[col].min()),
-                                "end": str(df[col].max())
-                            }
-                        except:
-                            pass
-                    else:
-                        try:
-                            summary["metrics"][metric] = {
-                                "total": float(df[col].sum()),
-                                "average": float(df[col].mean()),
-                                "max": float(df[col].max()),
-                                "min": float(df[col].min())
-                            }
-                        except:
-                            pass
-                    break
+        if schema.date_column:
+            date_range = _RangeAccumulator()
+            date_range.update(df[dates.start_column], df[dates.end_column])
+            if date_range.result() is not None:
+                summary["date_range"] = date_range.result()
 
         # Get top performing ads (if ad name column exists)
-        ad_name_cols = ["ad_name", "Ad Name", "Ad name", "Campaign Name", "campaign_name"]
-        ad_name_col = None
-        for col in ad_name_cols:
-            if col in df.columns:
-                ad_name_col = col
-                break
-
-        if ad_name_col:
-            # Find a numeric column to sort by
-            sort_col = None
-            for possible_sort in ["impressions", "Impressions", "spend", "Spend", "clicks", "Clicks"]:
-                if possible_sort in df.columns:
-                    sort_col = possible_sort
-                    break
-
-            if sort_col:
-                try:
-                    summary["top_ads"] = df.nlargest(5, sort_col)[ad_name_col].tolist()
-                except:
-                    summary["top_ads"] = df[ad_name_col].head(5).tolist()
+        ad_name_col = schema.ad_name_column
+        sort_col = schema.sort_column
+
+        if ad_name_col and sort_col:
+            try:
+                summary["top_ads"] = df.nlargest(TOP_ADS_LIMIT, sort_col)[ad_name_col].tolist()
+            except:
+                summary["top_ads"] = df[ad_name_col].head(TOP_ADS_LIMIT).tolist()
 
-        # Convert DataFrame to dict for detailed data
-        summary["detailed_data"] = df.to_dict('records')
+        # Per-campaign, per-ad-set and per-day aggregates
+        breakdowns = BreakdownAccumulator(schema)
+        breakdowns.update(df)
+        summary["breakdowns"] = breakdowns.result()
+        summary["time_series"] = breakdowns.daily_series()
+        summary["analytics"] = compute_analytics(breakdowns, summary["date_range"])
+        summary["anomalies"] = find_anomalies(breakdowns)
+
+        # Representative rows for the prompt
+        rows = RowSampler(schema)
+        rows.update(df)
+        summary["row_sample"] = rows.result()
+
+        # Row-level data goes to a columnar snapshot instead of the summary
+        if snapshot_id is not None:
+            summary["snapshot"] = _write_snapshot(snapshot_id, [raw])
 
         return summary
 
     except Exception as e:
         raise ValueError(f"Error parsing CSV: {str(e)}")
 
-def format_metrics_for_ai(parsed_data: Dict[str, Any]) -> str:
+class _MetricAccumulator:
+    """Running total/count/min/max for one numeric column across chunks"""
+
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+        self.max = None
+        self.min = None
+        self.failed = False
+
+    def update(self, series: pd.Series):
+        if self.failed or series.empty:
+            return
+        if not pd.api.types.is_numeric_dtype(series):
+            # Mirrors the in-memory path, where sum()/mean() on text columns fails
+            self.failed = True
+            return
+        self.total += series.sum()
+        self.count += int(series.count())
+        if self.count == 0:
+            return
+        chunk_max, chunk_min = series.max(), series.min()
+        if not pd.isna(chunk_max):
+            self.max = chunk_max if self.max is None else max(self.max, chunk_max)
+            self.min = chunk_min if self.min is None else min(self.min, chunk_min)
+
+    def merge(self, other: "_MetricAccumulator"):
+        """Fold in another accumulator, as if its chunks had been passed to update()"""
+        if self.failed:
+            return
+        if other.failed:
+            self.failed = True
+            return
+        self.total += other.total
+        self.count += other.count
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+            self.min = other.min if self.min is None else min(self.min, other.min)
+
+    def result(self) -> Optional[Dict[str, float]]:
+        if self.failed:
+            return None
+        nan = float("nan")
+        return {
+            "total": float(self.total),
+            "average": float(self.total) / self.count if self.count else nan,
+            "max": float(self.max) if self.max is not None else nan,
+            "min": float(self.min) if self.min is not None else nan
+        }
+
+class _RangeAccumulator:
+    """
+    Running earliest start / latest end across chunks. Parsed dates give a
+    true chronological range; columns left as raw strings fall back to
+    lexical min/max.
+    """
+
+    def __init__(self):
+        self.start = None
+        self.end = None
+        self.failed = False
+
+    def update(self, starts: pd.Series, ends: Optional[pd.Series] = None):
+        if self.failed:
+            return
+        try:
+            ends = starts if ends is None else ends
+            chunk_start, chunk_end = starts.min(), ends.max()
+            if pd.isna(chunk_start) or pd.isna(chunk_end):
+                return
+            self.start = chunk_start if self.start is None else min(self.start, chunk_start)
+            self.end = chunk_end if self.end is None else max(self.end, chunk_end)
+        except Exception:
+            self.failed = True
+
+    def merge(self, other: "_RangeAccumulator"):
+        """Fold in another accumulator, as if its chunks had been passed to update()"""
+        if self.failed:
+            return
+        if other.failed:
+            self.failed = True
+            return
+        if other.start is None:
+            return
+        try:
+            self.start = other.start if self.start is None else min(self.start, other.start)
+            self.end = other.end if self.end is None else max(self.end, other.end)
+        except Exception:
+            self.failed = True
+
+    def result(self) -> Optional[Dict[str, str]]:
+        if self.failed:
+            return None
+        if self.start is None:
+            return {"start": str(float("nan")), "end": str(float("nan"))}
+        return {"start": _format_date(self.start), "end": _format_date(self.end)}
+
+def _format_date(value) -> str:
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d")
+    return str(value)
+
+def _write_snapshot(snapshot_id: int, frames) -> Optional[Dict[str, Any]]:
+    """Write frames to a snapshot; failures are logged and yield no handle"""
+    writer = SnapshotWriter(snapshot_id)
+    try:
+        for frame in frames:
+            writer.write(frame)
+        return writer.close()
+    except Exception as e:
+        print(f"Warning: Failed to write snapshot for analysis {snapshot_id}: {e}")
+        writer.abort()
+        return None
+
+class _TopAdsAccumulator:
+    """Running top-N ads by the sort column, with a head-of-file fallback"""
+
+    def __init__(self, ad_name_col: str, sort_col: str):
+        self.ad_name_col = ad_name_col
+        self.sort_col = sort_col
+        self.top_rows = None
+        self.fallback_ads = []
+        self.sort_failed = False
+
+    def _add_fallback(self, names: List[Any]):
+        if len(self.fallback_ads) < TOP_ADS_LIMIT:
+            self.fallback_ads.extend(names[:TOP_ADS_LIMIT - len(self.fallback_ads)])
+
+    def _add_candidates(self, candidates: pd.DataFrame):
+        # Carried-over rows come first so nlargest keeps the
+        # same first-occurrence tie-breaking as a single pass
+        if self.top_rows is not None:
+            candidates = pd.concat([self.top_rows, candidates]).nlargest(TOP_ADS_LIMIT, self.sort_col)
+        self.top_rows = candidates
+
+    def update(self, chunk: pd.DataFrame):
+        self._add_fallback(chunk[self.ad_name_col].head(TOP_ADS_LIMIT).tolist())
+        if self.sort_failed:
+            return
+        try:
+            self._add_candidates(chunk[[self.sort_col, self.ad_name_col]].nlargest(TOP_ADS_LIMIT, self.sort_col))
+        except Exception:
+            self.sort_failed = True
+
+    def merge(self, other: "_TopAdsAccumulator"):
+        """Fold in another accumulator, as if its chunks had been passed to update()"""
+        self._add_fallback(other.fallback_ads)
+        if self.sort_failed:
+            return
+        if other.sort_failed:
+            self.sort_failed = True
+            return
+        if other.top_rows is None:
+            return
+        try:
+            self._add_candidates(other.top_rows)
+        except Exception:
+            self.sort_failed = True
+
+    def result(self) -> List[Any]:
+        if self.sort_failed or self.top_rows is None:
+            return self.fallback_ads
+        return self.top_rows[self.ad_name_col].tolist()
+
+class ChunkAggregator:
+    """
+    Online aggregates for the streaming parser. update() folds in one chunk;
+    merge() folds in another aggregator built from the chunks that follow,
+    giving the same result as updating with those chunks directly (up to
+    float rounding, since partial sums are grouped differently), so byte
+    ranges aggregated in separate processes can be combined in order.
+    """
+
+    def __init__(self, schema: ColumnSchema, dates: Optional[DateParser] = None):
+        self.schema = schema
+        self.dates = dates or DateParser(schema)
+        self.total_rows = 0
+        self.metrics = {metric: _MetricAccumulator() for metric in schema.metrics}
+        self.date_range = _RangeAccumulator() if schema.date_column else None
+        self.top_ads = None
+        if schema.ad_name_column and schema.sort_column:
+            self.top_ads = _TopAdsAccumulator(schema.ad_name_column, schema.sort_column)
+        self.breakdowns = BreakdownAccumulator(schema)
+        self.rows = RowSampler(schema)
+
+    def update(self, chunk: pd.DataFrame):
+        chunk = self.dates.apply(chunk)
+        self.total_rows += len(chunk)
+        for metric, accumulator in self.metrics.items():
+            accumulator.update(chunk[self.schema.metrics[metric]])
+        if self.date_range is not None:
+            self.date_range.update(chunk[self.dates.start_column], chunk[self.dates.end_column])
+        if self.top_ads is not None:
+            self.top_ads.update(chunk)
+        self.breakdowns.update(chunk)
+        self.rows.update(chunk)
+
+    def merge(self, other: "ChunkAggregator"):
+        self.total_rows += other.total_rows
+        for metric, accumulator in self.metrics.items():
+            accumulator.merge(other.metrics[metric])
+        if self.date_range is not None:
+            self.date_range.merge(other.date_range)
+        if self.top_ads is not None:
+            self.top_ads.merge(other.top_ads)
+        self.breakdowns.merge(other.breakdowns)
+        self.rows.merge(other.rows)
+
+    def summary(self) -> Dict[str, Any]:
+        summary = {
+            "total_rows": self.total_rows,
+            "columns": self.schema.columns,
+            "date_range": {},
+            "metrics": {}
+        }
+
+        for metric, accumulator in self.metrics.items():
+            result = accumulator.result()
+            if result is not None:
+                summary["metrics"][metric] = result
+
+        if self.date_range is not None and self.date_range.result() is not None:
+            summary["date_range"] = self.date_range.result()
+
+        if self.top_ads is not None:
+            summary["top_ads"] = self.top_ads.result()
+
+        summary["breakdowns"] = self.breakdowns.result()
+        summary["time_series"] = self.breakdowns.daily_series()
+        summary["analytics"] = compute_analytics(self.breakdowns, summary["date_range"])
+        summary["anomalies"] = find_anomalies(self.breakdowns)
+        summary["row_sample"] = self.rows.result()
+        return summary
+
+def _parse_meta_ads_csv_chunked(
+    sources,
+    schema: ColumnSchema,
+    chunksize: int,
+    read_kwargs: Dict[str, Any],
+    snapshot_id: Optional[int] = None,
+    dates: Optional[DateParser] = None
+) -> Dict[str, Any]:
+    """
+    Streaming variant of parse_meta_ads_csv. Reads each source (usually one;
+    several for multi-CSV archives sharing a header) chunk by chunk and folds
+    each chunk into online aggregates, so only one chunk plus the running
+    top-N rows are ever held in memory.
+    """
+    snapshot = SnapshotWriter(snapshot_id) if snapshot_id is not None else None
+
+    try:
+        aggregator = ChunkAggregator(schema, dates)
+
+        for source in sources:
+            for chunk in pd.read_csv(source, chunksize=chunksize, **read_kwargs):
+                if snapshot is not None:
+                    try:
+                        snapshot.write(chunk)
+                    except Exception as e:
+                        print(f"Warning: Failed to write snapshot for analysis {snapshot_id}: {e}")
+                        snapshot.abort()
+                        snapshot = None
+
+                aggregator.update(chunk)
+
+        summary = aggregator.summary()
+
+        if snapshot is not None:
+            summary["snapshot"] = snapshot.close()
+
+        return summary
+
+    except Exception as e:
+        if snapshot is not None:
+            snapshot.abort()
+        raise ValueError(f"Error parsing CSV: {str(e)}")
+
+def _format_breakdown_row(row: Dict[str, Any]) -> str:
+    """One compact line of summed metrics and derived ratios"""
+    formats = [
+        ("spend", "Spend {:,.2f}"),
+        ("impressions", "Impr {:,.0f}"),
+        ("clicks", "Clicks {:,.0f}"),
+        ("conversions", "Conv {:,.0f}"),
+        ("ctr", "CTR {:.2f}%"),
+        ("cpc", "CPC {:,.2f}"),
+        ("cpm", "CPM {:,.2f}"),
+        ("cpa", "CPA {:,.2f}"),
+    ]
+    return " | ".join(fmt.format(row[key]) for key, fmt in formats if row.get(key) is not None)
+
+def _format_change(changes: Dict[str, Any]) -> str:
+    labels = [("spend", "Spend"), ("conversions", "Conv"), ("ctr", "CTR"), ("cpc", "CPC"), ("cpa", "CPA")]
+    return " | ".join(
+        f"{label} {changes[key]:+.1f}%" for key, label in labels if changes.get(key) is not None
+    )
+
+def _format_analytics(analytics: Dict[str, Any]) -> str:
+    """Compact prompt lines for the locally computed analytics"""
+    text = ""
+
+    trends = analytics.get('trends', {})
+    if trends.get('week_over_week') and _format_change(trends['week_over_week']):
+        text += f"\n**Week over Week** (latest 7 days vs the 7 before): {_format_change(trends['week_over_week'])}\n"
+    # Weeks with no activity add nothing for sparse exports
+    weeks = [
+        row for row in trends.get('weeks', [])
+        if any(row.get(key) for key in ('impressions', 'clicks', 'spend', 'conversions'))
+    ]
+    if weeks:
+        text += f"\n**Weekly Trend** (latest first):\n"
+        for row in weeks:
+            text += f"- Week of {row['week_start']}: {_format_breakdown_row(row)}\n"
+
+    ads = analytics.get('ads', {})
+    if ads.get('best'):
+        metric = ads['metric'].upper()
+        text += f"\n**Most Efficient Ads** (by {metric}, {ads['eligible_ads']} ads compared):\n"
+        for row in ads['best']:
+            text += f"- {row['ad']}: {_format_breakdown_row(row)}\n"
+        text += f"\n**Least Efficient Ads** (by {metric}):\n"
+        for row in ads['worst']:
+            text += f"- {row['ad']}: {_format_breakdown_row(row)}\n"
+
+    concentration = analytics.get('spend_concentration', {})
+    if concentration:
+        text += "\n**Spend Concentration:**\n"
+        for name, values in concentration.items():
+            text += (
+                f"- {name.replace('_', ' ').title()}s: top 1 takes {values['top_1_share']}% and top 5 take "
+                f"{values['top_5_share']}% of spend; {values['count_for_80_percent']} of {values['count']} "
+                f"account for 80% (Gini {values['gini']})\n"
+            )
+
+    outliers = analytics.get('outliers', [])
+    if outliers:
+        text += "\n**Statistical Outliers** (robust z-score vs the typical ad):\n"
+        for row in outliers:
+            text += (
+                f"- {row['ad']}: {row['metric'].upper()} {row['value']} vs median {row['median']} "
+                f"(z {row['z_score']:+.1f}, spend {row['spend']:,.2f})\n"
+            )
+
+    return text
+
+ANOMALY_METRIC_LABELS = {"spend": "Spend", "cpc": "CPC", "ctr": "CTR (%)", "cpa": "CPA"}
+
+def _format_anomalies(anomalies: List[Dict[str, Any]]) -> str:
+    """One line per flagged day, strongest first"""
+    if not anomalies:
+        return ""
+    text = "\n**Anomalies** (days breaking from the trailing week and the usual level):\n"
+    for item in anomalies:
+        change = f", {item['change_pct']:+.0f}%" if item.get('change_pct') is not None else ""
+        text += (
+            f"- {item['date']} {item['campaign']}: {item['type']}, {ANOMALY_METRIC_LABELS.get(item['metric'], item['metric'])} "
+            f"{item['value']:,.4g} vs {item['baseline']:,.4g} baseline{change} (z {item['z_score']:+.1f})\n"
+        )
+    return text
+
+def format_metrics_for_ai(parsed_data: Dict[str, Any], token_budget: Optional[int] = None) -> str:
     """
     Format parsed CSV data into a prompt for AI analysis
+    Args:
+        parsed_data: parse_meta_ads_csv output
+        token_budget: Max prompt tokens (defaults to PROMPT_TOKEN_BUDGET); sampled
+            rows are added until the aggregates plus rows reach it
     """
     prompt = f"""
 Analyze the following Meta Ads campaign data:
@@ -106,14 +618,51 @@ Analyze the following Meta Ads campaign data:
 **Performance Metrics:**
 """
 
-    for metric, values in parsed_data.get('metrics', {}).items():
-        prompt += f"\n{metric.upper()}:\n"
-        prompt += f"  - Total: {values['total']:,.2f}\n"
-        prompt += f"  - Average: {values['average']:,.2f}\n"
-        prompt += f"  - Max: {values['max']:,.2f}\n"
-        prompt += f"  - Min: {values['min']:,.2f}\n"
+    analytics = parsed_data.get('analytics') or {}
+    report = analytics.get('performance_report')
+    if report:
+        for key, value in report.items():
+            if key == 'date_range':
+                continue
+            if isinstance(value, float):
+                value = f"{value:,.0f}" if value.is_integer() else f"{value:,.2f}" if abs(value) >= 100 else f"{value:.4g}"
+            prompt += f"- {key.replace('_', ' ').title()}: {value}\n"
+    else:
+        # Exports without summable metrics: fall back to per-column stats
+        for metric, values in parsed_data.get('metrics', {}).items():
+            prompt += f"\n{metric.upper()}:\n"
+            prompt += f"  - Total: {values['total']:,.2f}\n"
+            prompt += f"  - Average: {values['average']:,.2f}\n"
+            prompt += f"  - Max: {values['max']:,.2f}\n"
+            prompt += f"  - Min: {values['min']:,.2f}\n"
 
     if 'top_ads' in parsed_data:
         prompt += f"\n**Top Performing Ads:** {', '.join(parsed_data['top_ads'][:5])}\n"
 
+    breakdowns = parsed_data.get('breakdowns', {})
+    if 'overall' in breakdowns and not report:
+        prompt += f"\n**Blended Efficiency:** {_format_breakdown_row(breakdowns['overall'])}\n"
+
+    prompt += _format_analytics(analytics)
+    prompt += _format_anomalies(parsed_data.get('anomalies', []))
+    trends = analytics.get('trends', {})
+
+    for name, title, limit in BREAKDOWN_SECTIONS:
+        if name not in breakdowns:
+            continue
+        if name == 'day' and trends.get('weeks'):
+            # The weekly trend already covers the time dimension in far fewer lines
+            continue
+        section = breakdowns[name]
+        rows = section['rows'][-limit:] if name == 'day' else section['rows'][:limit]
+        prompt += f"\n**{title}** ({len(rows)} of {section['groups']}):\n"
+        for row in rows:
+            prompt += f"- {row[name]}: {_format_breakdown_row(row)}\n"
+
+    budget = token_budget if token_budget is not None else settings.PROMPT_TOKEN_BUDGET
+    remaining = budget - count_tokens(prompt)
+    if remaining <= 0:
+        print(f"Warning: Aggregates alone use the {budget}-token prompt budget; no rows sampled")
+    prompt += build_row_section(parsed_data.get('row_sample'), remaining)
+
     return prompt
@@ -0,0 +1,129 @@
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+from app.utils.schema_resolver import ColumnSchema
+
+# Candidate formats in priority order. Month-first comes before day-first,
+# matching Meta's default US locale when every day in the file is <= 12.
+DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y/%m/%d",
+    "%m/%d/%Y",
+    "%d/%m/%Y",
+    "%m/%d/%y",
+    "%d/%m/%y",
+    "%d.%m.%Y",
+    "%m-%d-%Y",
+    "%d-%m-%Y",
+    "%Y%m%d",
+    "%b %d, %Y",
+    "%d %b %Y",
+    "%B %d, %Y",
+    "%d %B %Y",
+]
+
+# Rows read up front to pick a format for the whole file
+DATE_SAMPLE_ROWS = 1000
+# Distinct values tried against each candidate format
+DATE_SAMPLE_UNIQUES = 200
+FORMAT_CACHE_SIZE = 256
+
+# (header signature, column) -> last format that parsed that column
+_FORMAT_CACHE: Dict[Tuple[str, str], str] = {}
+
+def _parses_all(values: pd.Series, fmt: str) -> bool:
+    return bool(pd.to_datetime(values, format=fmt, errors="coerce").notna().all())
+
+def infer_date_format(values: pd.Series, hint: Optional[str] = None) -> Optional[str]:
+    """
+    First candidate format that parses every distinct non-empty value
+    Args:
+        values: Raw date strings
+        hint: Format to try first (e.g. from the cache)
+    Returns:
+        strftime-style format, or None if no candidate fits
+    """
+    sample = pd.Series(values.dropna().unique()[:DATE_SAMPLE_UNIQUES]).astype(str).str.strip()
+    sample = sample[sample != ""]
+    if sample.empty:
+        return None
+    if hint and _parses_all(sample, hint):
+        return hint
+    for fmt in DATE_FORMATS:
+        if fmt != hint and _parses_all(sample, fmt):
+            return fmt
+    return None
+
+def parse_dates(values: pd.Series, fmt: str) -> pd.Series:
+    """
+    Vectorized parse to day-resolution datetime64. Values the file-level
+    format misses (a stray locale, a totals row) get a format inferred from
+    just those values; anything still unparseable becomes NaT.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(object)
+    parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+    missed = parsed.isna() & values.notna()
+    if missed.any():
+        fallback = infer_date_format(values[missed])
+        if fallback:
+            parsed = parsed.fillna(pd.to_datetime(values[missed], format=fallback, errors="coerce"))
+    return parsed.dt.normalize()
+
+def _cached_format(signature: str, column: str, values: pd.Series) -> Optional[str]:
+    key = (signature, column)
+    fmt = infer_date_format(values, hint=_FORMAT_CACHE.get(key))
+    if fmt is not None and _FORMAT_CACHE.get(key) != fmt:
+        if key not in _FORMAT_CACHE and len(_FORMAT_CACHE) >= FORMAT_CACHE_SIZE:
+            # Evict the oldest entry (dicts keep insertion order)
+            _FORMAT_CACHE.pop(next(iter(_FORMAT_CACHE)))
+        _FORMAT_CACHE[key] = fmt
+    return fmt
+
+class DateParser:
+    """
+    Converts the resolved date columns (Date / Reporting Starts and
+    Reporting Ends) of each chunk to datetime64. Formats are fixed once per
+    file, from a sample or the first chunk, so every chunk, and every
+    parallel worker given the same formats, parses identically. Columns
+    whose format cannot be inferred are left as raw strings.
+    """
+
+    def __init__(self, schema: ColumnSchema, formats: Optional[Dict[str, Optional[str]]] = None):
+        self.schema = schema
+        self.columns: List[str] = [
+            col for col in (schema.date_column, schema.date_end_column) if col
+        ]
+        self.formats = dict(formats) if formats is not None else None
+
+    @classmethod
+    def from_sample(cls, schema: ColumnSchema, sample: pd.DataFrame) -> "DateParser":
+        parser = cls(schema)
+        parser._infer(sample)
+        return parser
+
+    def _infer(self, frame: pd.DataFrame):
+        self.formats = {
+            col: _cached_format(self.schema.signature, col, frame[col])
+            for col in self.columns if col in frame
+        }
+
+    def apply(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Copy of the chunk with date columns parsed (the input is left as is)"""
+        if not self.columns:
+            return chunk
+        if self.formats is None:
+            self._infer(chunk)
+        parsed = {
+            col: parse_dates(chunk[col], fmt)
+            for col, fmt in self.formats.items() if fmt and col in chunk
+        }
+        return chunk.assign(**parsed) if parsed else chunk
+
+    @property
+    def start_column(self) -> Optional[str]:
+        return self.schema.date_column
+
+    @property
+    def end_column(self) -> Optional[str]:
+        return self.schema.date_end_column or self.schema.date_column
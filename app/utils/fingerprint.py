@@ -0,0 +1,86 @@
+import hashlib
+
+class ContentFingerprint:
+    """
+    Incremental SHA-256 over normalized CSV bytes, so the same export hashes
+    the same regardless of BOM, line endings or trailing blank lines.
+    Feed raw chunks with update() and read the digest with hexdigest().
+    """
+
+    BOM = b"\xef\xbb\xbf"
+
+    def __init__(self):
+        self._digest = hashlib.sha256()
+        self._started = False
+        self._head = b""
+        self._pending_cr = False
+        self._pending_newlines = 0
+
+    def update(self, chunk: bytes):
+        if not self._started:
+            # Hold back the first few bytes until we can tell whether they are a BOM
+            self._head += chunk
+            if len(self._head) < len(self.BOM) and self.BOM.startswith(self._head):
+                return
+            chunk = self._head[len(self.BOM):] if self._head.startswith(self.BOM) else self._head
+            self._head = b""
+            self._started = True
+
+        if self._pending_cr:
+            chunk = b"\r" + chunk
+            self._pending_cr = False
+        if chunk.endswith(b"\r"):
+            # A trailing \r may be the first half of a \r\n split across chunks
+            chunk = chunk[:-1]
+            self._pending_cr = True
+
+        chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        self._feed(chunk)
+
+    def _feed(self, data: bytes):
+        # Trailing newlines are only hashed once more content follows them
+        stripped = data.rstrip(b"\n")
+        if stripped:
+            self._digest.update(b"\n" * self._pending_newlines)
+            self._digest.update(stripped)
+            self._pending_newlines = 0
+        self._pending_newlines += len(data) - len(stripped)
+
+    def hexdigest(self) -> str:
+        if not self._started:
+            # Input shorter than a BOM: hash whatever was held back
+            if self._head != self.BOM:
+                self._feed(self._head.replace(b"\r\n", b"\n").replace(b"\r", b"\n"))
+            self._head = b""
+            self._started = True
+        # A dangling \r is a line ending, which is dropped like other trailing newlines
+        return self._digest.hexdigest()
+
+def fingerprint_bytes(content: bytes) -> str:
+    """Normalized SHA-256 of a complete CSV payload"""
+    fingerprint = ContentFingerprint()
+    fingerprint.update(content)
+    return fingerprint.hexdigest()
+
+def fingerprint_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Normalized SHA-256 of a CSV file on disk, matching what the upload
+    route computes: gzip and zstd files hash their decompressed content,
+    everything else (plain CSV, ZIP) hashes the raw bytes
+    """
+    from app.utils.compression import compression_for, StreamDecompressor
+
+    compression = compression_for(path)
+    decompressor = StreamDecompressor(compression) if compression in ("gzip", "zstd") else None
+    fingerprint = ContentFingerprint()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            if decompressor:
+                for piece in decompressor.decompress(chunk):
+                    fingerprint.update(piece)
+            else:
+                fingerprint.update(chunk)
+    return fingerprint.hexdigest()
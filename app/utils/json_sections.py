@@ -0,0 +1,59 @@
+import json
+from typing import Any, List, Tuple
+
+class SectionParser:
+    """
+    Incremental parser for a streamed JSON object: feed it text as it arrives
+    and get back each top-level member ("ai_insights": [...]) once its value
+    is complete, so sections can be shown before the whole object is done.
+    Scans each character once; only finished members are handed to json.loads.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.member_start = None  # Buffer index where the current top-level member starts
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """Add streamed text; returns the (key, value) members it completed, in order"""
+        self.buffer += text
+        completed = []
+        while self.pos < len(self.buffer):
+            char = self.buffer[self.pos]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+                if self.depth == 1 and self.member_start is None:
+                    self.member_start = self.pos
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                if self.depth == 1:
+                    completed.extend(self._close_member())
+                self.depth -= 1
+            elif char == "," and self.depth == 1:
+                completed.extend(self._close_member())
+            self.pos += 1
+        return completed
+
+    def _close_member(self) -> List[Tuple[str, Any]]:
+        if self.member_start is None:
+            return []
+        member = self.buffer[self.member_start:self.pos]
+        self.member_start = None
+        # Everything before the next member is no longer needed
+        self.buffer, self.pos = self.buffer[self.pos:], 0
+        try:
+            return list(json.loads("{" + member + "}").items())
+        except ValueError:
+            # Malformed member; the full-response parse reports the error
+            return []
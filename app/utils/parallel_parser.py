@@ -0,0 +1,209 @@
+"""
+Opt-in multi-process variant of the streaming CSV parser.
+
+The file is split on line boundaries that fall exactly every `chunksize`
+data rows, so each worker process reads whole chunks of its byte range with
+the same chunk boundaries the serial streaming parser would use. Workers
+return one aggregator per chunk and the parent merges them in file order,
+so the result matches the serial path up to float rounding (sums of float
+metrics are added in a different grouping, ~1e-9 relative).
+
+Assumes one record per line (no quoted fields containing newlines), which
+holds for Meta Ads exports.
+"""
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+from app.utils.csv_parser import ChunkAggregator, _date_parser
+from app.utils.dates import DateParser
+from app.utils.schema_resolver import ColumnSchema
+from app.utils.snapshot import SnapshotWriter
+
+SCAN_BLOCK_SIZE = 8 * 1024 * 1024
+
+class _RangeReader:
+    """Read-only file view limited to [start, end), for pd.read_csv"""
+
+    def __init__(self, path: str, start: int, end: int):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+def chunk_offsets(path: str, chunksize: int) -> List[int]:
+    """
+    Byte offsets where each chunk of `chunksize` data rows starts, plus the
+    file size as the final entry. Newlines are located with NumPy block by block.
+    """
+    offsets = []
+    line_index = -1  # the header line ends at index -1; data rows start at 0
+    position = 0
+
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(SCAN_BLOCK_SIZE)
+            if not block:
+                break
+            newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord("\n"))
+            # Row i starts right after newline i-1; chunks start at rows 0, chunksize, ...
+            row_numbers = line_index + 1 + np.arange(len(newlines))
+            starts = newlines[row_numbers % chunksize == 0]
+            offsets.extend((position + starts + 1).tolist())
+            line_index += len(newlines)
+            position += len(block)
+
+    file_size = os.path.getsize(path)
+    offsets = [offset for offset in offsets if offset < file_size]
+    offsets.append(file_size)
+    return offsets
+
+class _BilliardResult:
+    """Future-like view of a billiard AsyncResult"""
+
+    def __init__(self, async_result):
+        self._async_result = async_result
+
+    def result(self):
+        return self._async_result.get()
+
+@contextmanager
+def _worker_pool(workers: int):
+    """
+    Yields submit(fn, *args) -> future. Uses a ProcessPoolExecutor, or
+    billiard's pool inside a daemonic process such as a Celery prefork child,
+    where multiprocessing refuses to start children.
+    """
+    import billiard
+    if multiprocessing.current_process().daemon or billiard.current_process().daemon:
+        pool = billiard.Pool(processes=workers)
+        try:
+            yield lambda fn, *args: _BilliardResult(pool.apply_async(fn, args))
+            pool.close()
+            pool.join()
+        finally:
+            pool.terminate()
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield pool.submit
+
+def _aggregate_range(
+    path: str,
+    start: int,
+    end: int,
+    schema: ColumnSchema,
+    chunksize: int,
+    read_kwargs: Dict[str, Any],
+    snapshot_part: Optional[Tuple[int, str]],
+    dates: Optional[DateParser] = None
+) -> Tuple[List[ChunkAggregator], Optional[str]]:
+    """Worker: aggregate each chunk of one byte range separately"""
+    reader = _RangeReader(path, start, end)
+    snapshot = SnapshotWriter(*snapshot_part) if snapshot_part else None
+    aggregators = []
+
+    try:
+        chunks = pd.read_csv(
+            reader,
+            header=None,
+            names=schema.columns,
+            chunksize=chunksize,
+            **read_kwargs
+        )
+        for chunk in chunks:
+            if snapshot is not None:
+                snapshot.write(chunk)
+            aggregator = ChunkAggregator(schema, dates)
+            aggregator.update(chunk)
+            aggregators.append(aggregator)
+    finally:
+        reader.close()
+
+    part_path = None
+    if snapshot is not None and snapshot.close() is not None:
+        part_path = snapshot.path
+    return aggregators, part_path
+
+def parse_ranges_in_parallel(
+    path: str,
+    schema: ColumnSchema,
+    chunksize: int,
+    read_kwargs: Dict[str, Any],
+    workers: int,
+    snapshot_id: Optional[int] = None,
+    dates: Optional[DateParser] = None
+) -> Dict[str, Any]:
+    """
+    Aggregate a CSV file across `workers` processes and merge the partial
+    aggregates in file order. Raises on any worker failure; the caller
+    decides whether to fall back to the serial parser.
+    """
+    offsets = chunk_offsets(path, chunksize)
+    chunk_starts = offsets[:-1]
+
+    # Several ranges per worker keeps processes busy when ranges parse unevenly
+    ranges_count = max(1, min(len(chunk_starts), workers * 2))
+    per_range = -(-len(chunk_starts) // ranges_count) if chunk_starts else 1
+    ranges = [
+        (chunk_starts[i], offsets[min(i + per_range, len(chunk_starts))])
+        for i in range(0, len(chunk_starts), per_range)
+    ]
+
+    snapshot = SnapshotWriter(snapshot_id) if snapshot_id is not None else None
+    part_paths = [f"{snapshot.path}.part{i}" for i in range(len(ranges))] if snapshot else []
+
+    try:
+        if dates is None:
+            # Fix formats once so every worker parses dates the same way
+            dates = _date_parser(path, schema)
+        aggregator = ChunkAggregator(schema, dates)
+        with _worker_pool(workers) as submit:
+            futures = [
+                submit(
+                    _aggregate_range, path, start, end, schema, chunksize, read_kwargs,
+                    (snapshot_id, part_paths[i]) if snapshot else None, dates
+                )
+                for i, (start, end) in enumerate(ranges)
+            ]
+            # Merge strictly in file order so results match the serial parser
+            # (up to float rounding)
+            written_parts = []
+            for future in futures:
+                chunk_aggregators, part_path = future.result()
+                for chunk_aggregator in chunk_aggregators:
+                    aggregator.merge(chunk_aggregator)
+                if part_path:
+                    written_parts.append(part_path)
+
+        summary = aggregator.summary()
+
+        if snapshot is not None:
+            try:
+                for part_path in written_parts:
+                    snapshot.append_file(part_path)
+                if not written_parts:
+                    # Header-only file: keep an empty snapshot like the serial parser
+                    snapshot.write(pd.read_csv(path, nrows=0, **read_kwargs))
+                summary["snapshot"] = snapshot.close()
+            except Exception as e:
+                print(f"Warning: Failed to write snapshot for analysis {snapshot_id}: {e}")
+                snapshot.abort()
+
+        return summary
+
+    finally:
+        for part_path in part_paths:
+            if os.path.exists(part_path):
+                os.remove(part_path)
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import shutil
+import uuid
+from typing import List, Optional
+from config import settings
+
+# Staged chunks live under UPLOAD_FOLDER/resumable/<session_id>/<index>.part
+RESUMABLE_FOLDER = os.path.join(settings.UPLOAD_FOLDER, "resumable")
+COPY_BUFFER_SIZE = 1048576
+
+def session_dir(session_id: str) -> str:
+    return os.path.join(RESUMABLE_FOLDER, session_id)
+
+def chunk_path(session_id: str, index: int) -> str:
+    return os.path.join(session_dir(session_id), f"{index}.part")
+
+def chunk_count(total_size: int, chunk_size: int) -> int:
+    return (total_size + chunk_size - 1) // chunk_size
+
+def expected_chunk_length(index: int, total_size: int, chunk_size: int) -> int:
+    """Only the last chunk may be shorter than chunk_size"""
+    return min(chunk_size, total_size - index * chunk_size)
+
+class ChunkWriter:
+    """
+    Stage one chunk atomically: the body is written to a temp file and
+    renamed into place on commit, so a half-received PUT never looks like a
+    chunk and a retried PUT simply replaces the previous copy. Each writer has
+    its own temp file, so concurrent PUTs of the same chunk (even from one
+    process) never share one. The SHA-256 of the body is kept for checksum
+    verification.
+    """
+
+    def __init__(self, session_id: str, index: int):
+        os.makedirs(session_dir(session_id), exist_ok=True)
+        self.path = chunk_path(session_id, index)
+        self.temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._handle = open(self.temp_path, "wb")
+
+    def write(self, data: bytes):
+        self._handle.write(data)
+        self._digest.update(data)
+        self.size += len(data)
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+    def commit(self) -> str:
+        self._handle.close()
+        os.replace(self.temp_path, self.path)
+        return self.path
+
+    def abort(self):
+        self._handle.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+def staged_chunks(session_id: str, total_size: int, chunk_size: int) -> List[int]:
+    """Indexes of chunks that are fully staged with the expected length"""
+    received = []
+    for index in range(chunk_count(total_size, chunk_size)):
+        path = chunk_path(session_id, index)
+        if os.path.exists(path) and \
+                os.path.getsize(path) == expected_chunk_length(index, total_size, chunk_size):
+            received.append(index)
+    return received
+
+def received_ranges(indexes: List[int], total_size: int, chunk_size: int) -> List[List[int]]:
+    """Collapse staged chunk indexes into [start, end) byte ranges"""
+    ranges: List[List[int]] = []
+    for index in indexes:
+        start = index * chunk_size
+        end = start + expected_chunk_length(index, total_size, chunk_size)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return ranges
+
+def read_staged(session_id: str, total_chunks: int, buffer_size: Optional[int] = None):
+    """Yield the staged file's bytes in order, chunk by chunk"""
+    buffer_size = buffer_size or COPY_BUFFER_SIZE
+    for index in range(total_chunks):
+        with open(chunk_path(session_id, index), "rb") as handle:
+            while True:
+                data = handle.read(buffer_size)
+                if not data:
+                    break
+                yield data
+
+def discard_session(session_id: str):
+    """Remove every staged chunk for a session"""
+    shutil.rmtree(session_dir(session_id), ignore_errors=True)
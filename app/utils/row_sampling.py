@@ -0,0 +1,353 @@
+"""
+Representative CSV rows for the prompt. RowSampler keeps a bounded set of
+candidate rows while the parser streams the file, and build_row_section()
+fits as many of them into the prompt as the token budget allows.
+
+Every selection is order independent (top-N with first-occurrence ties, or
+bottom-k by content hash), so chunked, parallel and in-memory parses pick
+the same rows.
+"""
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+from app.utils.schema_resolver import ColumnSchema
+from app.utils.tokens import count_tokens
+
+# Candidate rows kept per selection
+TOP_SPEND_ROWS = 20
+WORST_CPA_ROWS = 20
+# Rows kept at each tail of row-level CTR
+CTR_OUTLIER_ROWS = 10
+# Rows need this many impressions before their CTR counts as an outlier
+MIN_ROW_IMPRESSIONS = 1000
+# Stratified sample: rows per (campaign, week) stratum, and most strata kept
+ROWS_PER_STRATUM = 2
+MAX_STRATA = 250
+# Expected rows per stratum left by the hash prefilter before the exact sort
+SAMPLE_OVERSAMPLING = 4
+
+# Ranked selections: name -> (key column, largest first, rows kept). Worst
+# CPA breaks ties (every zero-conversion row is infinite) by spend.
+RANKED_SELECTIONS = {
+    "top_spend": ("spend", True, TOP_SPEND_ROWS),
+    "worst_cpa": ("_cpa", True, WORST_CPA_ROWS),
+    "ctr_high": ("_ctr", True, CTR_OUTLIER_ROWS),
+    "ctr_low": ("_ctr", False, CTR_OUTLIER_ROWS),
+}
+
+# Role -> table heading, in column order
+ROW_DIMENSIONS = [("date", "Date"), ("campaign", "Campaign"), ("ad_set", "Ad Set"), ("ad_name", "Ad")]
+ROW_METRICS = [("spend", "Spend"), ("impressions", "Impr"), ("clicks", "Clicks"), ("conversions", "Conv")]
+ROW_RATIOS = [("ctr", "CTR%"), ("cpc", "CPC"), ("cpa", "CPA")]
+
+# (selection, heading, share of the row budget); unused share rolls over
+ROW_SECTIONS = [
+    ("top_spend", "Highest spend", 0.25),
+    ("worst_cpa", "Worst CPA", 0.2),
+    ("ctr_outliers", "Unusual CTR", 0.15),
+    ("sample", "Sample across campaigns and weeks", 0.4),
+]
+
+def _day_numbers(dates: pd.Series) -> np.ndarray:
+    """Days since the epoch, independent of the datetime64 resolution"""
+    return dates.to_numpy().astype("datetime64[D]").astype("int64")
+
+def _hash(frame: pd.DataFrame) -> np.ndarray:
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+def _first_rows(frame: pd.DataFrame, keys: List[np.ndarray], limit: Optional[int] = None) -> pd.DataFrame:
+    """
+    Rows ordered by ascending keys (first key most significant, NaN last,
+    ties in input order), optionally truncated; numpy's lexsort is much
+    faster than a multi-column sort_values
+    """
+    order = np.lexsort(keys[::-1])
+    return frame.take(order[:limit] if limit is not None else order)
+
+def _extreme_rows(frame: pd.DataFrame, key: str, largest: bool, limit: int) -> pd.DataFrame:
+    """
+    Same rows as nlargest/nsmallest (first occurrence wins ties): an
+    np.partition pass finds the cutoff, and only rows at or past it are sorted
+    """
+    values = frame[key].to_numpy()
+    ranked = values if largest else -values
+    valid = ~np.isnan(ranked)
+    if valid.sum() > limit:
+        cutoff = np.partition(ranked[valid], -limit)[-limit]
+        with np.errstate(invalid="ignore"):
+            keep = valid & (ranked > cutoff)
+            tied = ranked == cutoff
+        if key == "_cpa" and tied.sum() > limit - keep.sum():
+            # Many rows tie on the cutoff (zero conversions): narrow them by spend
+            spend = frame["spend"].to_numpy()
+            spend_cutoff = np.partition(spend[tied], -(limit - keep.sum()))[-(limit - keep.sum())]
+            tied &= spend >= spend_cutoff
+        valid = keep | tied
+    frame = frame[valid]
+    keys = [-ranked[valid]]
+    if key == "_cpa":
+        keys.append(-frame["spend"].to_numpy())
+    return _first_rows(frame, keys, limit)
+
+def _hash_prefilter(frame: pd.DataFrame, strata: int) -> pd.DataFrame:
+    """
+    Drop rows that cannot be among the ROWS_PER_STRATUM smallest hashes of
+    their stratum, without sorting: hashes are uniform, so a low cutoff keeps
+    a few rows per stratum, and strata left short keep all their rows
+    """
+    expected = len(frame) / max(strata, 1)
+    fraction = SAMPLE_OVERSAMPLING * ROWS_PER_STRATUM / expected
+    if fraction >= 0.5:
+        return frame
+    hashes, keys = frame["_hash"].to_numpy(), frame["_stratum"].to_numpy()
+    below = hashes <= np.uint64(fraction * np.iinfo(np.uint64).max)
+    counts = pd.Series(keys[below]).value_counts()
+    enough = counts.index[counts.to_numpy() >= ROWS_PER_STRATUM].to_numpy()
+    return frame[below | ~np.isin(keys, enough)]
+
+class RowSampler:
+    """
+    Candidate rows for the prompt: the highest-spend rows, the worst-CPA rows
+    (zero conversions counts as worst, then by spend), both tails of CTR, and
+    a stratified sample of ROWS_PER_STRATUM rows per (campaign, week).
+    """
+
+    def __init__(self, schema: ColumnSchema):
+        self.columns = {}
+        for role, _ in ROW_DIMENSIONS:
+            # Ad name falls back to the campaign column; don't repeat it
+            col = schema.dimensions.get(role)
+            if col and col not in self.columns.values():
+                self.columns[role] = col
+        self.metric_columns = {
+            metric: schema.metrics[metric] for metric, _ in ROW_METRICS if metric in schema.metrics
+        }
+        self.selections: Dict[str, Optional[pd.DataFrame]] = {
+            "top_spend": None, "worst_cpa": None, "ctr_high": None, "ctr_low": None, "sample": None
+        }
+
+    def _canonical(self, chunk: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """
+        Used columns renamed to their roles, with the hashes the sample is keyed on
+        (None when no column is usable, e.g. only metric columns holding text)
+        """
+        used = dict(self.columns)
+        used.update({
+            metric: col for metric, col in self.metric_columns.items()
+            if pd.api.types.is_numeric_dtype(chunk[col])
+        })
+        if not used:
+            return None
+        frame = chunk[list(used.values())].set_axis(list(used), axis=1).reset_index(drop=True)
+        metrics = [metric for metric in self.metric_columns if metric in used]
+        frame[metrics] = frame[metrics].astype("float64")
+
+        # Hash parsed dates as day numbers so datetime resolution can't change them
+        keyed = {col: frame[col] for col in frame.columns}
+        parsed_dates = "date" in frame and pd.api.types.is_datetime64_any_dtype(frame["date"])
+        if parsed_dates:
+            keyed["date"] = _day_numbers(frame["date"])
+        strata = {}
+        if "campaign" in frame:
+            strata["campaign"] = frame["campaign"]
+        if parsed_dates:
+            # Epoch day 0 was a Thursday; weeks start on Monday
+            strata["week"] = keyed["date"] - (keyed["date"] + 3) % 7
+        elif "date" in frame:
+            strata["date"] = frame["date"]
+        frame["_hash"] = _hash(pd.DataFrame(keyed))
+        frame["_stratum"] = _hash(pd.DataFrame(strata)) if strata else np.uint64(0)
+
+        # Ranking keys; NaN marks rows a selection ignores
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if "spend" in frame and "conversions" in frame:
+                spend = frame["spend"].to_numpy()
+                frame["_cpa"] = np.where(spend > 0, spend / frame["conversions"].to_numpy(), np.nan)
+            if "clicks" in frame and "impressions" in frame:
+                impressions = frame["impressions"].to_numpy()
+                frame["_ctr"] = np.where(
+                    impressions >= MIN_ROW_IMPRESSIONS, frame["clicks"].to_numpy() / impressions, np.nan
+                )
+        return frame
+
+    def _sample_candidates(self, current: pd.DataFrame, partial: pd.DataFrame) -> pd.DataFrame:
+        """
+        Rows of `partial` that could still enter the sample: in a stratum no
+        larger than the largest kept one (once MAX_STRATA are kept), and
+        hashing below the k-th smallest hash of a full stratum
+        """
+        strata = current.groupby("_stratum")["_hash"]
+        if strata.ngroups >= MAX_STRATA:
+            partial = partial[partial["_stratum"].to_numpy() <= current["_stratum"].max()]
+        counts, kth = strata.size(), strata.max()
+        full = kth[counts >= ROWS_PER_STRATUM]
+        if full.empty or partial.empty:
+            return partial
+        position = full.index.get_indexer(partial["_stratum"])
+        threshold = np.where(position >= 0, full.to_numpy()[position], np.iinfo(np.uint64).max)
+        return partial[partial["_hash"].to_numpy() < threshold]
+
+    @staticmethod
+    def _select(name: str, frame: pd.DataFrame) -> pd.DataFrame:
+        """One selection applied to a frame of candidate rows"""
+        if name in RANKED_SELECTIONS:
+            return _extreme_rows(frame, *RANKED_SELECTIONS[name])
+
+        if frame.empty:
+            return frame
+        # Bottom-k by hash, both for strata and for rows within a stratum
+        unique = np.sort(pd.unique(frame["_stratum"].to_numpy()))
+        if len(unique) > MAX_STRATA:
+            unique = unique[:MAX_STRATA]
+            frame = frame[frame["_stratum"].to_numpy() <= unique[-1]]
+        frame = _hash_prefilter(frame, len(unique))
+        frame = _first_rows(frame, [frame["_stratum"].to_numpy(), frame["_hash"].to_numpy()])
+        strata = frame["_stratum"].to_numpy()
+        starts = np.flatnonzero(np.r_[True, strata[1:] != strata[:-1]])
+        # Position of each row within its stratum
+        rank = np.arange(len(strata)) - np.repeat(starts, np.diff(np.r_[starts, len(strata)]))
+        return frame[rank < ROWS_PER_STRATUM]
+
+    def _fold(self, name: str, partial: pd.DataFrame):
+        current = self.selections[name]
+        if name == "sample" and current is not None:
+            partial = self._sample_candidates(current, partial)
+        # Every selection decomposes, so the partial is reduced before the
+        # concat; carried-over rows come first so ties keep first-occurrence order
+        partial = self._select(name, partial)
+        # Kept rows are few; plain objects avoid unioning categories on every concat
+        partial = partial.astype({
+            col: object for col, dtype in partial.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)
+        })
+        frame = partial if current is None else self._select(name, pd.concat([current, partial], ignore_index=True))
+        self.selections[name] = frame.reset_index(drop=True)
+
+    def update(self, chunk: pd.DataFrame):
+        # Without a recognised dimension or metric there is nothing to sample by
+        if chunk.empty or not (self.columns or self.metric_columns):
+            return
+        frame = self._canonical(chunk)
+        if frame is None:
+            return
+        for name, (key, _, _) in RANKED_SELECTIONS.items():
+            if key in frame:
+                self._fold(name, frame)
+        self._fold("sample", frame)
+
+    def merge(self, other: "RowSampler"):
+        """Fold in another sampler, as if its chunks had been passed to update()"""
+        for name, partial in other.selections.items():
+            if partial is not None:
+                self._fold(name, partial)
+
+    def result(self) -> Dict[str, Any]:
+        """
+        JSON-safe candidate rows
+        Returns:
+            {"columns": [...], "top_spend": [[...], ...], "worst_cpa": ...,
+             "ctr_outliers": ..., "sample": ...}; rows follow "columns"
+        """
+        frames = {name: frame for name, frame in self.selections.items() if frame is not None}
+        if not frames:
+            return {}
+        columns = [col for col in next(iter(frames.values())).columns if not col.startswith("_")]
+
+        ctr_outliers = [frames[name] for name in ("ctr_high", "ctr_low") if name in frames]
+        if ctr_outliers:
+            # Alternate the two tails so a small budget still shows both
+            outliers = pd.concat(ctr_outliers, keys=range(len(ctr_outliers)))
+            order = outliers.index.get_level_values(1) * len(ctr_outliers) + outliers.index.get_level_values(0)
+            frames["ctr_outliers"] = outliers.iloc[np.argsort(order, kind="stable")]
+        if "sample" in frames:
+            # Rank within stratum first, then hash: truncating keeps the spread
+            sample = frames["sample"]
+            rank = sample.groupby("_stratum", sort=False).cumcount().to_numpy()
+            frames["sample"] = _first_rows(sample, [rank, sample["_hash"].to_numpy()])
+
+        result: Dict[str, Any] = {"columns": columns}
+        for name, _, _ in ROW_SECTIONS:
+            if name not in frames:
+                continue
+            frame = frames[name][columns]
+            if "date" in frame and pd.api.types.is_datetime64_any_dtype(frame["date"]):
+                frame = frame.assign(date=frame["date"].dt.strftime("%Y-%m-%d"))
+            frame = frame.astype(object).where(frame.notna(), None)
+            result[name] = [
+                [value if isinstance(value, (float, type(None))) else str(value) for value in row]
+                for row in frame.itertuples(index=False, name=None)
+            ]
+        return result
+
+def _format_number(value: Optional[float], digits: int) -> str:
+    if value is None or not np.isfinite(value):
+        return "-"
+    return f"{value:.{digits}f}"
+
+def _row_line(row: Dict[str, Any]) -> str:
+    """One pipe-separated table line: dimensions, metrics, then derived ratios"""
+    cells = [str(row[role]) if row[role] is not None else "-" for role, _ in ROW_DIMENSIONS if role in row]
+    for metric, _ in ROW_METRICS:
+        if metric in row:
+            cells.append(_format_number(row[metric], 2 if metric == "spend" else 0))
+
+    spend, clicks = row.get("spend"), row.get("clicks")
+    impressions, conversions = row.get("impressions"), row.get("conversions")
+    ratios = {
+        "ctr": clicks / impressions * 100 if clicks is not None and impressions else None,
+        "cpc": spend / clicks if spend is not None and clicks else None,
+        "cpa": spend / conversions if spend is not None and conversions else None,
+    }
+    for ratio, _ in ROW_RATIOS:
+        if _ratio_available(ratio, row):
+            cells.append(_format_number(ratios[ratio], 2))
+    return " | ".join(cells)
+
+def _ratio_available(ratio: str, row: Dict[str, Any]) -> bool:
+    needs = {"ctr": ("clicks", "impressions"), "cpc": ("spend", "clicks"), "cpa": ("spend", "conversions")}
+    return all(metric in row for metric in needs[ratio])
+
+def build_row_section(row_sample: Dict[str, Any], token_budget: int) -> str:
+    """
+    Prompt section listing sampled rows as a compact table, within a token budget
+    Args:
+        row_sample: RowSampler.result() output
+        token_budget: Tokens the section may use
+    Returns:
+        The section text, or "" when there are no rows or no budget
+    """
+    columns = row_sample.get("columns") if row_sample else None
+    if not columns or token_budget <= 0:
+        return ""
+
+    headings = dict(ROW_DIMENSIONS + ROW_METRICS + ROW_RATIOS)
+    header_cells = [headings[col] for col in columns]
+    header_cells += [headings[ratio] for ratio, _ in ROW_RATIOS if _ratio_available(ratio, dict.fromkeys(columns))]
+    text = f"\n**Sample Rows** ({' | '.join(header_cells)}):\n"
+    remaining = token_budget - count_tokens(text)
+
+    seen = set()
+    added = 0
+    carry = 0
+    for name, heading, share in ROW_SECTIONS:
+        section_budget = int(token_budget * share) + carry
+        title = f"_{heading}_\n"
+        # The title is only paid for once the section has a row
+        lines, pending = "", count_tokens(title)
+        for values in row_sample.get(name, []):
+            line = f"{_row_line(dict(zip(columns, values)))}\n"
+            if line in seen:
+                continue
+            cost = count_tokens(line) + pending
+            if cost > min(section_budget, remaining):
+                break
+            lines += line
+            seen.add(line)
+            section_budget -= cost
+            remaining -= cost
+            pending = 0
+            added += 1
+        if lines:
+            text += title + lines
+        carry = max(section_budget, 0)
+
+    return text if added else ""
@@ -0,0 +1,169 @@
+import re
+import hashlib
+import difflib
+from typing import Dict, List, Optional, Tuple
+
+# Canonical metric -> header aliases in priority order (already normalized)
+METRIC_ALIASES = {
+    "impressions": ["impressions", "reach"],
+    "clicks": ["clicks", "link clicks"],
+    "spend": ["spend", "amount spent"],
+    "conversions": ["conversions", "results"],
+    "ctr": ["ctr", "link click through rate"],
+    "cpc": ["cpc", "cost per link click"],
+}
+
+# Non-metric roles the parser needs to locate
+DIMENSION_ALIASES = {
+    "date": ["date", "day", "reporting starts", "date start"],
+    "date_end": ["reporting ends", "date stop", "end date"],
+    "ad_name": ["ad name", "campaign name"],
+    "campaign": ["campaign name", "campaign"],
+    "ad_set": ["ad set name", "adset name", "ad set"],
+}
+
+# Repetitive text dimensions loaded as pandas categoricals
+CATEGORICAL_ROLES = {"ad_name", "campaign", "ad_set"}
+
+# Metrics used to rank top ads, in priority order
+SORT_METRICS = ["impressions", "spend", "clicks"]
+
+FUZZY_CUTOFF = 0.85
+SCHEMA_CACHE_SIZE = 256
+
+# Header signature -> resolved schema
+_SCHEMA_CACHE: Dict[str, "ColumnSchema"] = {}
+
+_CURRENCY_SUFFIX = re.compile(r"\(\s*[A-Z]{3}\s*\)$")
+_PARENTHESIZED = re.compile(r"\([^)]*\)")
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+def _clean(text: str) -> str:
+    return _NON_ALNUM.sub(" ", text).strip()
+
+def normalize_header(column: str) -> Tuple[str, str]:
+    """
+    Normalize a header for matching.
+    Returns (full, base): full keeps qualifiers such as "(all)" but drops a
+    trailing currency code, base drops every parenthesized qualifier.
+    "Amount spent (USD)" -> ("amount spent", "amount spent")
+    "CPC (cost per link click) (USD)" -> ("cpc cost per link click", "cpc")
+    """
+    stripped = str(column).strip()
+    full = _clean(_CURRENCY_SUFFIX.sub("", stripped).lower())
+    base = _clean(_PARENTHESIZED.sub(" ", stripped.lower()))
+    return full, base or full
+
+def header_signature(columns: List[str]) -> str:
+    """Stable hash identifying a header row"""
+    return hashlib.sha1("\x1f".join(str(col) for col in columns).encode("utf-8")).hexdigest()
+
+class ColumnSchema:
+    """Resolved mapping from a CSV header row to canonical roles"""
+
+    def __init__(self, columns: Tuple[str, ...], signature: str,
+                 metrics: Dict[str, str], dimensions: Dict[str, str]):
+        self.columns = list(columns)
+        self.signature = signature
+        self.metrics = metrics  # canonical metric -> source column
+        self.dimensions = dimensions  # role (date, ad_name, ...) -> source column
+
+    @property
+    def date_column(self) -> Optional[str]:
+        return self.dimensions.get("date")
+
+    @property
+    def date_end_column(self) -> Optional[str]:
+        """End of the reporting period ("Reporting Ends"), when exported"""
+        return self.dimensions.get("date_end")
+
+    @property
+    def ad_name_column(self) -> Optional[str]:
+        return self.dimensions.get("ad_name")
+
+    @property
+    def sort_column(self) -> Optional[str]:
+        for metric in SORT_METRICS:
+            if metric in self.metrics:
+                return self.metrics[metric]
+        return None
+
+    @property
+    def usecols(self) -> List[str]:
+        """Source columns the parser actually reads, in header order"""
+        wanted = set(self.metrics.values()) | set(self.dimensions.values())
+        return [col for col in self.columns if col in wanted]
+
+    @property
+    def text_dtypes(self) -> Dict[str, str]:
+        """Dtypes for text columns only, leaving metric columns to inference"""
+        dtypes = {col: "category" for role, col in self.dimensions.items() if role in CATEGORICAL_ROLES}
+        for col in (self.date_column, self.date_end_column):
+            if col:
+                # Read as plain strings and parsed by app/utils/dates.py
+                dtypes[col] = "str"
+        return dtypes
+
+    @property
+    def dtypes(self) -> Dict[str, str]:
+        """Explicit dtypes for every used column so pandas skips inference"""
+        dtypes = {col: "float64" for col in self.metrics.values()}
+        dtypes.update(self.text_dtypes)
+        return dtypes
+
+def _resolve(columns: Tuple[str, ...]) -> ColumnSchema:
+    normalized = {col: normalize_header(col) for col in columns}
+    by_full: Dict[str, str] = {}
+    by_base: Dict[str, str] = {}
+    for col in columns:
+        full, base = normalized[col]
+        by_full.setdefault(full, col)
+        by_base.setdefault(base, col)
+
+    def find(aliases: List[str], taken: set) -> Optional[str]:
+        for lookup in (by_full, by_base):
+            for alias in aliases:
+                col = lookup.get(alias)
+                if col is not None and col not in taken:
+                    return col
+        for alias in aliases:
+            options = [key for key, col in by_full.items() if col not in taken]
+            close = difflib.get_close_matches(alias, options, n=1, cutoff=FUZZY_CUTOFF)
+            if close:
+                return by_full[close[0]]
+        return None
+
+    metrics: Dict[str, str] = {}
+    taken: set = set()
+    for metric, aliases in METRIC_ALIASES.items():
+        col = find(aliases, taken)
+        if col is not None:
+            metrics[metric] = col
+            taken.add(col)
+
+    dimensions: Dict[str, str] = {}
+    for role, aliases in DIMENSION_ALIASES.items():
+        col = find(aliases, taken)
+        if col is not None:
+            dimensions[role] = col
+
+    return ColumnSchema(columns, header_signature(list(columns)), metrics, dimensions)
+
+def resolve_schema(columns: List[str]) -> ColumnSchema:
+    """
+    Map a header row to canonical metrics and dimensions.
+    Results are cached by header signature, so repeated exports with the
+    same layout resolve without re-running the matching.
+    """
+    columns = tuple(str(col) for col in columns)
+    signature = header_signature(list(columns))
+
+    schema = _SCHEMA_CACHE.get(signature)
+    if schema is None:
+        schema = _resolve(columns)
+        if len(_SCHEMA_CACHE) >= SCHEMA_CACHE_SIZE:
+            # Evict the oldest entry (dicts keep insertion order)
+            _SCHEMA_CACHE.pop(next(iter(_SCHEMA_CACHE)))
+        _SCHEMA_CACHE[signature] = schema
+
+    return schema
@@ -0,0 +1,211 @@
+import os
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Dict, Any, Iterator, List, Optional
+from config import settings
+
+SNAPSHOT_FOLDER = os.path.join(settings.UPLOAD_FOLDER, "snapshots")
+
+# Rows per Parquet row group; readers page through a snapshot one group at a
+# time, so this bounds the memory of a single page read
+SNAPSHOT_ROW_GROUP_SIZE = 65536
+# Read size when uploading a finished snapshot to storage
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def snapshot_path(analysis_id: int) -> str:
+    """Location of the columnar snapshot for an analysis"""
+    return os.path.join(SNAPSHOT_FOLDER, f"analysis_{analysis_id}.parquet")
+
+class SnapshotWriter:
+    """
+    Incrementally writes parsed CSV frames to a Parquet file keyed by analysis id.
+    Works for a single DataFrame or a stream of chunks; later chunks are cast
+    to the schema of the first one.
+    """
+
+    def __init__(self, analysis_id: int, path: Optional[str] = None):
+        self.analysis_id = analysis_id
+        self.path = path or snapshot_path(analysis_id)
+        self.rows = 0
+        self._writer = None
+
+    def write(self, df: pd.DataFrame):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        self._write_table(table)
+
+    def _write_table(self, table: pa.Table):
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._writer = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+        elif not table.schema.equals(self._writer.schema):
+            table = table.cast(self._writer.schema)
+        self._writer.write_table(table, row_group_size=SNAPSHOT_ROW_GROUP_SIZE)
+        self.rows += table.num_rows
+
+    def append_file(self, path: str):
+        """Copy another Parquet file (e.g. a per-process part) in batch by batch"""
+        for batch in pq.ParquetFile(path).iter_batches():
+            self._write_table(pa.Table.from_batches([batch]))
+
+    def close(self) -> Optional[Dict[str, Any]]:
+        """Finish the file and return its handle (None if nothing was written)"""
+        if self._writer is None:
+            return None
+        self._writer.close()
+        return {
+            "analysis_id": self.analysis_id,
+            "path": self.path,
+            "format": "parquet",
+            "rows": self.rows,
+            "columns": self._writer.schema.names
+        }
+
+    def abort(self):
+        """Discard a partially written snapshot"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def _stored_filename(analysis_id: int) -> str:
+    return f"snapshot_analysis_{analysis_id}.parquet"
+
+def store_snapshot(handle: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Upload a finished snapshot through the storage backend, so the API service
+    (which does not share the worker's disk) can read it, and drop the local
+    file. The returned handle carries the storage "url" instead of a "path".
+    On failure the local handle is returned unchanged.
+    """
+    if not handle or not handle.get("path"):
+        return handle
+    from app.services.storage_service import get_storage
+    storage = get_storage()
+    sink = storage.open_upload(_stored_filename(handle["analysis_id"]))
+    try:
+        with open(handle["path"], "rb") as f:
+            while True:
+                chunk = f.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                sink.write(chunk)
+        url = sink.finish()
+    except Exception as e:
+        sink.abort()
+        print(f"Warning: Failed to store snapshot for analysis {handle['analysis_id']}: {e}")
+        return handle
+    os.remove(handle["path"])
+    stored = {key: value for key, value in handle.items() if key != "path"}
+    stored["url"] = url
+    return stored
+
+def _open_file(handle: Dict[str, Any]):
+    if handle.get("url"):
+        from app.services.storage_service import storage_for_url
+        return storage_for_url(handle["url"]).open_seekable(handle["url"])
+    return open(handle["path"], "rb")
+
+def open_snapshot(analysis_id: int, url: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Build a handle for an existing snapshot from its file metadata only
+    Args:
+        analysis_id: Analysis the snapshot belongs to
+        url: Analysis.snapshot_url; without it, a snapshot on this machine's
+            disk is looked for (analyses parsed before snapshots were stored)
+    """
+    handle = {"analysis_id": analysis_id, "format": "parquet"}
+    if url:
+        handle["url"] = url
+    else:
+        handle["path"] = snapshot_path(analysis_id)
+        if not os.path.exists(handle["path"]):
+            return None
+    try:
+        with _open_file(handle) as f:
+            metadata = pq.ParquetFile(f).metadata
+    except FileNotFoundError:
+        return None
+    handle["rows"] = metadata.num_rows
+    handle["columns"] = metadata.schema.to_arrow_schema().names
+    return handle
+
+def _known_columns(handle: Dict[str, Any], columns: Optional[List[str]]) -> Optional[List[str]]:
+    if columns is None:
+        return None
+    return [col for col in columns if col in handle.get("columns", [])]
+
+def read_snapshot_rows(handle: Dict[str, Any], columns: Optional[List[str]] = None, offset: int = 0, limit: int = 100) -> pd.DataFrame:
+    """
+    Rows [offset, offset + limit) of a snapshot, reading only the requested
+    columns of the row groups that hold them
+    """
+    columns = _known_columns(handle, columns)
+    with _open_file(handle) as f:
+        parquet = pq.ParquetFile(f)
+        groups, first_row, group_start = [], None, 0
+        for index in range(parquet.num_row_groups):
+            group_rows = parquet.metadata.row_group(index).num_rows
+            if group_start + group_rows > offset and group_start < offset + limit:
+                if first_row is None:
+                    first_row = group_start
+                groups.append(index)
+            group_start += group_rows
+        if not groups:
+            schema = parquet.schema_arrow
+            table = schema.empty_table() if columns is None else schema.empty_table().select(columns)
+            return table.to_pandas()
+        table = parquet.read_row_groups(groups, columns=columns)
+    return table.slice(offset - first_row, limit).to_pandas()
+
+def iter_snapshot(handle: Dict[str, Any], columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """Snapshot rows as DataFrames of at most SNAPSHOT_ROW_GROUP_SIZE rows, for accumulators"""
+    with _open_file(handle) as f:
+        for batch in pq.ParquetFile(f).iter_batches(batch_size=SNAPSHOT_ROW_GROUP_SIZE, columns=_known_columns(handle, columns)):
+            yield batch.to_pandas()
+
+def reuse_snapshot(handle: Optional[Dict[str, Any]], analysis_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Point a cached snapshot handle at this analysis. A snapshot written for
+    another analysis of the same content is copied (in storage, or hard-linked
+    on disk) so each analysis keeps its own file and can be deleted independently.
+    Returns None if the source snapshot no longer exists.
+    """
+    if not handle:
+        return None
+    if handle.get("analysis_id") == analysis_id:
+        return handle
+
+    if handle.get("url"):
+        from app.services.storage_service import get_storage
+        try:
+            url = get_storage().copy(handle["url"], _stored_filename(analysis_id))
+        except Exception as e:
+            print(f"Warning: Failed to copy snapshot for analysis {analysis_id}: {e}")
+            return None
+        return dict(handle, analysis_id=analysis_id, url=url)
+
+    if not os.path.exists(handle.get("path", "")):
+        return None
+    path = snapshot_path(analysis_id)
+    if os.path.exists(path):
+        os.remove(path)
+    try:
+        os.link(handle["path"], path)
+    except OSError:
+        shutil.copyfile(handle["path"], path)
+    return dict(handle, analysis_id=analysis_id, path=path)
+
+def delete_snapshot(analysis_id: int, url: Optional[str] = None) -> bool:
+    """Remove the snapshot for an analysis, stored or on disk, if one exists"""
+    deleted = False
+    if url:
+        from app.services.storage_service import storage_for_url
+        deleted = storage_for_url(url).delete(url)
+    path = snapshot_path(analysis_id)
+    if os.path.exists(path):
+        os.remove(path)
+        deleted = True
+    return deleted
@@ -0,0 +1,27 @@
+import math
+
+# Model whose tokenizer is used for counting (matches openai_service)
+TOKENIZER_MODEL = "gpt-4o"
+# Characters per token assumed when tiktoken is not installed. Number-heavy
+# tables tokenize denser than prose, so this errs on the side of overcounting.
+CHARS_PER_TOKEN = 3
+
+_encoding = None
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.encoding_for_model(TOKENIZER_MODEL)
+        except Exception as e:
+            print(f"Warning: tiktoken unavailable, estimating token counts: {e}")
+            _encoding = False
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    """Tokens `text` costs in the analysis model's prompt (estimated without tiktoken)"""
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
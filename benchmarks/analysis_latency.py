@@ -0,0 +1,125 @@
+"""
+Wall time, tokens sent and prompt-cache hits of the analysis section calls,
+for each way of splitting the sections into calls, against the real OpenAI API
+(needs OPENAI_API_KEY; the LLM response cache is bypassed). Every run gets its
+own prompt prefix, so no layout reads another's prompt cache. The rate limiter
+runs as configured: with RATE_LIMIT_BACKEND=redis, the wait for
+OPENAI_TPM_LIMIT budget is part of the measured time. Competitor lookups are
+left out; the niche call still runs.
+
+With --stub the calls go to benchmarks.openai_stub instead, whose latency is a
+model of the API rather than the API itself, with the rate limiter off.
+
+    python -m benchmarks.analysis_latency --rows 100000 --repeat 3
+    python -m benchmarks.analysis_latency --stub --time-scale 0.2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import uuid
+
+from openai import AsyncOpenAI
+
+from app.services import competitor_directory, llm_cache, openai_service
+from app.utils.csv_parser import format_metrics_for_ai, parse_meta_ads_csv
+from benchmarks.openai_stub import StubConfig, start_stub
+from benchmarks.synthetic_export import cached_export
+from config import settings
+
+SECTIONS = tuple(openai_service.ANALYSIS_SECTIONS)
+
+# (name, lead sections, fan-out groups)
+LAYOUTS = [
+    ("grouped_with_lead", openai_service.LEAD_SECTIONS, openai_service.FAN_OUT_GROUPS),
+    ("grouped_no_lead", (), (openai_service.LEAD_SECTIONS,) + openai_service.FAN_OUT_GROUPS),
+    ("per_section", (), tuple((section,) for section in SECTIONS)),
+    ("single_call", SECTIONS, ()),
+]
+
+def _recording_client(calls: list):
+    """Client factory that records the usage of every completion"""
+    def client():
+        openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        create = openai_client.chat.completions.create
+
+        async def recorded_create(**request):
+            start = time.perf_counter()
+            response = await create(**request)
+            usage = response.usage
+            details = getattr(usage, "prompt_tokens_details", None) or {}
+            cached = details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", None)
+            calls.append({
+                "seconds": time.perf_counter() - start,
+                "prompt_tokens": usage.prompt_tokens,
+                "cached_tokens": cached or 0,
+                "completion_tokens": usage.completion_tokens,
+            })
+            return response
+
+        openai_client.chat.completions.create = recorded_create
+        return openai_client
+    return client
+
+async def _no_competitors(client, niche: str) -> list:
+    return []
+
+def run(name: str, lead: tuple, fan_out: tuple, prompt: str, performance_report, time_scale: float = 1.0):
+    openai_service.LEAD_SECTIONS, openai_service.FAN_OUT_GROUPS = lead, fan_out
+    calls = []
+    openai_service._client = _recording_client(calls)
+    # A fresh prefix, so earlier runs leave nothing in OpenAI's prompt cache
+    run_prompt = f"Run {uuid.uuid4()}\n{prompt}"
+
+    start = time.perf_counter()
+    result = asyncio.run(openai_service.analyze_meta_ads_async(run_prompt, performance_report))
+    return {
+        "layout": name,
+        "seconds": (time.perf_counter() - start) / time_scale,
+        "calls": len(calls),
+        "prompt_tokens": sum(call["prompt_tokens"] for call in calls),
+        "cached_tokens": sum(call["cached_tokens"] for call in calls),
+        "completion_tokens": sum(call["completion_tokens"] for call in calls),
+        "failed_sections": sorted(result.get("section_errors", {})),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per layout; the median is reported")
+    parser.add_argument("--layouts", nargs="+", choices=[name for name, _, _ in LAYOUTS], default=[name for name, _, _ in LAYOUTS])
+    parser.add_argument("--stub", action="store_true", help="Call the local OpenAI stub instead of the API")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Stub delay factor; times are scaled back")
+    args = parser.parse_args()
+
+    time_scale = 1.0
+    if args.stub:
+        time_scale = args.time_scale
+        server = start_stub(StubConfig(time_scale=time_scale))
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        settings.OPENAI_API_KEY = "stub"
+        settings.RATE_LIMIT_BACKEND = "off"
+    if not settings.OPENAI_API_KEY:
+        raise SystemExit("OPENAI_API_KEY is not set")
+    # Every run must reach the API
+    llm_cache._store = False
+    openai_service.find_similar_businesses = _no_competitors
+    competitor_directory.lookup = lambda niche: None
+    competitor_directory.request_refresh = lambda niche: False
+
+    parsed = parse_meta_ads_csv(cached_export(args.rows))
+    prompt = format_metrics_for_ai(parsed)
+    performance_report = parsed.get("analytics", {}).get("performance_report") or None
+    print(f"Prompt: {len(prompt)} chars; {'stub' if args.stub else 'OpenAI API'}; "
+          f"rate limiter {settings.RATE_LIMIT_BACKEND}, TPM {settings.OPENAI_TPM_LIMIT}")
+
+    print(f"{'layout':<20}{'median s':>10}{'calls':>7}{'prompt tok':>12}{'cached tok':>12}{'completion tok':>16}  failed")
+    for name, lead, fan_out in LAYOUTS:
+        if name not in args.layouts:
+            continue
+        runs = [run(name, lead, fan_out, prompt, performance_report, time_scale) for _ in range(args.repeat)]
+        median = statistics.median(r["seconds"] for r in runs)
+        last = runs[-1]
+        print(f"{name:<20}{median:>10.1f}{last['calls']:>7}{last['prompt_tokens']:>12}{last['cached_tokens']:>12}"
+              f"{last['completion_tokens']:>16}  {','.join(last['failed_sections']) or '-'}")
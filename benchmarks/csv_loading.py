@@ -0,0 +1,72 @@
+"""
+Before/after comparison for CSV loading: a full inferred-dtype read (the
+original parser) vs. the schema-pruned, dtype-hinted read, with the C and
+pyarrow engines. Each mode runs in a fresh process so peak RSS is isolated.
+
+    python -m benchmarks.csv_loading --rows 1000000
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+import pandas as pd
+
+from benchmarks.synthetic_export import write_export
+
+MODES = ["full_inferred", "pruned_typed_c", "pruned_typed_pyarrow"]
+
+def _load(path: str, mode: str) -> pd.DataFrame:
+    if mode == "full_inferred":
+        return pd.read_csv(path)
+
+    from app.utils.csv_parser import _read_header, _read_csv_kwargs
+    from app.utils.schema_resolver import resolve_schema
+
+    schema = resolve_schema(_read_header(path))
+    engine = "pyarrow" if mode.endswith("pyarrow") else None
+    return pd.read_csv(path, **_read_csv_kwargs(schema, engine=engine))
+
+def _run(path: str, mode: str, queue):
+    start = time.perf_counter()
+    df = _load(path, mode)
+    elapsed = time.perf_counter() - start
+    queue.put({
+        "mode": mode,
+        "seconds": round(elapsed, 3),
+        "columns": df.shape[1],
+        "frame_mb": round(df.memory_usage(deep=True).sum() / 1024 ** 2, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    })
+
+def compare(path: str):
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for mode in MODES:
+        queue = ctx.Queue()
+        process = ctx.Process(target=_run, args=(path, mode, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--path", help="Existing export to use instead of generating one")
+    args = parser.parse_args()
+
+    path = args.path
+    if not path:
+        path = os.path.join(tempfile.gettempdir(), f"synthetic_meta_export_{args.rows}.csv")
+        if not os.path.exists(path):
+            # Generate in a child so the parent's peak RSS is not inherited by the runs
+            generator = multiprocessing.get_context("spawn").Process(target=write_export, args=(path, args.rows))
+            generator.start()
+            generator.join()
+
+    print(f"File: {path} ({os.path.getsize(path) / 1024 ** 2:.0f}MB)")
+    print(f"{'mode':<24}{'seconds':>10}{'columns':>10}{'frame MB':>12}{'peak RSS MB':>14}")
+    for row in compare(path):
+        print(f"{row['mode']:<24}{row['seconds']:>10}{row['columns']:>10}{row['frame_mb']:>12}{row['peak_rss_mb']:>14}")
@@ -0,0 +1,261 @@
+"""
+Per-stage cost of the CSV ingestion pipeline over a grid of synthetic exports
+(sizes, layouts, date spans) read in memory or in chunks. Each scenario runs
+in a fresh process and reports, per stage, wall time, peak RSS and traced
+allocations, so regressions in the hot path show up in CI diffs.
+
+Stages:
+    schema  header read + column resolution
+    read    pd.read_csv with the parser's pruned, typed options (no aggregation)
+    parse   parse_meta_ads_csv end to end (read + aggregation + analytics)
+    format  format_metrics_for_ai on the parsed summary
+
+Allocations come from tracemalloc in a second pass over the same stages, so
+tracing does not inflate the timings. It sees Python and NumPy buffers but
+not memory the C CSV tokenizer mallocs directly; peak RSS covers that.
+
+    python -m benchmarks.ingestion --rows 10000 100000 1000000 --output results.json
+    python -m benchmarks.ingestion --layouts ads_manager minimal api --days 30 365
+    python -m benchmarks.ingestion --baseline results.json
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_export import EXPORT_LAYOUTS, cached_export
+
+STAGES = ["schema", "read", "parse", "format"]
+MODES = ["memory", "chunked"]
+
+# Rows per chunk for the chunked mode (the CSV_CHUNK_SIZE workers would use)
+CHUNK_SIZE = 100000
+# Slowdown over the baseline reported as a regression (0.2 = 20% slower)
+REGRESSION_TOLERANCE = 0.2
+# Baseline stages faster than this are too noisy to compare
+MIN_COMPARABLE_SECONDS = 0.05
+
+_STATUS_PATH = "/proc/self/status"
+_CLEAR_REFS_PATH = "/proc/self/clear_refs"
+
+def _rss_mb(field: str) -> float:
+    """VmRSS / VmHWM from /proc, falling back to ru_maxrss off Linux"""
+    try:
+        with open(_STATUS_PATH) as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _reset_peak_rss() -> bool:
+    """Reset VmHWM so the next reading is the peak of one stage (Linux 4.0+)"""
+    try:
+        with open(_CLEAR_REFS_PATH, "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+def _stage_functions(path: str, mode: str):
+    """Stage name -> callable taking the previous stage's output"""
+    from app.utils.csv_parser import _read_csv_kwargs, _read_header, format_metrics_for_ai, parse_meta_ads_csv
+    from app.utils.schema_resolver import resolve_schema
+
+    chunksize = CHUNK_SIZE if mode == "chunked" else None
+
+    def read(schema):
+        if chunksize:
+            rows = 0
+            with pd.read_csv(path, chunksize=chunksize, **_read_csv_kwargs(schema)) as reader:
+                for chunk in reader:
+                    rows += len(chunk)
+            return rows
+        return len(pd.read_csv(path, **_read_csv_kwargs(schema)))
+
+    return {
+        "schema": lambda _: resolve_schema(_read_header(path)),
+        "read": read,
+        "parse": lambda _: parse_meta_ads_csv(path, chunksize=chunksize),
+        "format": lambda summary: format_metrics_for_ai(summary),
+    }
+
+def _clear_caches():
+    """Forget header and date format caches so each pass starts cold"""
+    from app.utils import dates, schema_resolver
+    schema_resolver._SCHEMA_CACHE.clear()
+    dates._FORMAT_CACHE.clear()
+
+def _run_stages(path: str, mode: str, traced: bool):
+    stages = _stage_functions(path, mode)
+    inputs = {"read": "schema", "format": "parse"}
+    outputs, results = {}, {}
+    _clear_caches()
+    if traced:
+        tracemalloc.start()
+
+    for name in STAGES:
+        argument = outputs.get(inputs.get(name))
+        if traced:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            outputs[name] = stages[name](argument)
+            after, peak = tracemalloc.get_traced_memory()
+            results[name] = {
+                "alloc_peak_mb": round((peak - before) / 1024 ** 2, 2),
+                "alloc_retained_mb": round((after - before) / 1024 ** 2, 2),
+            }
+        else:
+            rss_before = _rss_mb("VmRSS")
+            peak_isolated = _reset_peak_rss()
+            start = time.perf_counter()
+            outputs[name] = stages[name](argument)
+            seconds = time.perf_counter() - start
+            results[name] = {
+                "seconds": round(seconds, 4),
+                "peak_rss_mb": round(_rss_mb("VmHWM"), 1),
+                "rss_growth_mb": round(_rss_mb("VmRSS") - rss_before, 1),
+                # Without clear_refs the peak is the process high-water mark so far
+                "peak_rss_isolated": peak_isolated,
+            }
+        # Only keep what a later stage consumes
+        outputs = {key: value for key, value in outputs.items() if key in inputs.values()}
+
+    if traced:
+        tracemalloc.stop()
+    return results
+
+def _run_scenario(path: str, mode: str, trace_allocations: bool, queue):
+    results = _run_stages(path, mode, traced=False)
+    if trace_allocations:
+        for name, allocations in _run_stages(path, mode, traced=True).items():
+            results[name].update(allocations)
+    queue.put(results)
+
+def run_scenario(scenario: dict, trace_allocations: bool = True, repeat: int = 1):
+    """
+    Measure every stage of one scenario in fresh processes
+    Args:
+        scenario: rows, days, layout and mode
+        trace_allocations: Add a traced pass for allocation figures
+        repeat: Runs per scenario; the fastest run's timing is kept
+    Returns:
+        One result record per stage
+    """
+    path = cached_export(scenario["rows"], days=scenario["days"], layout=scenario["layout"])
+    ctx = multiprocessing.get_context("spawn")
+    runs = []
+    for attempt in range(repeat):
+        queue = ctx.Queue()
+        # Allocations do not vary between runs, so only trace once
+        process = ctx.Process(target=_run_scenario, args=(path, scenario["mode"], trace_allocations and attempt == 0, queue))
+        process.start()
+        runs.append(queue.get())
+        process.join()
+
+    records = []
+    for name in STAGES:
+        fastest = min(runs, key=lambda run: run[name]["seconds"])[name]
+        record = dict(scenario, stage=name, file_mb=round(os.path.getsize(path) / 1024 ** 2, 1), **fastest)
+        for key in ("alloc_peak_mb", "alloc_retained_mb"):
+            if key in runs[0][name]:
+                record[key] = runs[0][name][key]
+        records.append(record)
+    return records
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def environment():
+    """Machine and library versions recorded next to the results"""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "chunk_size": CHUNK_SIZE,
+    }
+
+def _key(record: dict):
+    return (record["layout"], record["rows"], record["days"], record["mode"], record["stage"])
+
+def compare(results: list, baseline: list, tolerance: float = REGRESSION_TOLERANCE):
+    """
+    Compare results with a previous run's records
+    Returns:
+        (key, metric, baseline value, current value, ratio) for every
+        metric that grew by more than `tolerance`
+    """
+    previous = {_key(record): record for record in baseline}
+    regressions = []
+    for record in results:
+        old = previous.get(_key(record))
+        if not old:
+            continue
+        for metric in ("seconds", "peak_rss_mb", "alloc_peak_mb"):
+            if metric not in record or not old.get(metric):
+                continue
+            if metric == "seconds" and old[metric] < MIN_COMPARABLE_SECONDS:
+                continue
+            ratio = record[metric] / old[metric]
+            if ratio > 1 + tolerance:
+                regressions.append((_key(record), metric, old[metric], record[metric], round(ratio, 2)))
+    return regressions
+
+def _print_table(records: list):
+    print(f"{'layout':<12}{'rows':>9}{'days':>6}{'mode':>9}{'stage':>8}{'seconds':>10}{'peak RSS MB':>13}{'alloc MB':>10}")
+    for r in records:
+        alloc = r.get("alloc_peak_mb", "-")
+        print(f"{r['layout']:<12}{r['rows']:>9}{r['days']:>6}{r['mode']:>9}{r['stage']:>8}"
+              f"{r['seconds']:>10}{r['peak_rss_mb']:>13}{alloc:>10}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--layouts", nargs="+", choices=sorted(EXPORT_LAYOUTS), default=["ads_manager"])
+    parser.add_argument("--days", type=int, nargs="+", default=[90])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per scenario, fastest kept")
+    parser.add_argument("--no-allocations", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Earlier --output file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    records = []
+    for layout, rows, days, mode in itertools.product(args.layouts, args.rows, args.days, args.modes):
+        scenario = {"layout": layout, "rows": rows, "days": days, "mode": mode}
+        records.extend(run_scenario(scenario, not args.no_allocations, max(args.repeat, 1)))
+    _print_table(records)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"environment": environment(), "results": records}, f, indent=2)
+        print(f"Wrote {len(records)} records to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(records, json.load(f)["results"], args.tolerance)
+        for key, metric, old, new, ratio in regressions:
+            print(f"REGRESSION {'/'.join(map(str, key))} {metric}: {old} -> {new} ({ratio}x)")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline")
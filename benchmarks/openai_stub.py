@@ -0,0 +1,121 @@
+"""
+Local stub of the OpenAI chat completions endpoint, for comparing how the
+analysis sections are split into calls without an API key or spend.
+Latency follows a simple model of the real API (see StubConfig): prompt
+prefill, faster prefill of a cached prefix, then decoding at a fixed rate.
+As with OpenAI's prompt cache, a prefix is only cached once a request
+carrying it has been prefilled. Analysis answers are as long as the
+SECTION_COMPLETION_TOKENS estimates of the sections asked for.
+
+    python -m benchmarks.openai_stub --port 8766
+    OPENAI_BASE_URL=http://127.0.0.1:8766/v1 OPENAI_API_KEY=stub ...
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.services.openai_service import ANALYSIS_SECTIONS, SECTION_COMPLETION_TOKENS
+from app.utils.tokens import count_tokens
+
+# Prefixes shorter than this are never cached (as with OpenAI)
+MIN_CACHED_PREFIX_TOKENS = 1024
+
+class StubConfig:
+    """
+    Latency model; the defaults are rough gpt-4o figures, not measurements.
+    time_scale shrinks every delay (reported times are scaled back).
+    """
+
+    def __init__(self, overhead: float = 0.3, prefill_tokens_per_second: float = 10000,
+                 cached_prefill_tokens_per_second: float = 50000, decode_tokens_per_second: float = 80,
+                 time_scale: float = 1.0):
+        self.overhead = overhead
+        self.prefill_tokens_per_second = prefill_tokens_per_second
+        self.cached_prefill_tokens_per_second = cached_prefill_tokens_per_second
+        self.decode_tokens_per_second = decode_tokens_per_second
+        self.time_scale = time_scale
+        self.cached_prefixes = set()
+        self.lock = threading.Lock()
+
+def _answer(request: dict):
+    """(content, completion tokens) for a request"""
+    last = request["messages"][-1]["content"]
+    if "exact keys:" in last:
+        keys = json.loads(last.split("exact keys:\n", 1)[1])
+        sections = [section for section in ANALYSIS_SECTIONS if section in keys]
+        tokens = sum(SECTION_COMPLETION_TOKENS[section] for section in sections)
+        return json.dumps({key: value or "stub text" for key, value in keys.items()}), tokens
+    if request.get("response_format", {}).get("type") == "json_object":
+        return json.dumps({"businesses": []}), 20
+    return "Coffee shops", 3
+
+def _handler(config: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            messages = request["messages"]
+            prompt_tokens = count_tokens("\n".join(m["content"] for m in messages))
+            # The shared prefix is every message before the last one
+            prefix = json.dumps(messages[:-1])
+            prefix_tokens = count_tokens("\n".join(m["content"] for m in messages[:-1]))
+            cacheable = prefix_tokens >= MIN_CACHED_PREFIX_TOKENS
+            with config.lock:
+                cached_tokens = prefix_tokens if cacheable and prefix in config.cached_prefixes else 0
+
+            prefill = ((prompt_tokens - cached_tokens) / config.prefill_tokens_per_second
+                       + cached_tokens / config.cached_prefill_tokens_per_second)
+            time.sleep((config.overhead + prefill) * config.time_scale)
+            if cacheable:
+                with config.lock:
+                    config.cached_prefixes.add(prefix)
+
+            content, completion_tokens = _answer(request)
+            time.sleep(completion_tokens / config.decode_tokens_per_second * config.time_scale)
+
+            body = json.dumps({
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request["model"],
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                    "prompt_tokens_details": {"cached_tokens": cached_tokens},
+                },
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+def start_stub(config: StubConfig, port: int = 0) -> ThreadingHTTPServer:
+    """Serve the stub on a background thread; the bound port is server.server_address[1]"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), _handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), _handler(StubConfig()))
+    print(f"OpenAI stub on http://127.0.0.1:{args.port}/v1 (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
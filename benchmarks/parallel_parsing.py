@@ -0,0 +1,77 @@
+"""
+Speed-up of the parallel CSV parser as worker count grows, checked against
+the serial streaming parser for matching output (numbers compared with a
+relative tolerance, since merged partial sums round differently).
+
+    python -m benchmarks.parallel_parsing --rows 2000000
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import tempfile
+import time
+
+from app.utils.csv_parser import parse_meta_ads_csv
+from benchmarks.synthetic_export import write_export
+
+# Relative tolerance for float metrics between the serial and parallel summaries
+REL_TOLERANCE = 1e-9
+
+def matches(expected, actual) -> bool:
+    """Deep equality with floats compared to REL_TOLERANCE"""
+    if isinstance(expected, float) or isinstance(actual, float):
+        if not isinstance(expected, (int, float)) or not isinstance(actual, (int, float)):
+            return False
+        return math.isclose(expected, actual, rel_tol=REL_TOLERANCE) or (math.isnan(expected) and math.isnan(actual))
+    if isinstance(expected, dict):
+        return isinstance(actual, dict) and expected.keys() == actual.keys() and all(
+            matches(expected[key], actual[key]) for key in expected
+        )
+    if isinstance(expected, (list, tuple)):
+        return isinstance(actual, (list, tuple)) and len(expected) == len(actual) and all(
+            matches(e, a) for e, a in zip(expected, actual)
+        )
+    return expected == actual
+
+def _timed(path: str, chunksize: int, workers: int):
+    start = time.perf_counter()
+    summary = parse_meta_ads_csv(path, chunksize=chunksize, workers=workers)
+    return time.perf_counter() - start, summary
+
+def run(path: str, chunksize: int, max_workers: int):
+    serial_seconds, serial = _timed(path, chunksize, workers=1)
+    serial.pop("snapshot", None)
+    rows = [{"workers": 1, "seconds": round(serial_seconds, 3), "speedup": 1.0, "matches": True}]
+
+    workers = 2
+    while workers <= max_workers:
+        seconds, summary = _timed(path, chunksize, workers=workers)
+        summary.pop("snapshot", None)
+        rows.append({
+            "workers": workers,
+            "seconds": round(seconds, 3),
+            "speedup": round(serial_seconds / seconds, 2),
+            "matches": matches(serial, summary),
+        })
+        workers *= 2
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--path", help="Existing export to use instead of generating one")
+    parser.add_argument("--chunksize", type=int, default=100000)
+    parser.add_argument("--max-workers", type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+
+    path = args.path
+    if not path:
+        path = os.path.join(tempfile.gettempdir(), f"synthetic_meta_export_{args.rows}.csv")
+        if not os.path.exists(path):
+            write_export(path, args.rows)
+
+    print(f"File: {path} ({os.path.getsize(path) / 1024 ** 2:.0f}MB), chunksize {args.chunksize}")
+    print(f"{'workers':>8}{'seconds':>10}{'speedup':>10}{'matches':>9}")
+    for row in run(path, args.chunksize, args.max_workers):
+        print(f"{row['workers']:>8}{row['seconds']:>10}{row['speedup']:>10}{str(row['matches']):>9}")
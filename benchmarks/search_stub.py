@@ -0,0 +1,99 @@
+"""
+Local stub of the Tavily and SerpAPI search endpoints, for exercising the web
+search client (pooling, circuit breakers, hedging) without API keys or quota.
+POST /search answers like Tavily and GET /search like SerpAPI; each provider
+gets its own latency and failure rate.
+
+    python -m benchmarks.search_stub --port 8765 --tavily-latency 5 --serpapi-latency 0.3
+    TAVILY_BASE_URL=http://127.0.0.1:8765 SERPAPI_BASE_URL=http://127.0.0.1:8765 ...
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+RESULT_COUNT = 10
+
+class StubConfig:
+    """Per-provider behaviour; attributes can be changed while the server runs"""
+
+    def __init__(self, tavily_latency: float = 0.2, serpapi_latency: float = 0.2,
+                 tavily_error_rate: float = 0.0, serpapi_error_rate: float = 0.0):
+        self.latency = {"tavily": tavily_latency, "serpapi": serpapi_latency}
+        self.error_rate = {"tavily": tavily_error_rate, "serpapi": serpapi_error_rate}
+        # Lower it to 0 to have a provider answer with no results
+        self.result_count = {"tavily": RESULT_COUNT, "serpapi": RESULT_COUNT}
+        self.requests = {"tavily": 0, "serpapi": 0}
+
+def _companies(query: str, count: int):
+    return [
+        {"title": f"Company {i} - {query}", "url": f"https://company{i}.example.com", "snippet": f"Company {i} works in {query}."}
+        for i in range(count)
+    ]
+
+def _handler(config: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, so the client's pool is exercised
+
+        def _respond(self, provider: str, query: str):
+            config.requests[provider] += 1
+            time.sleep(config.latency[provider])
+            if random.random() < config.error_rate[provider]:
+                body, status = b'{"error": "stub failure"}', 503
+            else:
+                results = _companies(query, config.result_count[provider])
+                if provider == "tavily":
+                    payload = {"results": [{"title": r["title"], "url": r["url"], "content": r["snippet"]} for r in results]}
+                else:
+                    payload = {"organic_results": [{"title": r["title"], "link": r["url"], "snippet": r["snippet"]} for r in results]}
+                body, status = json.dumps(payload).encode(), 200
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client cancelled this request (it lost a hedge race)
+                self.close_connection = True
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            self._respond("tavily", request.get("query", ""))
+
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+            self._respond("serpapi", query)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+def start_stub(config: StubConfig, port: int = 0) -> ThreadingHTTPServer:
+    """Serve the stub on a background thread; the bound port is server.server_address[1]"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), _handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tavily-latency", type=float, default=0.2)
+    parser.add_argument("--serpapi-latency", type=float, default=0.2)
+    parser.add_argument("--tavily-error-rate", type=float, default=0.0)
+    parser.add_argument("--serpapi-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = StubConfig(args.tavily_latency, args.serpapi_latency, args.tavily_error_rate, args.serpapi_error_rate)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), _handler(config))
+    print(f"Search stub on http://127.0.0.1:{args.port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,154 @@
+"""
+Synthetic Meta Ads export generator for benchmarks.
+Produces wide ad-level daily exports that look like Ads Manager CSVs:
+a few dimensions, the metrics the parser reads, and a long tail of
+columns (free text, ids, secondary metrics) it should skip. Other layouts
+cover the narrower exports accounts send in practice.
+"""
+import argparse
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from datetime import date
+
+DIMENSION_COLUMNS = ["Campaign name", "Ad set name", "Ad name"]
+DATE_COLUMNS = ["Reporting starts", "Reporting ends"]
+TEXT_COLUMNS = [
+    "Delivery status", "Delivery level", "Attribution setting", "Result type",
+    "Ad creative body", "Headline", "URL tags", "Objective", "Placement", "Ad ID"
+]
+
+# Secondary metrics present in real exports but not read by the parser
+EXTRA_METRIC_COLUMNS = [
+    "Frequency", "Cost per result", "CPM (cost per 1,000 impressions) (USD)",
+    "Clicks (all)", "CTR (all)", "CPC (all) (USD)", "Landing page views",
+    "Cost per landing page view (USD)", "Outbound clicks", "Unique link clicks",
+    "Video plays", "Video plays at 25%", "Video plays at 50%", "Video plays at 75%",
+    "Video plays at 100%", "ThruPlays", "Cost per ThruPlay (USD)", "Post engagements",
+    "Post reactions", "Post comments", "Post shares", "Post saves", "Page likes",
+    "Adds to cart", "Checkouts initiated", "Purchases", "Purchases conversion value",
+    "Purchase ROAS", "Leads", "Cost per lead (USD)", "Registrations completed",
+    "Content views", "Instagram profile visits", "Messaging conversations started",
+    "Quality ranking score", "Engagement rate ranking score", "Conversion rate ranking score",
+]
+
+# Export layouts: header renames applied to the generated columns (None keeps
+# the full Ads Manager export), plus the currency and date format of the account
+EXPORT_LAYOUTS = {
+    # Wide Ads Manager "All columns" export
+    "ads_manager": {"columns": None, "currency": "USD", "date_format": "%Y-%m-%d"},
+    # Hand-picked columns with a per-day breakdown from a European account
+    "minimal": {
+        "columns": {
+            "Reporting starts": "Day",
+            "Campaign name": "Campaign name",
+            "Ad set name": "Ad set name",
+            "Ad name": "Ad name",
+            "Impressions": "Impressions",
+            "Link clicks": "Link clicks",
+            "Amount spent (USD)": "Amount spent (USD)",
+            "Results": "Results",
+        },
+        "currency": "EUR",
+        "date_format": "%d/%m/%Y",
+    },
+    # Marketing API insights dump
+    "api": {
+        "columns": {
+            "Reporting starts": "date_start",
+            "Reporting ends": "date_stop",
+            "Campaign name": "campaign_name",
+            "Ad set name": "adset_name",
+            "Ad name": "ad_name",
+            "Reach": "reach",
+            "Impressions": "impressions",
+            "Link clicks": "clicks",
+            "Amount spent (USD)": "spend",
+            "CTR (link click-through rate)": "ctr",
+            "CPC (cost per link click) (USD)": "cpc",
+            "Results": "conversions",
+        },
+        "currency": "USD",
+        "date_format": "%Y-%m-%d",
+    },
+}
+
+def generate_export(rows: int, days: int = 90, campaigns: int = 20, ads_per_campaign: int = 25,
+                    start: date = date(2024, 1, 1), seed: int = 42, layout: str = "ads_manager") -> pd.DataFrame:
+    """Build a synthetic export with `rows` ad-day rows spread over `days` days"""
+    spec = EXPORT_LAYOUTS[layout]
+    rng = np.random.default_rng(seed)
+
+    campaign_ids = rng.integers(0, campaigns, rows)
+    ad_ids = campaign_ids * ads_per_campaign + rng.integers(0, ads_per_campaign, rows)
+    day_offsets = rng.integers(0, days, rows)
+    # Format each day once and index into it; strftime per row is slow at millions of rows
+    calendar = pd.date_range(start, periods=days, freq="D").strftime(spec["date_format"]).to_numpy()
+    dates = calendar[day_offsets]
+
+    reach = rng.integers(100, 20000, rows)
+    impressions = (reach * rng.uniform(1.0, 2.5, rows)).astype(np.int64)
+    ctr = rng.beta(2, 120, rows)
+    clicks = rng.binomial(impressions, ctr)
+    spend = np.round(impressions / 1000 * rng.uniform(4, 18, rows), 2)
+    results = rng.binomial(clicks, 0.04)
+
+    data = {
+        "Reporting starts": dates,
+        "Reporting ends": dates,
+        "Campaign name": np.char.add("Campaign ", campaign_ids.astype(str)),
+        "Ad set name": np.char.add("Ad set ", (ad_ids // 5).astype(str)),
+        "Ad name": np.char.add("Ad ", ad_ids.astype(str)),
+        "Reach": reach,
+        "Impressions": impressions,
+        "Results": results,
+        "Amount spent (USD)": spend,
+        "Link clicks": clicks,
+        "CPC (cost per link click) (USD)": np.round(np.divide(spend, clicks, out=np.zeros(rows), where=clicks > 0), 3),
+        "CTR (link click-through rate)": np.round(np.divide(clicks, impressions, out=np.zeros(rows), where=impressions > 0) * 100, 4),
+    }
+    for col in TEXT_COLUMNS:
+        data[col] = np.char.add(f"{col} value ", (ad_ids % 97).astype(str))
+    for col in EXTRA_METRIC_COLUMNS:
+        data[col] = np.round(rng.uniform(0, 1000, rows), 2)
+
+    frame = pd.DataFrame(data)
+    if spec["columns"]:
+        frame = frame[list(spec["columns"])].rename(columns=spec["columns"])
+    if spec["currency"] != "USD":
+        frame.columns = [col.replace("(USD)", f"({spec['currency']})") for col in frame.columns]
+    return frame
+
+def write_export(path: str, rows: int, chunk_rows: int = 250000, **kwargs) -> str:
+    """Write a synthetic export to CSV in chunks so large files fit in memory"""
+    seed = kwargs.pop("seed", 42)
+    written = 0
+    while written < rows:
+        n = min(chunk_rows, rows - written)
+        frame = generate_export(n, seed=seed + written, **kwargs)
+        frame.to_csv(path, mode="w" if written == 0 else "a", header=written == 0, index=False)
+        written += n
+    return path
+
+def cached_export(rows: int, days: int = 90, layout: str = "ads_manager") -> str:
+    """Path of a synthetic export in the temp dir, generated on first use"""
+    if days == 90 and layout == "ads_manager":
+        # Same file the other benchmarks generate
+        name = f"synthetic_meta_export_{rows}.csv"
+    else:
+        name = f"synthetic_meta_export_{layout}_{rows}_{days}d.csv"
+    path = os.path.join(tempfile.gettempdir(), name)
+    if not os.path.exists(path):
+        write_export(path, rows, days=days, layout=layout)
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Meta Ads export")
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--layout", choices=sorted(EXPORT_LAYOUTS), default="ads_manager")
+    args = parser.parse_args()
+    write_export(args.path, args.rows, days=args.days, layout=args.layout)
+    print(f"Wrote {args.rows} rows to {args.path}")
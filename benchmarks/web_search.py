@@ -0,0 +1,62 @@
+"""
+Web search client against the local stub server: latency per search and the
+provider that answered, for a healthy primary, a slow primary (with and
+without hedging) and a failing primary (circuit breaker).
+
+    python -m benchmarks.web_search --searches 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.services import web_search
+from benchmarks.search_stub import StubConfig, start_stub
+from config import settings
+
+# (name, stub settings, hedge delay; None disables hedging)
+SCENARIOS = [
+    ("healthy", dict(tavily_latency=0.2, serpapi_latency=0.3), 2.0),
+    ("slow_primary_no_hedge", dict(tavily_latency=5.0, serpapi_latency=0.3), None),
+    ("slow_primary_hedged", dict(tavily_latency=5.0, serpapi_latency=0.3), 1.0),
+    ("failing_primary", dict(tavily_latency=0.5, serpapi_latency=0.3, tavily_error_rate=1.0), 2.0),
+]
+
+def run(name: str, stub: dict, hedge_delay, searches: int):
+    config = StubConfig(**stub)
+    server = start_stub(config)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    settings.TAVILY_BASE_URL = settings.SERPAPI_BASE_URL = base_url
+    settings.TAVILY_API_KEY = settings.SERPAPI_KEY = "stub"
+    # Hedging off = the fallback only starts after the primary's timeout
+    settings.WEB_SEARCH_HEDGE_DELAY = hedge_delay if hedge_delay is not None else settings.WEB_SEARCH_TIMEOUT + 1
+    web_search._breakers = {provider: web_search.CircuitBreaker(provider) for provider, _, _ in web_search.PROVIDERS}
+
+    latencies, winners = [], {"tavily": 0, "serpapi": 0, "none": 0}
+    for i in range(searches):
+        start = time.perf_counter()
+        results = asyncio.run(web_search.search(f"niche {i}"))
+        latencies.append(time.perf_counter() - start)
+        winner = "none" if not results else "tavily" if "content" in results[0] else "serpapi"
+        winners[winner] += 1
+    server.shutdown()
+
+    latencies.sort()
+    return {
+        "scenario": name,
+        "p50": round(statistics.median(latencies), 3),
+        "p95": round(latencies[int(0.95 * (len(latencies) - 1))], 3),
+        "winners": winners,
+        "requests": dict(config.requests),
+        "tavily_circuit": web_search._breakers["tavily"].state,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--searches", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'scenario':<24}{'p50 s':>8}{'p95 s':>8}  winners / stub requests / tavily circuit")
+    for name, stub, hedge_delay in SCENARIOS:
+        row = run(name, stub, hedge_delay, args.searches)
+        print(f"{row['scenario']:<24}{row['p50']:>8}{row['p95']:>8}  {row['winners']} {row['requests']} {row['tavily_circuit']}")
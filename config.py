@@ -16,10 +16,28 @@ class Settings(BaseSettings):
 
     # OpenAI
     OPENAI_API_KEY: str = os.getenv('OPENAI_API_KEY', '')
+    # Upper bound on the analysis prompt; sampled CSV rows fill what the aggregates leave
+    PROMPT_TOKEN_BUDGET: int = int(os.getenv('PROMPT_TOKEN_BUDGET', 12000))
+    # Per-call timeouts in seconds, retries included
+    OPENAI_ANALYSIS_TIMEOUT: float = float(os.getenv('OPENAI_ANALYSIS_TIMEOUT', 120))
+    OPENAI_CALL_TIMEOUT: float = float(os.getenv('OPENAI_CALL_TIMEOUT', 30))  # Niche and competitor calls
+    # Limits shared by every worker through Redis (redis or off); set them to the account's tier
+    RATE_LIMIT_BACKEND: str = os.getenv('RATE_LIMIT_BACKEND', 'redis')
+    OPENAI_RPM_LIMIT: int = int(os.getenv('OPENAI_RPM_LIMIT', 500))
+    # One analysis at the default PROMPT_TOKEN_BUDGET reserves about 55k tokens (four section calls and the niche call)
+    OPENAI_TPM_LIMIT: int = int(os.getenv('OPENAI_TPM_LIMIT', 120000))
+    OPENAI_MAX_CONCURRENCY: int = int(os.getenv('OPENAI_MAX_CONCURRENCY', 8))
+    RATE_LIMIT_MAX_WAIT: float = float(os.getenv('RATE_LIMIT_MAX_WAIT', 600))  # Seconds a call may wait for budget, within its own timeout
 
     # Web Search APIs (optional - for enhanced business search)
     TAVILY_API_KEY: str = os.getenv('TAVILY_API_KEY', '')
     SERPAPI_KEY: str = os.getenv('SERPAPI_KEY', '')
+    WEB_SEARCH_TIMEOUT: float = float(os.getenv('WEB_SEARCH_TIMEOUT', 15))  # Seconds per search provider
+    WEB_SEARCH_HEDGE_DELAY: float = float(os.getenv('WEB_SEARCH_HEDGE_DELAY', 2))  # Seconds before a slow provider is raced by the next
+    # Overridable to point at a local stub server (python -m benchmarks.search_stub)
+    TAVILY_BASE_URL: str = os.getenv('TAVILY_BASE_URL', 'https://api.tavily.com')
+    SERPAPI_BASE_URL: str = os.getenv('SERPAPI_BASE_URL', 'https://serpapi.com')
+    COMPETITOR_REFRESH_TTL: int = int(os.getenv('COMPETITOR_REFRESH_TTL', 2592000))  # 30 days before a niche's competitors are re-researched
 
     # Email
     RESEND_API_KEY: str = os.getenv('RESEND_API_KEY', '')
@@ -31,6 +49,30 @@ class Settings(BaseSettings):
     # Upload settings
     MAX_FILE_SIZE: int = int(os.getenv('MAX_FILE_SIZE', 209715200))  # 200MB
     UPLOAD_FOLDER: str = os.getenv('UPLOAD_FOLDER', 'uploads')
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv('UPLOAD_CHUNK_SIZE', 1048576))  # 1MB read size for streamed uploads
+    RESUMABLE_CHUNK_SIZE: int = int(os.getenv('RESUMABLE_CHUNK_SIZE', 8388608))  # 8MB chunks for resumable uploads
+    DIRECT_UPLOAD_EXPIRES: int = int(os.getenv('DIRECT_UPLOAD_EXPIRES', 900))  # Seconds a signed upload target stays valid
+
+    # CSV parsing - rows per chunk when streaming large exports (0 disables streaming)
+    CSV_CHUNK_SIZE: int = int(os.getenv('CSV_CHUNK_SIZE', 100000))
+    # pd.read_csv engine for in-memory parses: "c" (default) or "pyarrow"
+    CSV_ENGINE: str = os.getenv('CSV_ENGINE', '')
+    # Processes for parallel parsing of large CSV files (0 or 1 = serial)
+    CSV_PARALLEL_WORKERS: int = int(os.getenv('CSV_PARALLEL_WORKERS', 0))
+
+    # Parsed-summary cache keyed by content hash: "redis", "disk" or "off"
+    SUMMARY_CACHE_BACKEND: str = os.getenv('SUMMARY_CACHE_BACKEND', 'redis')
+    SUMMARY_CACHE_TTL: int = int(os.getenv('SUMMARY_CACHE_TTL', 604800))  # 7 days
+    SUMMARY_CACHE_MAX_ENTRIES: int = int(os.getenv('SUMMARY_CACHE_MAX_ENTRIES', 500))
+    # Folder for the disk backend (defaults to UPLOAD_FOLDER/summary_cache)
+    SUMMARY_CACHE_DIR: str = os.getenv('SUMMARY_CACHE_DIR', '')
+
+    # LLM response cache shared by all workers (redis or off); TTLs in seconds per call type
+    LLM_CACHE_BACKEND: str = os.getenv('LLM_CACHE_BACKEND', 'redis')
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 5000))
+    LLM_CACHE_TTL_ANALYSIS: int = int(os.getenv('LLM_CACHE_TTL_ANALYSIS', 86400))  # 1 day
+    LLM_CACHE_TTL_NICHE: int = int(os.getenv('LLM_CACHE_TTL_NICHE', 2592000))  # 30 days
+    LLM_CACHE_TTL_BUSINESSES: int = int(os.getenv('LLM_CACHE_TTL_BUSINESSES', 604800))  # 7 days
 
     # CORS
     FRONTEND_URL: str = os.getenv('FRONTEND_URL', 'http://localhost:3000')
@@ -40,6 +82,18 @@ class Settings(BaseSettings):
     CLOUDINARY_API_KEY: str = os.getenv('CLOUDINARY_API_KEY', '')
     CLOUDINARY_API_SECRET: str = os.getenv('CLOUDINARY_API_SECRET', '')
 
+    # Storage backend for uploaded CSVs: "cloudinary", "local" or "s3"
+    STORAGE_BACKEND: str = os.getenv('STORAGE_BACKEND', 'cloudinary')
+    # Root folder for the local backend (defaults to UPLOAD_FOLDER/storage)
+    LOCAL_STORAGE_PATH: str = os.getenv('LOCAL_STORAGE_PATH', '')
+    # S3 or S3-compatible storage (set S3_ENDPOINT_URL for MinIO, R2, ...)
+    S3_BUCKET: str = os.getenv('S3_BUCKET', '')
+    S3_PREFIX: str = os.getenv('S3_PREFIX', 'meta_ads_csv')
+    S3_ENDPOINT_URL: str = os.getenv('S3_ENDPOINT_URL', '')
+    S3_REGION: str = os.getenv('S3_REGION', '')
+    S3_ACCESS_KEY_ID: str = os.getenv('S3_ACCESS_KEY_ID', '')
+    S3_SECRET_ACCESS_KEY: str = os.getenv('S3_SECRET_ACCESS_KEY', '')
+
     class Config:
         env_file = ".env"
         extra = "ignore"  # Ignore extra fields from .env file
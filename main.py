@@ -11,7 +11,7 @@ app = FastAPI(title=settings.APP_NAME)
 
 # Create database tables on startup
 from app.database import engine, Base
-from app.models import user, analysis, social_account, campaign, report
+from app.models import user, analysis, social_account, campaign, report, upload_session, competitor
 Base.metadata.create_all(bind=engine)
 
 # CORS - Allow multiple origins for development and production
@@ -60,27 +60,41 @@ async def cleanup_data(db: Session = Depends(get_db)):
 
 @app.post("/api/migrate")
 async def run_migration():
-    """Run database migrations - adds csv_url column if needed"""
+    """Run database migrations - adds any missing analyses columns"""
+    # (column name, DDL type, optional index statement)
+    columns = [
+        ("csv_url", "VARCHAR", None),
+        ("content_hash", "VARCHAR(64)", "CREATE INDEX IF NOT EXISTS ix_analyses_content_hash ON analyses (content_hash);"),
+        ("ai_prompt", "TEXT", None),
+        ("snapshot_url", "VARCHAR", None),
+    ]
+
     try:
         from sqlalchemy import text
+        messages = []
         with engine.connect() as conn:
-            # Check if column exists
-            result = conn.execute(text("""
-                SELECT column_name
-                FROM information_schema.columns
-                WHERE table_name='analyses' AND column_name='csv_url';
-            """))
-
-            if result.fetchone() is None:
-                # Column doesn't exist, add it
-                conn.execute(text("""
-                    ALTER TABLE analyses
-                    ADD COLUMN csv_url VARCHAR;
-                """))
-                conn.commit()
-                return {"message": "✅ Added csv_url column to analyses table"}
-            else:
-                return {"message": "ℹ️  csv_url column already exists"}
+            for column_name, column_type, index_sql in columns:
+                # Check if column exists
+                result = conn.execute(text("""
+                    SELECT column_name
+                    FROM information_schema.columns
+                    WHERE table_name='analyses' AND column_name=:column_name;
+                """), {"column_name": column_name})
+
+                if result.fetchone() is None:
+                    # Column doesn't exist, add it
+                    conn.execute(text(f"""
+                        ALTER TABLE analyses
+                        ADD COLUMN {column_name} {column_type};
+                    """))
+                    if index_sql:
+                        conn.execute(text(index_sql))
+                    conn.commit()
+                    messages.append(f"✅ Added {column_name} column to analyses table")
+                else:
+                    messages.append(f"ℹ️  {column_name} column already exists")
+
+        return {"message": "; ".join(messages)}
     except Exception as e:
         return {"error": str(e)}
 
@@ -91,3 +105,19 @@ async def root():
 @app.get("/health")
 async def health():
     return {"status": "healthy"}
+
+from app.services.summary_cache import summary_cache_stats
+from app.services.llm_cache import llm_cache_stats
+from app.services.rate_limiter import rate_limiter_stats
+from app.services.competitor_directory import directory_stats
+from app.services.web_search import web_search_stats
+
+@app.get("/api/metrics")
+async def metrics():
+    return {
+        "summary_cache": summary_cache_stats(),
+        "llm_cache": llm_cache_stats(),
+        "rate_limiter": rate_limiter_stats(),
+        "competitor_directory": directory_stats(),
+        "web_search": web_search_stats()
+    }
@@ -0,0 +1,30 @@
+"""
+Migration script to add ai_prompt column to analyses table
+Run this manually on production database or via the /api/migrate endpoint
+"""
+from sqlalchemy import text
+from app.database import engine
+
+def add_ai_prompt_column():
+    """Add ai_prompt column to analyses table if it doesn't exist"""
+    with engine.connect() as conn:
+        # Check if column exists
+        result = conn.execute(text("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name='analyses' AND column_name='ai_prompt';
+        """))
+
+        if result.fetchone() is None:
+            # Column doesn't exist, add it
+            conn.execute(text("""
+                ALTER TABLE analyses
+                ADD COLUMN ai_prompt TEXT;
+            """))
+            conn.commit()
+            print("✅ Added ai_prompt column to analyses table")
+        else:
+            print("ℹ️  ai_prompt column already exists")
+
+if __name__ == "__main__":
+    add_ai_prompt_column()
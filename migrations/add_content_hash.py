@@ -0,0 +1,34 @@
+"""
+Migration script to add content_hash column (and its index) to analyses table
+Run this manually on production database or via the /api/migrate endpoint
+"""
+from sqlalchemy import text
+from app.database import engine
+
+def add_content_hash_column():
+    """Add content_hash column to analyses table if it doesn't exist"""
+    with engine.connect() as conn:
+        # Check if column exists
+        result = conn.execute(text("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name='analyses' AND column_name='content_hash';
+        """))
+
+        if result.fetchone() is None:
+            # Column doesn't exist, add it
+            conn.execute(text("""
+                ALTER TABLE analyses
+                ADD COLUMN content_hash VARCHAR(64);
+            """))
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_analyses_content_hash
+                ON analyses (content_hash);
+            """))
+            conn.commit()
+            print("✅ Added content_hash column to analyses table")
+        else:
+            print("ℹ️  content_hash column already exists")
+
+if __name__ == "__main__":
+    add_content_hash_column()
@@ -0,0 +1,53 @@
+"""
+Shared test setup: a throwaway SQLite database, the local storage backend
+and no Redis, configured before the app (and its settings) is imported.
+"""
+import os
+import tempfile
+
+TEST_ROOT = tempfile.mkdtemp(prefix="meta_ads_tests_")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(TEST_ROOT, 'test.db')}",
+    "UPLOAD_FOLDER": os.path.join(TEST_ROOT, "uploads"),
+    "STORAGE_BACKEND": "local",
+    "SUMMARY_CACHE_BACKEND": "off",
+    "LLM_CACHE_BACKEND": "off",
+    "RATE_LIMIT_BACKEND": "off",
+    # Only used to sign requests locally; nothing is sent to Cloudinary
+    "CLOUDINARY_CLOUD_NAME": "test-cloud",
+    "CLOUDINARY_API_KEY": "test-key",
+    "CLOUDINARY_API_SECRET": "test-secret",
+})
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from app.utils.auth import create_access_token
+
+@pytest.fixture
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def auth_headers():
+    return {"Authorization": f"Bearer {create_access_token({'user_id': 1})}"}
+
+@pytest.fixture
+def queued_tasks(monkeypatch):
+    """Analysis ids passed to process_csv_task.delay, instead of reaching Celery"""
+    from app.services.celery_tasks import process_csv_task
+
+    queued = []
+
+    class _Result:
+        def __init__(self, analysis_id):
+            self.id = f"task-{analysis_id}"
+
+    def delay(analysis_id):
+        queued.append(analysis_id)
+        return _Result(analysis_id)
+
+    monkeypatch.setattr(process_csv_task, "delay", delay)
+    return queued
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.services import competitor_directory, openai_service
+
+SECTION_DELAY = 0.3
+
+@pytest.fixture
+def fake_calls(monkeypatch):
+    """Replaces the OpenAI calls; records when each (by its first key) started and finished"""
+    events, failing = [], set()
+
+    async def chat(client, call, refresh=False, on_text=None, **kwargs):
+        last = kwargs["messages"][-1]["content"]
+        keys = json.loads(last.split("exact keys:\n", 1)[1]) if call == "analysis" else {call: ""}
+        name = next(iter(keys))
+        events.append(("start", name, time.monotonic()))
+        if call == "niche":
+            answer = "Coffee shops"
+        else:
+            await asyncio.sleep(SECTION_DELAY)
+            if any(key in failing for key in keys):
+                events.append(("failed", name, time.monotonic()))
+                raise TimeoutError("analysis call timed out")
+            answer = json.dumps({key: ("Specialty coffee roasting" if key == "business_niche" else value or "text")
+                                 for key, value in keys.items()})
+        events.append(("end", name, time.monotonic()))
+        if on_text:
+            await on_text(answer)
+        return answer
+
+    class Client:
+        async def close(self):
+            pass
+
+    monkeypatch.setattr(openai_service, "_chat", chat)
+    monkeypatch.setattr(openai_service, "_client", Client)
+    return {"events": events, "failing": failing}
+
+@pytest.fixture
+def directory(monkeypatch):
+    lookups, refreshes = [], []
+    entries = {competitor_directory.normalize_niche("Coffee shops"): [{"name": "Blue Bottle"}]}
+
+    def lookup(niche):
+        lookups.append((niche, time.monotonic()))
+        key = competitor_directory.normalize_niche(niche)
+        if key in entries:
+            return {"niche": niche, "businesses": entries[key], "match": "exact", "stale": False}
+        return None
+
+    monkeypatch.setattr(competitor_directory, "lookup", lookup)
+    monkeypatch.setattr(competitor_directory, "request_refresh", lambda niche: refreshes.append(niche) or True)
+    return {"lookups": lookups, "refreshes": refreshes, "entries": entries}
+
+def test_competitor_lookup_does_not_wait_for_business_context(fake_calls, directory):
+    started = time.monotonic()
+    result = openai_service.analyze_meta_ads("Campaign data", {"summary": "local"})
+
+    first_lookup = directory["lookups"][0]
+    assert first_lookup[0] == "Coffee shops"
+    assert first_lookup[1] - started < SECTION_DELAY
+    assert result["similar_businesses"] == [{"name": "Blue Bottle"}]
+    # business_context named a niche with no exact entry: it is researched in the background
+    assert directory["refreshes"] == ["Specialty coffee roasting"]
+
+def test_business_context_niche_refines_the_competitors(fake_calls, directory):
+    directory["entries"][competitor_directory.normalize_niche("Specialty coffee roasting")] = [{"name": "Onyx Coffee Lab"}]
+    result = openai_service.analyze_meta_ads("Campaign data", {"summary": "local"})
+
+    assert result["similar_businesses"] == [{"name": "Onyx Coffee Lab"}]
+    assert directory["refreshes"] == []
+
+def test_failed_business_context_falls_back_to_the_extracted_niche(fake_calls, directory):
+    fake_calls["failing"].add("business_context")
+    result = openai_service.analyze_meta_ads("Campaign data", {"summary": "local"})
+
+    assert result["business_niche"] == "Coffee shops"
+    assert result["business_context"] == ""
+    assert "business_context" in result["section_errors"]
+    assert result["similar_businesses"] == [{"name": "Blue Bottle"}]
+
+def test_sections_are_grouped_without_overlap():
+    grouped = list(openai_service.LEAD_SECTIONS) + [section for group in openai_service.FAN_OUT_GROUPS for section in group]
+
+    assert sorted(grouped) == sorted(openai_service.ANALYSIS_SECTIONS)
+
+def test_fan_out_starts_after_the_lead_call(fake_calls, directory):
+    published = []
+    result = openai_service.analyze_meta_ads("Campaign data", {"summary": "local"}, lambda key, value: published.append(key))
+
+    times = {(kind, name): at for kind, name, at in fake_calls["events"]}
+    lead_end = times[("end", "business_context")]
+    fan_out = [group[0] for group in openai_service.FAN_OUT_GROUPS]
+    assert all(times[("start", first)] >= lead_end for first in fan_out)
+    # The fan-out calls run together
+    assert abs(times[("start", fan_out[0])] - times[("start", fan_out[1])]) < SECTION_DELAY / 2
+    assert "section_errors" not in result
+    assert sorted(published) == sorted(key for key in result if key != "performance_report")
+
+def test_fan_out_still_runs_when_the_lead_call_fails(fake_calls, directory):
+    fake_calls["failing"].add("business_context")
+    result = openai_service.analyze_meta_ads("Campaign data")
+
+    assert set(result["section_errors"]) == set(openai_service.LEAD_SECTIONS)
+    assert result["business_context"] == ""
+    assert result["content_strategy"] == "text" and result["ai_insights"] == "text"
+
+def test_timeout_reports_what_was_left_of_the_budget():
+    async def slow():
+        await asyncio.sleep(1)
+
+    with pytest.raises(TimeoutError, match=r"after the 0\.0s left of its"):
+        asyncio.run(openai_service._with_timeout("niche", slow(), deadline=time.monotonic() + 0.01))
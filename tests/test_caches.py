@@ -0,0 +1,55 @@
+import fakeredis
+import pytest
+import redis
+
+from app.services import llm_cache, summary_cache
+from app.services.redis_lru import RedisLRUStore
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, "from_url", lambda url, **kwargs: fakeredis.FakeRedis(server=server))
+    return server
+
+def test_lru_store_evicts_least_recently_used(fake_redis):
+    store = RedisLRUStore("redis://test", "test_cache", max_entries=2, ttl=60)
+    store.set("a", "1")
+    store.set("b", "2")
+    assert store.get("a") == b"1"  # "a" is now more recent than "b"
+    store.set("c", "3")
+
+    assert store.get("b") is None
+    assert store.get("a") == b"1"
+    stats = store.stats()
+    assert (stats["entries"], stats["evictions"], stats["hits"], stats["misses"]) == (2, 1, 2, 1)
+
+def test_caches_share_the_store_under_their_own_prefixes(fake_redis, monkeypatch):
+    monkeypatch.setattr(summary_cache, "_store", None)
+    monkeypatch.setattr(summary_cache.settings, "SUMMARY_CACHE_BACKEND", "redis")
+    monkeypatch.setattr(llm_cache, "_store", None)
+    monkeypatch.setattr(llm_cache.settings, "LLM_CACHE_BACKEND", "redis")
+
+    summary_cache.cache_summary("same-hash", {"rows": 1}, "prompt")
+    llm_cache.cache_response("niche", "same-hash", "Coffee shops")
+
+    assert summary_cache.get_cached_summary("same-hash") == {"parsed": {"rows": 1}, "prompt": "prompt"}
+    assert llm_cache.get_cached_response("niche", "same-hash") == "Coffee shops"
+
+def test_llm_cache_reports_prompt_and_completion_tokens_saved(fake_redis, monkeypatch):
+    monkeypatch.setattr(llm_cache, "_store", None)
+    monkeypatch.setattr(llm_cache.settings, "LLM_CACHE_BACKEND", "redis")
+
+    llm_cache.cache_response("analysis", "h1", "insights", prompt_tokens=1200, completion_tokens=300)
+    assert llm_cache.get_cached_response("analysis", "h1") == "insights"
+    assert llm_cache.get_cached_response("analysis", "h1") == "insights"
+    assert llm_cache.get_cached_response("analysis", "h2") is None
+
+    stats = llm_cache.llm_cache_stats()
+    assert stats["calls"]["analysis"] == {
+        "hits": 2,
+        "misses": 1,
+        "prompt_tokens_saved": 2400,
+        "completion_tokens_saved": 600,
+        "hit_rate": 0.6667
+    }
+    assert (stats["prompt_tokens_saved"], stats["completion_tokens_saved"]) == (2400, 600)
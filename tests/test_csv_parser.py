@@ -0,0 +1,91 @@
+import gzip
+import zipfile
+
+import pytest
+
+from app.utils.csv_parser import parse_meta_ads_csv
+from benchmarks.parallel_parsing import matches
+from benchmarks.synthetic_export import write_export
+
+HEADER = "Campaign name,Ad set name,Amount spent (USD),Impressions,Reporting starts\n"
+
+def _rows(count: int, start: int = 0) -> str:
+    return "".join(
+        f"Campaign {i % 3},Ad set {i % 5},{i}.25,{i * 10},{i % 28 + 1:02d}/03/2024\n"
+        for i in range(start, start + count)
+    )
+
+def test_upload_without_recognised_columns_parses():
+    parsed = parse_meta_ads_csv("a,b\n1,2\n", from_string=True)
+
+    assert parsed["total_rows"] == 1
+    assert not parsed["row_sample"]
+
+def test_upload_without_recognised_columns_parses_chunked():
+    parsed = parse_meta_ads_csv("a,b\n" + "1,2\n" * 10, from_string=True, chunksize=3)
+
+    assert parsed["total_rows"] == 10
+    assert not parsed["row_sample"]
+
+@pytest.mark.filterwarnings("error::FutureWarning")
+def test_chunked_breakdowns_merge_without_pandas_warnings():
+    rows = [f"Campaign {i % 3},Ad set {i % 5},{i}.50,{i * 10}" for i in range(40)]
+    content = "Campaign name,Ad set name,Amount spent (USD),Impressions\n" + "\n".join(rows) + "\n"
+
+    parsed = parse_meta_ads_csv(content, from_string=True, chunksize=7)
+
+    assert parsed["breakdowns"]["campaign"]["groups"] == 3
+
+def test_in_memory_chunked_and_parallel_summaries_match(tmp_path, capsys):
+    path = write_export(str(tmp_path / "export.csv"), 3000, days=30, campaigns=4, ads_per_campaign=5)
+
+    in_memory = parse_meta_ads_csv(path)
+    chunked = parse_meta_ads_csv(path, chunksize=400)
+    parallel = parse_meta_ads_csv(path, chunksize=400, workers=2)
+
+    assert "Parallel CSV parse failed" not in capsys.readouterr().out
+    assert in_memory["total_rows"] == 3000
+    assert matches(in_memory, chunked)
+    assert matches(chunked, parallel)
+
+@pytest.mark.parametrize("chunksize", [None, 2])
+def test_text_in_metric_column_falls_back_to_inferred_dtypes(chunksize):
+    content = "Campaign name,Amount spent (USD),Impressions\nA,abc,100\nB,5,200\nC,7,300\n"
+
+    parsed = parse_meta_ads_csv(content, from_string=True, chunksize=chunksize)
+
+    assert parsed["total_rows"] == 3
+    assert parsed["metrics"]["impressions"]["total"] == 600
+
+def test_gzip_export_parses_like_plain_csv(tmp_path):
+    content = HEADER + _rows(50)
+    plain = tmp_path / "export.csv"
+    plain.write_text(content)
+    compressed = tmp_path / "export.csv.gz"
+    compressed.write_bytes(gzip.compress(content.encode()))
+
+    assert matches(parse_meta_ads_csv(str(plain)), parse_meta_ads_csv(str(compressed)))
+
+def test_zip_members_parse_as_one_export(tmp_path):
+    plain = tmp_path / "export.csv"
+    plain.write_text(HEADER + _rows(60))
+    archive = tmp_path / "export.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("part-1.csv", HEADER + _rows(25))
+        zf.writestr("part-2.csv", HEADER + _rows(35, start=25))
+        # A different export; its header does not match the first member's
+        zf.writestr("other.csv", "Ad name,Reach\nX,1\n")
+
+    expected = parse_meta_ads_csv(str(plain))
+    parsed = parse_meta_ads_csv(str(archive))
+
+    assert parsed["total_rows"] == 60
+    assert matches(expected["metrics"], parsed["metrics"])
+    assert matches(expected["breakdowns"], parsed["breakdowns"])
+    assert parsed["date_range"] == expected["date_range"]
+
+def test_day_first_dates():
+    parsed = parse_meta_ads_csv(HEADER + _rows(20), from_string=True)
+
+    assert parsed["date_range"]["start"] == "2024-03-01"
+    assert parsed["date_range"]["end"] == "2024-03-20"
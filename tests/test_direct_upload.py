@@ -0,0 +1,120 @@
+import time
+from datetime import timedelta
+
+from app.database import SessionLocal
+from app.models.analysis import Analysis, AnalysisStatus
+from app.models.upload_session import UploadSession
+from app.services import cloudinary_service
+from app.services.celery_tasks import process_csv_task
+from app.services.storage_service import get_storage, storage_for_url
+from app.utils.auth import create_access_token
+from app.utils.fingerprint import fingerprint_file
+from config import settings
+
+def make_csv(tag: str) -> bytes:
+    lines = ["Campaign name,Amount spent (USD),Impressions"]
+    lines += [f"{tag} campaign {i},{i}.50,{i * 100}" for i in range(5)]
+    return ("\n".join(lines) + "\n").encode()
+
+def create_target(client, headers, data: bytes, filename: str = "export.csv") -> dict:
+    response = client.post(
+        "/api/upload/direct",
+        json={"filename": filename, "total_size": len(data)},
+        headers=headers
+    )
+    assert response.status_code == 200
+    return response.json()
+
+def local_route(target: dict) -> str:
+    return "/" + target["url"].split("/", 3)[3]
+
+def upload_and_complete(client, headers, data: bytes, filename: str) -> dict:
+    target = create_target(client, headers, data, filename)
+    assert client.put(local_route(target), content=data).status_code == 200
+    response = client.post(f"/api/upload/direct/{target['session_id']}/complete", headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+def test_direct_upload_is_completed_once(client, auth_headers, queued_tasks):
+    data = make_csv("direct")
+    target = create_target(client, auth_headers, data)
+    session_id = target["session_id"]
+
+    response = client.post(f"/api/upload/direct/{session_id}/complete", headers=auth_headers)
+    assert response.status_code == 400  # Nothing uploaded yet
+
+    assert client.put(local_route(target), content=data).json() == {"size": len(data)}
+
+    first = client.post(f"/api/upload/direct/{session_id}/complete", headers=auth_headers).json()
+    again = client.post(f"/api/upload/direct/{session_id}/complete", headers=auth_headers).json()
+    assert first["already_finalized"] is False
+    assert again["already_finalized"] is True
+    assert again["analysis_id"] == first["analysis_id"]
+    assert queued_tasks == [first["analysis_id"]]
+
+def test_local_upload_token_cannot_be_replayed(client, auth_headers):
+    data = make_csv("replay")
+    target = create_target(client, auth_headers, data)
+
+    assert client.put(local_route(target), content=data).status_code == 200
+    assert client.put(local_route(target), content=b"replaced content").status_code == 403
+
+    db = SessionLocal()
+    try:
+        url = db.query(UploadSession).filter(UploadSession.id == target["session_id"]).first().storage_url
+    finally:
+        db.close()
+    with storage_for_url(url).open_read(url) as f:
+        assert f.read() == data
+
+def test_local_upload_token_expires(client):
+    storage = get_storage()
+    token = create_access_token(
+        {"scope": "local_upload", "key": "meta_ads_csv/expired.csv", "max_size": 100},
+        timedelta(seconds=-1)
+    )
+    assert storage.verify_upload_token(token) is None
+    assert client.put(f"/api/upload/direct/local/{token}", content=b"data").status_code == 403
+
+def test_local_upload_enforces_max_size(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE", 50)
+    target = create_target(client, auth_headers, b"x" * 10)
+    assert client.put(local_route(target), content=b"x" * 51).status_code == 413
+
+def test_cloudinary_signature_expires_after_expires_in():
+    params = cloudinary_service.signed_upload_params("1_export.csv", 900)
+    age = time.time() - int(params["fields"]["timestamp"])
+    # Cloudinary accepts signatures up to SIGNATURE_MAX_AGE old, so 900s remain
+    assert abs(cloudinary_service.SIGNATURE_MAX_AGE - age - 900) < 5
+
+def test_worker_reuses_an_earlier_analysis_of_the_same_content(client, auth_headers, queued_tasks):
+    data = make_csv("dedup")
+    first = upload_and_complete(client, auth_headers, data, "first.csv")
+    second = upload_and_complete(client, auth_headers, data, "second.csv")
+
+    db = SessionLocal()
+    try:
+        # The first analysis ran to completion
+        earlier = db.query(Analysis).filter(Analysis.id == first["analysis_id"]).first()
+        content_hash = fingerprint_file(storage_for_url(earlier.csv_url).local_path(earlier.csv_url))
+        earlier.content_hash = content_hash
+        earlier.status = AnalysisStatus.COMPLETED
+        earlier.results_json = '{"ai_insights": ["reused"]}'
+        db.commit()
+        duplicate_url = db.query(Analysis).filter(Analysis.id == second["analysis_id"]).first().csv_url
+    finally:
+        db.close()
+
+    result = process_csv_task.run(second["analysis_id"])
+    assert result["cache_hit"] is True
+    assert result["source_analysis_id"] == first["analysis_id"]
+
+    db = SessionLocal()
+    try:
+        duplicate = db.query(Analysis).filter(Analysis.id == second["analysis_id"]).first()
+        assert duplicate.status == AnalysisStatus.COMPLETED
+        assert duplicate.results_json == '{"ai_insights": ["reused"]}'
+        assert duplicate.content_hash == content_hash
+    finally:
+        db.close()
+    assert storage_for_url(duplicate_url).object_size(duplicate_url) is None
@@ -0,0 +1,30 @@
+import json
+
+from app.utils.json_sections import SectionParser
+
+def feed_in_pieces(text: str, size: int):
+    parser = SectionParser()
+    members = []
+    for start in range(0, len(text), size):
+        members.append(parser.feed(text[start:start + size]))
+    return members
+
+def test_members_are_emitted_as_soon_as_they_close():
+    answer = {"ai_insights": ["CPC fell, {not} a [bracket]", "Say \"hi\""], "next_ad_plan": {"budget": 10}}
+    text = json.dumps(answer)
+    first_member_end = text.index(', "next_ad_plan"')
+
+    members = feed_in_pieces(text, 1)
+
+    # ai_insights is complete at the comma after it, before next_ad_plan has started
+    assert members[first_member_end] == [("ai_insights", answer["ai_insights"])]
+    assert members[-1] == [("next_ad_plan", {"budget": 10})]
+    assert sum(members, []) == list(answer.items())
+
+def test_whole_text_at_once_yields_every_member():
+    answer = {"business_context": "Roaster", "business_niche": "specialty coffee"}
+
+    assert SectionParser().feed(json.dumps(answer, indent=2)) == list(answer.items())
+
+def test_malformed_member_is_skipped():
+    assert SectionParser().feed('{"a": tru, "b": 2}') == [("b", 2)]
@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+import fakeredis
+import pytest
+import redis
+
+from app.services import rate_limiter
+
+MODEL = "gpt-4o"
+
+@pytest.fixture
+def limiter(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, "from_url", lambda url, **kwargs: fakeredis.FakeRedis(server=server))
+    limiter = rate_limiter._RedisRateLimiter("redis://test", rpm=100, tpm=1000, max_concurrency=4)
+    monkeypatch.setattr(rate_limiter, "_limiter", limiter)
+    return limiter
+
+def bucket_tokens(limiter) -> float:
+    return float(limiter.client.hget(f"{rate_limiter.REDIS_PREFIX}:{MODEL}:bucket", "tokens"))
+
+def test_release_corrects_against_the_capped_charge(limiter):
+    async def call():
+        # An estimate above tpm only takes the full bucket
+        lease = await rate_limiter.acquire(MODEL, 5000, 30)
+        assert bucket_tokens(limiter) == pytest.approx(0, abs=5)
+        await rate_limiter.release(MODEL, lease, 5000, used_tokens=800)
+
+    asyncio.run(call())
+    # 1000 taken, 800 used: 200 comes back, not the 4200 an uncapped estimate would return
+    assert bucket_tokens(limiter) == pytest.approx(200, abs=5)
+
+def test_wait_is_bounded_by_the_call_deadline(limiter):
+    async def call():
+        await rate_limiter.acquire(MODEL, 1000, 30)
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            # Refilling 1000 tokens takes a minute; the call only has half a second left
+            await rate_limiter.acquire(MODEL, 1000, 30, deadline=time.monotonic() + 0.5)
+        return time.monotonic() - started
+
+    assert asyncio.run(call()) < 1
+
+def test_concurrency_wait_gives_up_at_the_deadline(limiter):
+    async def call():
+        for _ in range(limiter.max_concurrency):
+            await rate_limiter.acquire(MODEL, 10, 30)
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            await rate_limiter.acquire(MODEL, 10, 30, deadline=time.monotonic() + 0.3)
+        return time.monotonic() - started
+
+    assert asyncio.run(call()) < 1.5
@@ -0,0 +1,98 @@
+import json
+
+import pandas as pd
+import pytest
+
+from app.database import SessionLocal
+from app.models.analysis import Analysis, AnalysisStatus
+from app.routes import analysis as analysis_routes
+from app.utils.snapshot import SnapshotWriter, delete_snapshot, store_snapshot
+
+def create_analysis(results: dict) -> int:
+    db = SessionLocal()
+    try:
+        analysis = Analysis(
+            user_id=1,
+            csv_filename="export.csv",
+            status=AnalysisStatus.COMPLETED,
+            results_json=json.dumps(results),
+            ai_prompt="Campaign data"
+        )
+        db.add(analysis)
+        db.commit()
+        return analysis.id
+    finally:
+        db.close()
+
+@pytest.fixture
+def regenerated(monkeypatch):
+    """(prompt, local_report) each regeneration was asked to use"""
+    calls = []
+
+    async def regenerate_section(prompt, section, local_report):
+        calls.append((prompt, local_report))
+        return ["fresh insight"]
+
+    monkeypatch.setattr(analysis_routes, "regenerate_section", regenerate_section)
+    return calls
+
+@pytest.mark.parametrize("local_report", [True, False])
+def test_regenerate_uses_the_stored_local_report_flag(client, auth_headers, regenerated, local_report):
+    # analytics (trends, rankings) is present either way, so it says nothing about the report
+    analysis_id = create_analysis({
+        "ai_insights": ["old"],
+        "analytics": {"weekly_trends": []},
+        "local_report": local_report,
+        "section_errors": {"ai_insights": "timed out"}
+    })
+
+    response = client.post(f"/api/analysis/{analysis_id}/sections/ai_insights/regenerate", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert regenerated == [("Campaign data", local_report)]
+    results = client.get(f"/api/analysis/{analysis_id}/results", headers=auth_headers).json()
+    assert results["ai_insights"] == ["fresh insight"]
+    assert "section_errors" not in results
+    assert results["local_report"] is local_report
+
+def test_regenerate_rejects_sections_that_are_not_regenerable(client, auth_headers, regenerated):
+    analysis_id = create_analysis({"business_context": "Roaster", "local_report": True})
+
+    response = client.post(f"/api/analysis/{analysis_id}/sections/business_context/regenerate", headers=auth_headers)
+
+    assert response.status_code == 400
+    assert regenerated == []
+
+def test_deduplicated_upload_can_regenerate_and_page_rows(client, auth_headers, queued_tasks, regenerated):
+    data = b"Campaign name,Amount spent (USD),Impressions\nSpring,10.50,1000\nSummer,20.00,2000\n"
+    first = client.post("/api/upload/csv", files={"file": ("first.csv", data, "text/csv")}, headers=auth_headers).json()
+
+    # The first analysis ran to completion and stored its snapshot
+    writer = SnapshotWriter(first["analysis_id"])
+    writer.write(pd.DataFrame({"Campaign name": ["Spring", "Summer"], "Impressions": [1000, 2000]}))
+    snapshot = store_snapshot(writer.close())
+    db = SessionLocal()
+    try:
+        earlier = db.query(Analysis).filter(Analysis.id == first["analysis_id"]).first()
+        earlier.status = AnalysisStatus.COMPLETED
+        earlier.results_json = json.dumps({"ai_insights": ["old"], "local_report": True})
+        earlier.ai_prompt = "Earlier prompt"
+        earlier.snapshot_url = snapshot["url"]
+        db.commit()
+    finally:
+        db.close()
+
+    second = client.post("/api/upload/csv", files={"file": ("second.csv", data, "text/csv")}, headers=auth_headers).json()
+    assert second["cache_hit"] is True
+    analysis_id = second["analysis_id"]
+
+    response = client.post(f"/api/analysis/{analysis_id}/sections/ai_insights/regenerate", headers=auth_headers)
+    assert response.status_code == 200
+    assert regenerated == [("Earlier prompt", True)]
+
+    # The duplicate has its own snapshot, so it outlives the original's
+    delete_snapshot(first["analysis_id"], snapshot["url"])
+    rows = client.get(f"/api/analysis/{analysis_id}/data", headers=auth_headers)
+    assert rows.status_code == 200
+    assert [row["Campaign name"] for row in rows.json()["rows"]] == ["Spring", "Summer"]
+    assert client.get(f"/api/analysis/{analysis_id}/breakdowns", headers=auth_headers).status_code == 200
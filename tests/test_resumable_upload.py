@@ -0,0 +1,192 @@
+import hashlib
+import os
+import threading
+
+import pytest
+
+from app.database import SessionLocal
+from app.models.analysis import Analysis
+from app.models.upload_session import UploadSession, UploadSessionStatus
+from app.routes import upload as upload_routes
+from app.services.storage_service import storage_for_url
+from app.utils import resumable
+from config import settings
+
+CHUNK_SIZE = 64
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(settings, "RESUMABLE_CHUNK_SIZE", CHUNK_SIZE)
+
+def make_csv(tag: str, rows: int = 10) -> bytes:
+    lines = ["Campaign name,Amount spent (USD),Impressions"]
+    lines += [f"{tag} campaign {i},{i}.50,{i * 100}" for i in range(rows)]
+    return ("\n".join(lines) + "\n").encode()
+
+def create_session(client, headers, data: bytes) -> dict:
+    response = client.post(
+        "/api/upload/sessions",
+        json={"filename": "export.csv", "total_size": len(data)},
+        headers=headers
+    )
+    assert response.status_code == 200
+    return response.json()
+
+def chunk_of(data: bytes, index: int) -> bytes:
+    return data[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE]
+
+def put_chunk(client, headers, session_id: str, index: int, body: bytes, checksum: str = None):
+    chunk_headers = dict(headers)
+    if checksum:
+        chunk_headers["X-Chunk-SHA256"] = checksum
+    return client.put(
+        f"/api/upload/sessions/{session_id}/chunks/{index}",
+        params={"offset": index * CHUNK_SIZE},
+        content=body,
+        headers=chunk_headers
+    )
+
+def stored_bytes(analysis_id: int) -> bytes:
+    db = SessionLocal()
+    try:
+        url = db.query(Analysis).filter(Analysis.id == analysis_id).first().csv_url
+    finally:
+        db.close()
+    with storage_for_url(url).open_read(url) as f:
+        return f.read()
+
+def test_out_of_order_chunks_are_assembled_in_order(client, auth_headers, queued_tasks):
+    data = make_csv("out-of-order")
+    session = create_session(client, auth_headers, data)
+    total = session["total_chunks"]
+    assert total > 2
+
+    for index in reversed(range(total)):
+        assert put_chunk(client, auth_headers, session["session_id"], index, chunk_of(data, index)).status_code == 200
+
+    response = client.post(f"/api/upload/sessions/{session['session_id']}/finalize", headers=auth_headers)
+    assert response.status_code == 200
+    assert stored_bytes(response.json()["analysis_id"]) == data
+    assert queued_tasks == [response.json()["analysis_id"]]
+
+def test_duplicate_chunk_put_replaces_the_staged_copy(client, auth_headers, queued_tasks):
+    data = make_csv("duplicate")
+    session = create_session(client, auth_headers, data)
+    session_id = session["session_id"]
+
+    put_chunk(client, auth_headers, session_id, 0, b"x" * CHUNK_SIZE)
+    for index in range(session["total_chunks"]):
+        assert put_chunk(client, auth_headers, session_id, index, chunk_of(data, index)).status_code == 200
+    # Sending the same chunk again is harmless
+    assert put_chunk(client, auth_headers, session_id, 1, chunk_of(data, 1)).status_code == 200
+
+    assert not [name for name in os.listdir(resumable.session_dir(session_id)) if name.endswith(".tmp")]
+
+    response = client.post(f"/api/upload/sessions/{session_id}/finalize", headers=auth_headers)
+    assert response.status_code == 200
+    assert stored_bytes(response.json()["analysis_id"]) == data
+
+def test_resume_after_interrupted_chunk(client, auth_headers, queued_tasks):
+    data = make_csv("resume")
+    session = create_session(client, auth_headers, data)
+    session_id = session["session_id"]
+    total = session["total_chunks"]
+
+    assert put_chunk(client, auth_headers, session_id, 0, chunk_of(data, 0)).status_code == 200
+    # The connection drops partway through chunk 1
+    assert put_chunk(client, auth_headers, session_id, 1, chunk_of(data, 1)[:10]).status_code == 400
+
+    status = client.get(f"/api/upload/sessions/{session_id}", headers=auth_headers).json()
+    assert status["received_ranges"] == [[0, CHUNK_SIZE]]
+    assert status["missing_chunks"] == list(range(1, total))
+
+    response = client.post(f"/api/upload/sessions/{session_id}/finalize", headers=auth_headers)
+    assert response.status_code == 400
+    assert queued_tasks == []
+
+    # The client resumes from the first missing chunk
+    for index in status["missing_chunks"]:
+        assert put_chunk(client, auth_headers, session_id, index, chunk_of(data, index)).status_code == 200
+
+    response = client.post(f"/api/upload/sessions/{session_id}/finalize", headers=auth_headers)
+    assert response.status_code == 200
+    assert stored_bytes(response.json()["analysis_id"]) == data
+
+def upload_all_chunks(client, headers, data: bytes) -> str:
+    session = create_session(client, headers, data)
+    for index in range(session["total_chunks"]):
+        put_chunk(client, headers, session["session_id"], index, chunk_of(data, index))
+    return session["session_id"]
+
+def test_finalize_loses_the_claim_to_a_concurrent_finalize(client, auth_headers, queued_tasks, monkeypatch):
+    session_id = upload_all_chunks(client, auth_headers, make_csv("claim"))
+    staged_chunks = resumable.staged_chunks
+
+    def claimed_meanwhile(*args):
+        # Another finalize claims the session after this one checked the status
+        db = SessionLocal()
+        db.query(UploadSession).filter(UploadSession.id == session_id).update(
+            {UploadSession.status: UploadSessionStatus.FINALIZING}, synchronize_session=False
+        )
+        db.commit()
+        db.close()
+        return staged_chunks(*args)
+
+    monkeypatch.setattr(upload_routes.resumable, "staged_chunks", claimed_meanwhile)
+    response = client.post(f"/api/upload/sessions/{session_id}/finalize", headers=auth_headers)
+
+    assert response.status_code == 409
+    assert queued_tasks == []
+
+def test_concurrent_finalizes_enqueue_once(client, auth_headers, queued_tasks):
+    session_id = upload_all_chunks(client, auth_headers, make_csv("concurrent"))
+    responses = []
+    start = threading.Barrier(4)
+
+    def finalize():
+        start.wait()
+        responses.append(client.post(f"/api/upload/sessions/{session_id}/finalize", headers=auth_headers))
+
+    threads = [threading.Thread(target=finalize) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    finalized = [r for r in responses if r.status_code == 200 and not r.json()["already_finalized"]]
+    assert len(finalized) == 1
+    assert all(r.status_code in (200, 409) for r in responses)
+    assert queued_tasks == [finalized[0].json()["analysis_id"]]
+
+def test_chunk_size_mismatch_is_rejected(client, auth_headers):
+    data = make_csv("size")
+    session_id = create_session(client, auth_headers, data)["session_id"]
+
+    assert put_chunk(client, auth_headers, session_id, 0, chunk_of(data, 0) + b"extra").status_code == 400
+    assert put_chunk(client, auth_headers, session_id, 0, chunk_of(data, 0)[:-1]).status_code == 400
+    misplaced = client.put(
+        f"/api/upload/sessions/{session_id}/chunks/1",
+        params={"offset": CHUNK_SIZE + 1},
+        content=chunk_of(data, 1),
+        headers=auth_headers
+    )
+    assert misplaced.status_code == 400
+
+    status = client.get(f"/api/upload/sessions/{session_id}", headers=auth_headers).json()
+    assert status["received_ranges"] == []
+    assert not [name for name in os.listdir(resumable.session_dir(session_id)) if name.endswith(".tmp")]
+
+def test_chunk_checksum_mismatch_is_rejected(client, auth_headers):
+    data = make_csv("checksum")
+    session_id = create_session(client, auth_headers, data)["session_id"]
+    chunk = chunk_of(data, 0)
+
+    wrong = hashlib.sha256(b"something else").hexdigest()
+    assert put_chunk(client, auth_headers, session_id, 0, chunk, checksum=wrong).status_code == 400
+    status = client.get(f"/api/upload/sessions/{session_id}", headers=auth_headers).json()
+    assert status["received_ranges"] == []
+
+    right = hashlib.sha256(chunk).hexdigest()
+    assert put_chunk(client, auth_headers, session_id, 0, chunk, checksum=right.upper()).status_code == 200
+    status = client.get(f"/api/upload/sessions/{session_id}", headers=auth_headers).json()
+    assert status["received_ranges"] == [[0, CHUNK_SIZE]]
@@ -0,0 +1,19 @@
+import pytest
+
+from app.utils import tokens
+
+def test_prompt_tokens_are_counted_with_the_model_tokenizer(monkeypatch):
+    tiktoken = pytest.importorskip("tiktoken")
+    # Fails on tiktoken releases that do not know the analysis model
+    encoding_name = tiktoken.model.encoding_name_for_model(tokens.TOKENIZER_MODEL)
+    try:
+        encoding = tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        # The BPE file is downloaded on first use
+        pytest.skip(f"{encoding_name} tokenizer data unavailable: {e}")
+
+    monkeypatch.setattr(tokens, "_encoding", None)
+    text = "Campaign | Spend | CTR\nSpring sale | 1234.50 | 1.87%"
+
+    assert tokens._get_encoding() is not False
+    assert tokens.count_tokens(text) == len(encoding.encode(text))
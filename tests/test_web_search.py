@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services import web_search
+from benchmarks.search_stub import StubConfig, start_stub
+from config import settings
+
+RESET_SECONDS = 0.2
+
+@pytest.fixture
+def stub(monkeypatch):
+    config = StubConfig(tavily_latency=0.01, serpapi_latency=0.01)
+    server = start_stub(config)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(settings, "TAVILY_BASE_URL", base_url)
+    monkeypatch.setattr(settings, "SERPAPI_BASE_URL", base_url)
+    monkeypatch.setattr(settings, "TAVILY_API_KEY", "test")
+    monkeypatch.setattr(settings, "SERPAPI_KEY", "test")
+    monkeypatch.setattr(settings, "WEB_SEARCH_HEDGE_DELAY", 5.0)
+    yield config
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(autouse=True)
+def breakers(monkeypatch):
+    """Fresh breakers with a short reset, so each test starts closed"""
+    fresh = {name: web_search.CircuitBreaker(name, reset_seconds=RESET_SECONDS) for name, _, _ in web_search.PROVIDERS}
+    monkeypatch.setattr(web_search, "_breakers", fresh)
+    return fresh
+
+@pytest.fixture(autouse=True)
+def recorded(monkeypatch):
+    """Counters the searches would have written to Redis"""
+    calls, lock = [], threading.Lock()
+
+    def record(provider, counters, circuit=None):
+        with lock:
+            calls.append((provider, counters, circuit))
+
+    monkeypatch.setattr(web_search, "_record", record)
+    return calls
+
+def search(niche: str = "coffee") -> list:
+    return asyncio.run(web_search.search(niche))
+
+def wait_for(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+def test_breaker_opens_probes_and_closes(stub, breakers):
+    tavily = breakers["tavily"]
+    stub.error_rate["tavily"] = 1.0
+
+    for _ in range(web_search.BREAKER_FAILURE_THRESHOLD):
+        assert tavily.state == "closed"
+        # Each failure falls through to SerpAPI
+        assert search()[0]["link"]
+    assert tavily.state == "open"
+    assert stub.requests["tavily"] == web_search.BREAKER_FAILURE_THRESHOLD
+
+    # While open, Tavily is skipped without a request
+    assert search()[0]["link"]
+    assert stub.requests["tavily"] == web_search.BREAKER_FAILURE_THRESHOLD
+
+    time.sleep(RESET_SECONDS)
+    assert tavily.state == "half_open"
+    stub.error_rate["tavily"] = 0.0
+    # The probe succeeds and closes the circuit
+    assert search()[0]["url"]
+    assert stub.requests["tavily"] == web_search.BREAKER_FAILURE_THRESHOLD + 1
+    assert tavily.state == "closed"
+
+def test_failed_probe_reopens_the_breaker(stub, breakers):
+    tavily = breakers["tavily"]
+    stub.error_rate["tavily"] = 1.0
+    for _ in range(web_search.BREAKER_FAILURE_THRESHOLD):
+        search()
+    time.sleep(RESET_SECONDS)
+
+    assert search()[0]["link"]
+    assert stub.requests["tavily"] == web_search.BREAKER_FAILURE_THRESHOLD + 1
+    assert tavily.state == "open"
+    # Re-opened for a full reset period, so the next search skips Tavily again
+    search()
+    assert stub.requests["tavily"] == web_search.BREAKER_FAILURE_THRESHOLD + 1
+
+def test_half_open_breaker_lets_a_single_probe_through():
+    breaker = web_search.CircuitBreaker("test", threshold=1, reset_seconds=0)
+    breaker.record_failure()
+
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    # A cancelled probe hands the slot back
+    breaker.release_probe()
+    assert breaker.allow()
+
+def test_slow_primary_is_hedged_and_cancelled(stub, breakers, recorded, monkeypatch):
+    monkeypatch.setattr(settings, "WEB_SEARCH_HEDGE_DELAY", 0.1)
+    stub.latency["tavily"] = 2.0
+
+    started = time.monotonic()
+    results = search()
+
+    assert time.monotonic() - started < 1.0
+    assert results[0]["link"]
+    wait_for(lambda: ("tavily", {"cancelled": 1}, None) in recorded)
+    assert ("serpapi", {"hedged": 1}, None) in recorded
+    assert ("serpapi", {"won_hedge": 1}, None) in recorded
+    # Losing the race is not a provider failure
+    assert breakers["tavily"].failures == 0
+
+def test_empty_results_fall_through_to_the_next_provider(stub, breakers):
+    stub.result_count["tavily"] = 0
+
+    results = search()
+
+    assert results[0]["link"]
+    assert stub.requests == {"tavily": 1, "serpapi": 1}
+    # An empty answer is not a failure
+    assert breakers["tavily"].state == "closed"
+
+def test_all_providers_empty_returns_no_results(stub):
+    stub.result_count = {"tavily": 0, "serpapi": 0}
+
+    assert search() == []
+    assert stub.requests == {"tavily": 1, "serpapi": 1}